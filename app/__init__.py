@@ -1,2 +1,2 @@
-# 科研助手应用包
-
+# 科研助手应用包
+
@@ -1,2 +1,2 @@
-# API接口模块
-
+# API接口模块
+
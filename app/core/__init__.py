@@ -1,2 +1,2 @@
-# 核心功能模块
-
+# 核心功能模块
+
@@ -0,0 +1,437 @@
+"""
+文本块元数据存储模块
+以列式格式保存文本块及其来源：文本拼接为一个UTF-8数据块并配合偏移量数组，
+文档编号、块序号、去重指纹为定长数组。加载时通过内存映射打开，检索只需解码前k条结果。
+每行有一个稳定的文本块ID，按追加顺序递增，删除和压缩都不会改变其余行的ID
+"""
+import os
+import json
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Iterable
+from pathlib import Path
+
+Fingerprint = Tuple[str, int]
+
+FORMAT_VERSION = 2
+
+# 定长列：文件名 -> (dtype, 每行的额外形状)
+_COLUMNS = {
+    'ids': ('int64', ()),
+    'doc_ids': ('int32', ()),
+    'chunk_ids': ('int32', ()),
+    'extra_offsets': ('int64', ()),
+    'extra_doc_ids': ('int32', ()),
+    'extra_chunk_ids': ('int32', ()),
+    'offsets': ('int64', ()),
+    'fp_exact': ('uint8', (20,)),
+    'fp_simhash': ('uint64', ()),
+    'has_fp': ('bool', ()),
+}
+
+
+def _atomic_save(path: Path, write):
+    """先写临时文件再替换，进程中断不会留下半个文件"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class ChunkStore:
+    """
+    列式文本块元数据
+    每行对应索引中的一个向量：代表来源 (doc_ids, chunk_ids)、文本 (texts.bin + offsets)、
+    去重指纹 (fp_exact, fp_simhash)；去重合并进来的其他来源按CSR格式存放在 extra_* 中。
+    已保存的部分（基础列）只读并可内存映射；新追加的行和来源变化保存在内存中，
+    保存或压缩时再合并为新的基础列。
+    删除文档后不再有任何来源的行只标记为已删除（墓碑，文档编号为-1），位置保持不变，
+    直到 compact 时才真正移除
+    """
+    
+    def __init__(self):
+        self.doc_names = []  # 文档编号 -> 文档名
+        self._doc_index = {}  # 文档名 -> 文档编号
+        self.next_id = 0  # 下一个追加行的ID
+        self._set_base(self._empty_columns(), np.zeros(0, dtype=np.uint8))
+        self._tail = []  # 追加的行 (文本, 文档编号, 块序号, 指纹, ID)
+        self._sources = {}  # 来源被修改过的行 -> [(文档编号, 块序号), ...]
+    
+    @staticmethod
+    def _empty_columns() -> Dict[str, np.ndarray]:
+        columns = {name: np.zeros((0,) + shape, dtype=dtype)
+                   for name, (dtype, shape) in _COLUMNS.items()}
+        columns['offsets'] = np.zeros(1, dtype='int64')
+        columns['extra_offsets'] = np.zeros(1, dtype='int64')
+        return columns
+    
+    def _set_base(self, columns: Dict[str, np.ndarray], blob: np.ndarray):
+        self._base = columns
+        self._blob = blob
+        self._base_n = len(columns['doc_ids'])
+        self.deleted = set(np.flatnonzero(columns['doc_ids'] == -1).tolist())  # 已删除行的位置
+    
+    def __len__(self) -> int:
+        return self._base_n + len(self._tail)
+    
+    def _doc_id(self, doc_name: str) -> int:
+        if doc_name not in self._doc_index:
+            self._doc_index[doc_name] = len(self.doc_names)
+            self.doc_names.append(doc_name)
+        return self._doc_index[doc_name]
+    
+    # ---------- 写入 ----------
+    
+    def append(self, doc_name: str, chunk_id: int, text: str,
+               fingerprint: Optional[Fingerprint] = None) -> int:
+        """追加一行，返回其位置"""
+        self._tail.append((text, self._doc_id(doc_name), chunk_id, fingerprint, self.next_id))
+        self.next_id += 1
+        return len(self) - 1
+    
+    def add_source(self, position: int, doc_name: str, chunk_id: int):
+        """为已有行追加一个来源（重复文本块）"""
+        self._sources[position] = self._raw_sources(position) + [(self._doc_id(doc_name), chunk_id)]
+        self.deleted.discard(position)
+    
+    def pop_source(self, position: int):
+        """撤销最近一次 add_source"""
+        self._sources[position] = self._raw_sources(position)[:-1]
+        if not self._sources[position]:
+            self.deleted.add(position)
+    
+    def truncate(self, length: int):
+        """丢弃 length 之后尚未保存的追加行，被丢弃的ID会重新分配"""
+        cut = max(length - self._base_n, 0)
+        if cut < len(self._tail):
+            self.next_id = self._tail[cut][4]
+        del self._tail[cut:]
+        for position in [p for p in self._sources if p >= length]:
+            del self._sources[position]
+        self.deleted = {p for p in self.deleted if p < length}
+    
+    def remove_documents(self, doc_names: Iterable[str]) -> List[int]:
+        """
+        移除指定文档的来源，返回因此不再有任何来源、被标记为已删除的行位置
+        各行的位置和ID不变，调用 compact 后才真正移除
+        """
+        ids = {self._doc_index[name] for name in doc_names if name in self._doc_index}
+        if not ids:
+            return []
+        id_array = np.array(sorted(ids), dtype='int32')
+        base = self._base
+        affected = set(np.flatnonzero(np.isin(base['doc_ids'], id_array)).tolist())
+        extra_hits = np.flatnonzero(np.isin(base['extra_doc_ids'], id_array))
+        affected.update((np.searchsorted(base['extra_offsets'], extra_hits, side='right') - 1).tolist())
+        affected.update(self._sources)
+        affected.update(i for i, row in enumerate(self._tail, self._base_n) if row[1] in ids)
+        
+        removed = []
+        for position in sorted(affected):
+            sources = self._raw_sources(position)
+            remaining = [src for src in sources if src[0] not in ids]
+            if len(remaining) == len(sources):
+                continue
+            # 代表来源改为剩余的第一个来源，没有剩余来源时标记为已删除
+            self._sources[position] = remaining
+            if not remaining:
+                self.deleted.add(position)
+                removed.append(position)
+        return removed
+    
+    def compact(self) -> List[int]:
+        """移除全部已删除的行，其余行前移（ID不变），返回被移除行原来的位置"""
+        removed = sorted(self.deleted)
+        if removed:
+            self._set_base(*self._consolidate(self.live_positions()))
+            self._tail = []
+            self._sources = {}
+        return removed
+    
+    # ---------- 读取 ----------
+    
+    def live_positions(self) -> np.ndarray:
+        """未删除行的位置，升序"""
+        return np.setdiff1d(np.arange(len(self)), np.array(sorted(self.deleted), dtype='int64'))
+    
+    def ids(self, positions: Iterable[int]) -> np.ndarray:
+        """指定位置的行ID"""
+        positions = np.asarray(list(positions) if not isinstance(positions, np.ndarray) else positions,
+                               dtype='int64')
+        result = np.empty(len(positions), dtype='int64')
+        in_base = positions < self._base_n
+        result[in_base] = self._base['ids'][positions[in_base]]
+        result[~in_base] = [self._tail[p - self._base_n][4] for p in positions[~in_base].tolist()]
+        return result
+    
+    def positions_of(self, ids: np.ndarray) -> np.ndarray:
+        """
+        由行ID查找位置，形状与 ids 相同，找不到的ID（包括-1）对应-1
+        ID按位置递增，基础列二分查找；追加行的ID连续，直接计算
+        """
+        ids = np.asarray(ids, dtype='int64')
+        result = np.full(ids.shape, -1, dtype='int64')
+        base_ids = self._base['ids']
+        if self._base_n:
+            found = np.minimum(np.searchsorted(base_ids, ids), self._base_n - 1)
+            hit = (ids >= 0) & (np.asarray(base_ids[found.ravel()]).reshape(ids.shape) == ids)
+            result[hit] = found[hit]
+        if self._tail:
+            offset = ids - self._tail[0][4]
+            hit = (offset >= 0) & (offset < len(self._tail))
+            result[hit] = self._base_n + offset[hit]
+        return result
+    
+    def _raw_sources(self, position: int) -> List[Tuple[int, int]]:
+        if position in self._sources:
+            return list(self._sources[position])
+        if position >= self._base_n:
+            _, doc_id, chunk_id, _, _ = self._tail[position - self._base_n]
+            return [(doc_id, chunk_id)]
+        base = self._base
+        if base['doc_ids'][position] == -1:
+            return []
+        start, end = base['extra_offsets'][position], base['extra_offsets'][position + 1]
+        return [(int(base['doc_ids'][position]), int(base['chunk_ids'][position]))] + list(zip(
+            base['extra_doc_ids'][start:end].tolist(), base['extra_chunk_ids'][start:end].tolist()
+        ))
+    
+    def positions(self, doc_names: Iterable[str]) -> np.ndarray:
+        """来源（代表来源或去重合并的来源）包含指定文档的行位置，升序"""
+        ids = {self._doc_index[name] for name in doc_names if name in self._doc_index}
+        if not ids:
+            return np.zeros(0, dtype='int64')
+        id_array = np.array(sorted(ids), dtype='int32')
+        base = self._base
+        hits = np.isin(base['doc_ids'], id_array)
+        extra_hits = np.flatnonzero(np.isin(base['extra_doc_ids'], id_array))
+        hits[np.searchsorted(base['extra_offsets'], extra_hits, side='right') - 1] = True
+        result = set(np.flatnonzero(hits).tolist())
+        result.update(i for i, row in enumerate(self._tail, self._base_n) if row[1] in ids)
+        # 来源被修改过的行以修改后的来源为准
+        for position, sources in self._sources.items():
+            if any(doc_id in ids for doc_id, _ in sources):
+                result.add(position)
+            else:
+                result.discard(position)
+        return np.array(sorted(result), dtype='int64')
+    
+    def text(self, position: int) -> str:
+        if position >= self._base_n:
+            return self._tail[position - self._base_n][0]
+        offsets = self._base['offsets']
+        return bytes(self._blob[offsets[position]:offsets[position + 1]]).decode('utf-8')
+    
+    def texts(self, positions: Optional[Iterable[int]] = None) -> List[str]:
+        """按位置读取文本，默认读取全部"""
+        if positions is None:
+            positions = range(len(self))
+        return [self.text(i) for i in positions]
+    
+    def row(self, position: int) -> Dict:
+        """解码一行为 {'doc_name', 'chunk_id', 'chunk', 'sources'}"""
+        sources = [(self.doc_names[doc_id], chunk_id)
+                   for doc_id, chunk_id in self._raw_sources(position)]
+        return {
+            'doc_name': sources[0][0],
+            'chunk_id': sources[0][1],
+            'chunk': self.text(position),
+            'sources': sources
+        }
+    
+    def fingerprint(self, position: int) -> Optional[Fingerprint]:
+        """一行的去重指纹（不论是否已删除），未计算指纹时为None"""
+        if position >= self._base_n:
+            return self._tail[position - self._base_n][3]
+        base = self._base
+        if not base['has_fp'][position]:
+            return None
+        return bytes(base['fp_exact'][position]).hex(), int(base['fp_simhash'][position])
+    
+    def fingerprints(self) -> List[Optional[Fingerprint]]:
+        """全部行的去重指纹，未计算指纹的行和已删除的行为None"""
+        base = self._base
+        exact = [bytes(row).hex() for row in base['fp_exact']]
+        result = [(e, int(s)) if has else None
+                  for e, s, has in zip(exact, base['fp_simhash'].tolist(), base['has_fp'].tolist())]
+        result.extend(row[3] for row in self._tail)
+        for position in self.deleted:
+            result[position] = None
+        return result
+    
+    # ---------- 合并与持久化 ----------
+    
+    def freeze(self, length: int) -> 'ChunkStore':
+        """
+        前 length 行的副本，与本对象共用只读的基础列，只复制追加行和来源修改的引用；
+        可在锁外保存副本，之后用 adopt 让本对象改为映射保存的文件
+        """
+        store = ChunkStore()
+        store.doc_names = list(self.doc_names)
+        store._doc_index = dict(self._doc_index)
+        store.next_id = self.next_id
+        store._base, store._blob, store._base_n = self._base, self._blob, self._base_n
+        store._tail = self._tail[:max(length - self._base_n, 0)]
+        store._sources = {p: sources for p, sources in self._sources.items() if p < length}
+        store.deleted = {p for p in self.deleted if p < length}
+        store._frozen_from = (self._base, dict(store._sources))
+        return store
+    
+    def adopt(self, saved: 'ChunkStore') -> bool:
+        """
+        saved 为 freeze 得到并已保存的副本：本对象的基础列改为映射保存的文件，
+        冻结之后追加的行和修改的来源保留在内存中。冻结之后本对象被压缩过时不替换，返回False
+        """
+        base, sources = saved._frozen_from
+        if self._base is not base:
+            return False
+        length = saved._base_n
+        deleted = self.deleted
+        # 来源在冻结后被修改过（列表被整体替换）的行仍以内存中的为准
+        changed = {p: s for p, s in self._sources.items() if p >= length or sources.get(p) is not s}
+        self._tail = self._tail[length - self._base_n:]
+        self._base, self._blob, self._base_n = saved._base, saved._blob, saved._base_n
+        self._sources = changed
+        self.deleted = deleted
+        return True
+    
+    def _consolidate(self, keep: np.ndarray) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """把基础列、追加行和来源修改合并为只包含 keep 中各行的新列"""
+        base, base_n = self._base, self._base_n
+        kb = keep[keep < base_n]
+        tail = [self._tail[i - base_n] for i in keep[keep >= base_n].tolist()]
+        
+        # 文本：基础部分按连续区间整段复制
+        parts = []
+        if len(kb):
+            breaks = np.flatnonzero(np.diff(kb) != 1) + 1
+            for run in np.split(kb, breaks):
+                parts.append(bytes(self._blob[base['offsets'][run[0]]:base['offsets'][run[-1] + 1]]))
+        lengths = np.diff(base['offsets'])[kb].tolist()
+        for text, _, _, _, _ in tail:
+            data = text.encode('utf-8')
+            parts.append(data)
+            lengths.append(len(data))
+        offsets = np.zeros(len(keep) + 1, dtype='int64')
+        np.cumsum(lengths, out=offsets[1:])
+        blob = np.frombuffer(b''.join(parts), dtype=np.uint8)
+        
+        doc_ids = np.concatenate([base['doc_ids'][kb],
+                                  np.array([row[1] for row in tail], dtype='int32')])
+        chunk_ids = np.concatenate([base['chunk_ids'][kb],
+                                    np.array([row[2] for row in tail], dtype='int32')])
+        ids = np.concatenate([base['ids'][kb], np.array([row[4] for row in tail], dtype='int64')])
+        
+        # 其他来源：只有少数行有，逐行处理
+        extra_counts = np.concatenate([np.diff(base['extra_offsets'])[kb],
+                                       np.zeros(len(tail), dtype='int64')])
+        overridden = {}
+        for position, sources in self._sources.items():
+            j = int(np.searchsorted(keep, position))
+            if j < len(keep) and keep[j] == position:
+                overridden[j] = sources
+                # 已删除的行没有来源，文档编号记为-1
+                doc_ids[j], chunk_ids[j] = sources[0] if sources else (-1, -1)
+                extra_counts[j] = max(len(sources) - 1, 0)
+        extra_doc_ids, extra_chunk_ids = [], []
+        for j in np.flatnonzero(extra_counts).tolist():
+            if j in overridden:
+                extras = overridden[j][1:]
+            else:
+                extras = self._raw_sources(int(keep[j]))[1:]
+            extra_doc_ids.extend(doc_id for doc_id, _ in extras)
+            extra_chunk_ids.extend(chunk_id for _, chunk_id in extras)
+        extra_offsets = np.zeros(len(keep) + 1, dtype='int64')
+        np.cumsum(extra_counts, out=extra_offsets[1:])
+        
+        fp_exact = np.zeros((len(tail), 20), dtype=np.uint8)
+        fp_simhash = np.zeros(len(tail), dtype=np.uint64)
+        has_fp = np.zeros(len(tail), dtype=bool)
+        for i, (_, _, _, fingerprint, _) in enumerate(tail):
+            if fingerprint is not None:
+                fp_exact[i] = np.frombuffer(bytes.fromhex(fingerprint[0]), dtype=np.uint8)
+                fp_simhash[i] = fingerprint[1]
+                has_fp[i] = True
+        
+        columns = {
+            'ids': ids,
+            'doc_ids': doc_ids,
+            'chunk_ids': chunk_ids,
+            'extra_offsets': extra_offsets,
+            'extra_doc_ids': np.array(extra_doc_ids, dtype='int32'),
+            'extra_chunk_ids': np.array(extra_chunk_ids, dtype='int32'),
+            'offsets': offsets,
+            'fp_exact': np.concatenate([base['fp_exact'][kb], fp_exact]),
+            'fp_simhash': np.concatenate([base['fp_simhash'][kb], fp_simhash]),
+            'has_fp': np.concatenate([base['has_fp'][kb], has_fp]),
+        }
+        return columns, blob
+    
+    def save(self, directory: str, extra: Optional[Dict] = None):
+        """
+        保存为列式文件，extra 为随元数据一起保存的JSON数据（如文件清单）
+        保存后改为内存映射新文件，释放内存中的副本
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        columns, blob = self._consolidate(np.arange(len(self)))
+        # 先释放对旧文件的映射，部分系统上被映射的文件不能被替换
+        self._set_base(columns, blob)
+        self._tail = []
+        self._sources = {}
+        
+        for name, array in columns.items():
+            _atomic_save(path / f"{name}.npy", lambda f, a=array: np.save(f, a))
+        _atomic_save(path / "texts.bin", lambda f: f.write(blob.tobytes()))
+        # meta.json 最后写入，其中的行数用于加载时校验各列是否完整
+        meta = {
+            'version': FORMAT_VERSION,
+            'count': len(columns['doc_ids']),
+            'next_id': self.next_id,
+            'doc_names': self.doc_names,
+            'extra': extra or {}
+        }
+        _atomic_save(path / "meta.json",
+                     lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8')))
+        
+        loaded = ChunkStore.load(directory)
+        if loaded is not None:
+            self._set_base(loaded[0]._base, loaded[0]._blob)
+    
+    @classmethod
+    def load(cls, directory: str) -> Optional[Tuple['ChunkStore', Dict]]:
+        """内存映射方式加载，返回 (存储, extra)；文件缺失或不完整时返回None"""
+        path = Path(directory)
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding='utf-8'))
+            version = meta.get('version')
+            if version not in (1, FORMAT_VERSION):
+                return None
+            count = meta['count']
+            columns = {}
+            for name in _COLUMNS:
+                if name == 'ids' and version == 1:
+                    # 第1版没有ID列，以位置作为ID
+                    columns[name] = np.arange(count, dtype='int64')
+                    continue
+                array = np.load(path / f"{name}.npy", mmap_mode='r', allow_pickle=False)
+                # 空数组无法映射，np.load 会直接读入内存
+                columns[name] = array
+            blob_path = path / "texts.bin"
+            size = blob_path.stat().st_size
+            blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
+        except (OSError, ValueError, KeyError):
+            return None
+        
+        lengths_ok = (len(columns['doc_ids']) == count and len(columns['ids']) == count
+                      and len(columns['offsets']) == count + 1
+                      and len(columns['extra_offsets']) == count + 1
+                      and int(columns['offsets'][-1]) == size)
+        if not lengths_ok:
+            return None
+        
+        store = cls()
+        store.doc_names = list(meta['doc_names'])
+        store._doc_index = {name: i for i, name in enumerate(store.doc_names)}
+        store.next_id = meta.get('next_id', count)
+        store._set_base(columns, blob)
+        return store, meta.get('extra', {})
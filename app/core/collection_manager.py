@@ -0,0 +1,155 @@
+"""
+文档集合管理模块
+每个集合有独立的文档目录、索引和元数据，共用同一份embedding模型、向量缓存和LLM。
+默认集合在启动时加载并常驻；其他集合在第一次使用时加载，已加载集合的内存估算超过预算时
+按最近最少使用的顺序卸载，之后再次使用时从已保存的索引重新加载
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from pathlib import Path
+from .research_assistant import ResearchAssistant
+
+DEFAULT_COLLECTION = "default"
+
+# 集合名即子目录名，只允许字母、数字、下划线和连字符，避免请求中的名称指向其他路径
+_NAME = re.compile(r'[\w-]+')
+
+
+class CollectionManager:
+    """
+    文档集合管理
+    collections_dir 下的每个子目录是一个集合（子目录名为集合名，其中的PDF为该集合的文档），
+    索引保存在默认索引旁的 collections/<集合名>/ 中
+    """
+    
+    def __init__(self, default: ResearchAssistant, collections_dir: Optional[str] = None,
+                 memory_budget_mb: Optional[float] = None, options: Optional[Dict] = None,
+                 watch_interval: Optional[float] = None):
+        """
+        default 为已初始化的默认集合，其他集合与它共用模型；
+        memory_budget_mb 为已加载集合的内存预算（MB），None 或 0 表示不限制；
+        options 为创建其他集合的 ResearchAssistant 时使用的参数（索引类型、检索方式等）；
+        watch_interval 不为空时集合加载后在后台监视其文档目录
+        """
+        self.default = default
+        self.collections_dir = Path(collections_dir) if collections_dir else None
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self.options = dict(options or {})
+        self.watch_interval = watch_interval
+        self.loaded = OrderedDict([(DEFAULT_COLLECTION, default)])  # 集合名 -> 助手，按最近使用排序
+        self.lock = threading.Lock()
+        self._load_locks = {}  # 集合名 -> 加载锁，同一集合只加载一次
+    
+    def names(self) -> List[str]:
+        """全部集合名，默认集合在最前"""
+        names = [DEFAULT_COLLECTION]
+        if self.collections_dir is not None and self.collections_dir.is_dir():
+            names += sorted(p.name for p in self.collections_dir.iterdir()
+                            if p.is_dir() and _NAME.fullmatch(p.name) and p.name != DEFAULT_COLLECTION)
+        return names
+    
+    def exists(self, name: str) -> bool:
+        if name == DEFAULT_COLLECTION:
+            return True
+        return (self.collections_dir is not None and bool(_NAME.fullmatch(name))
+                and (self.collections_dir / name).is_dir())
+    
+    def _index_path(self, name: str) -> Path:
+        default_path = Path(self.default.index_path)
+        return default_path.parent / "collections" / name / default_path.name
+    
+    def get_loaded(self, name: Optional[str] = None) -> Optional[ResearchAssistant]:
+        """已加载的集合，未加载时返回None（不触发加载）"""
+        with self.lock:
+            return self.loaded.get(name or DEFAULT_COLLECTION)
+    
+    def get(self, name: Optional[str] = None) -> Optional[ResearchAssistant]:
+        """取得集合，未加载时先加载；name 为空时为默认集合，集合不存在时返回None"""
+        name = name or DEFAULT_COLLECTION
+        if not self.exists(name):
+            return None
+        with self.lock:
+            assistant = self.loaded.get(name)
+            if assistant is not None:
+                self.loaded.move_to_end(name)
+                return assistant
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        
+        # 加载可能需要构建索引，在管理锁外进行，不阻塞其他集合的检索
+        with load_lock:
+            with self.lock:
+                assistant = self.loaded.get(name)
+            if assistant is None:
+                assistant = self._load(name)
+                with self.lock:
+                    self.loaded[name] = assistant
+                self._evict(keep=name)
+        return assistant
+    
+    def _load(self, name: str) -> ResearchAssistant:
+        print(f"加载文档集合: {name}")
+        assistant = ResearchAssistant(documents_dir=str(self.collections_dir / name),
+                                      index_path=str(self._index_path(name)),
+                                      share_from=self.default, **self.options)
+        assistant.initialize()
+        if self.watch_interval is not None:
+            assistant.start_watcher(interval=self.watch_interval)
+        return assistant
+    
+    def _evict(self, keep: str):
+        """已加载集合的内存估算超过预算时，从最久未使用的开始卸载；默认集合和正在更新的集合不卸载"""
+        if self.memory_budget is None:
+            return
+        with self.lock:
+            candidates = list(self.loaded.items())
+        # 估算需要获取各集合的索引锁，在管理锁外进行
+        usage = {name: assistant.memory_usage() for name, assistant in candidates}
+        total = sum(usage.values())
+        evicted = []
+        with self.lock:
+            for name, assistant in candidates:
+                if total <= self.memory_budget:
+                    break
+                if name in (DEFAULT_COLLECTION, keep) or self.loaded.get(name) is not assistant:
+                    continue
+                # 正在更新索引的集合不卸载
+                if not assistant.update_lock.acquire(blocking=False):
+                    continue
+                try:
+                    del self.loaded[name]
+                finally:
+                    assistant.update_lock.release()
+                total -= usage[name]
+                evicted.append((name, assistant))
+        for name, assistant in evicted:
+            # 进行中的问答持有助手的引用，可以正常完成
+            assistant.close()
+            print(f"已卸载文档集合 {name}（约 {usage[name] / 1024 / 1024:.1f} MB）")
+        if total > self.memory_budget:
+            print(f"已加载的文档集合约占 {total / 1024 / 1024:.1f} MB，"
+                  f"超过内存预算 {self.memory_budget / 1024 / 1024:.1f} MB")
+    
+    def stats(self) -> List[Dict]:
+        """各集合的加载状态和内存估算"""
+        with self.lock:
+            loaded = dict(self.loaded)
+        result = []
+        for name in self.names():
+            assistant = loaded.get(name)
+            result.append({
+                'name': name,
+                'loaded': assistant is not None,
+                'document_count': len(assistant.documents_text) if assistant is not None else None,
+                'memory_mb': (round(assistant.memory_usage() / 1024 / 1024, 1)
+                              if assistant is not None else None)
+            })
+        return result
+    
+    def close(self):
+        """卸载全部集合"""
+        with self.lock:
+            assistants = list(self.loaded.values())
+        for assistant in assistants:
+            assistant.close()
@@ -0,0 +1,102 @@
+"""
+文本块去重模块
+在入库前识别完全重复和近似重复的文本块（页眉页脚、参考文献、模板文字等），
+同一簇只向量化和索引一次
+"""
+import re
+import hashlib
+import numpy as np
+from typing import List, Optional, Tuple
+
+# 中日韩字符逐字切分，其他文字按词切分
+_TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]|[^\W\u3400-\u4dbf\u4e00-\u9fff]+')
+
+Fingerprint = Tuple[str, int]
+
+
+class ChunkDeduplicator:
+    """
+    基于规范化哈希（完全重复）和SimHash（近似重复）的去重器
+    SimHash为64位，分成4段各16位建立LSH分桶：汉明距离不超过3的两个指纹
+    至少有一段完全相同，因此只需比较同桶的候选即可
+    """
+    
+    BANDS = 4
+    BAND_BITS = 16
+    
+    def __init__(self, max_distance: int = 3, shingle_size: int = 3):
+        if max_distance >= self.BANDS:
+            raise ValueError(f"max_distance 必须小于 {self.BANDS}")
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.exact = {}  # 规范化文本哈希 -> 位置
+        self.buckets = [{} for _ in range(self.BANDS)]  # 分段值 -> [(simhash, 位置)]
+        self.stale = False  # 查找表已失效，使用前须按当前位置重建
+    
+    def fingerprint(self, text: str) -> Fingerprint:
+        """计算文本块指纹 (规范化哈希, SimHash)"""
+        tokens = _TOKEN_RE.findall(text.lower())
+        exact_key = hashlib.sha1(" ".join(tokens).encode('utf-8')).hexdigest()
+        return exact_key, self._simhash(tokens)
+    
+    def _simhash(self, tokens: List[str]) -> int:
+        n = self.shingle_size
+        shingles = {" ".join(tokens[i:i + n]) for i in range(max(len(tokens) - n + 1, 1))}
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+             for s in shingles],
+            dtype=np.uint64
+        )
+        # 每一位上统计1的个数，超过一半则指纹该位为1
+        bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+        votes = bits.sum(axis=0) * 2 > len(hashes)
+        return int(np.packbits(votes, bitorder='little').view('<u8')[0])
+    
+    def _bands(self, simhash: int) -> List[int]:
+        mask = (1 << self.BAND_BITS) - 1
+        return [(simhash >> (i * self.BAND_BITS)) & mask for i in range(self.BANDS)]
+    
+    def find(self, fingerprint: Fingerprint) -> Optional[int]:
+        """查找已登记的重复块，返回其位置，不存在时返回None"""
+        exact_key, simhash = fingerprint
+        if exact_key in self.exact:
+            return self.exact[exact_key]
+        for band, value in enumerate(self._bands(simhash)):
+            for other, position in self.buckets[band].get(value, ()):
+                if bin(simhash ^ other).count('1') <= self.max_distance:
+                    return position
+        return None
+    
+    def add(self, fingerprint: Fingerprint, position: int):
+        """登记一个新的代表块"""
+        exact_key, simhash = fingerprint
+        self.exact.setdefault(exact_key, position)
+        for band, value in enumerate(self._bands(simhash)):
+            self.buckets[band].setdefault(value, []).append((simhash, position))
+    
+    def remove(self, fingerprint: Fingerprint, position: int):
+        """移除一个代表块（所在行已删除）"""
+        if self.stale:
+            return
+        exact_key, simhash = fingerprint
+        if self.exact.get(exact_key) == position:
+            del self.exact[exact_key]
+        for band, value in enumerate(self._bands(simhash)):
+            entries = self.buckets[band].get(value)
+            if entries and (simhash, position) in entries:
+                entries.remove((simhash, position))
+    
+    def invalidate(self):
+        """向量位置变化（加载、压缩）后丢弃查找表，到下次入库前再重建"""
+        self.exact = {}
+        self.buckets = [{} for _ in range(self.BANDS)]
+        self.stale = True
+    
+    def rebuild(self, fingerprints: List[Optional[Fingerprint]]):
+        """按新位置重建查找表"""
+        self.exact = {}
+        self.buckets = [{} for _ in range(self.BANDS)]
+        for position, fingerprint in enumerate(fingerprints):
+            if fingerprint is not None:
+                self.add(tuple(fingerprint), position)
+        self.stale = False
@@ -1,91 +1,629 @@
-"""
-PDF文档处理模块
-负责PDF文档的读取、文本提取和分块
-"""
-import os
-import pdfplumber
-from typing import List, Dict
-from pathlib import Path
-
-
-class DocumentProcessor:
-    """文档处理器"""
-    
-    def __init__(self, documents_dir: str = "documents"):
-        self.documents_dir = Path(documents_dir)
-        self.documents_dir.mkdir(exist_ok=True)
-    
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """从PDF中提取文本"""
-        try:
-            text = ""
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            return text.strip()
-        except Exception as e:
-            print(f"提取PDF文本时出错 {pdf_path}: {e}")
-            return ""
-    
-    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-        """将文本分块，用于向量化"""
-        if not text:
-            return []
-        
-        # 按段落分割
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-        
-        chunks = []
-        current_chunk = ""
-        
-        for para in paragraphs:
-            # 如果当前块加上新段落不超过chunk_size，则添加
-            if len(current_chunk) + len(para) <= chunk_size:
-                current_chunk += para + "\n\n"
-            else:
-                # 保存当前块
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                # 如果段落本身很长，需要进一步分割
-                if len(para) > chunk_size:
-                    words = para.split()
-                    temp_chunk = ""
-                    for word in words:
-                        if len(temp_chunk) + len(word) + 1 <= chunk_size:
-                            temp_chunk += word + " "
-                        else:
-                            if temp_chunk:
-                                chunks.append(temp_chunk.strip())
-                            temp_chunk = word + " "
-                    current_chunk = temp_chunk
-                else:
-                    current_chunk = para + "\n\n"
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
-    
-    def process_documents(self) -> Dict[str, List[str]]:
-        """处理所有PDF文档"""
-        documents = {}
-        pdf_files = list(self.documents_dir.glob("*.pdf"))
-        
-        if not pdf_files:
-            print(f"在 {self.documents_dir} 中未找到PDF文件")
-            return documents
-        
-        print(f"找到 {len(pdf_files)} 个PDF文件，开始处理...")
-        
-        for pdf_path in pdf_files:
-            print(f"处理: {pdf_path.name}")
-            text = self.extract_text_from_pdf(str(pdf_path))
-            if text:
-                chunks = self.chunk_text(text)
-                documents[pdf_path.name] = chunks
-                print(f"  - 提取了 {len(chunks)} 个文本块")
-        
-        return documents
-
+"""
+PDF文档处理模块
+负责PDF文档的读取、文本提取和分块
+"""
+import os
+import time
+import unicodedata
+import multiprocessing
+from multiprocessing import connection
+import pdfplumber
+from PyPDF2 import PdfReader
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Optional, Tuple, Iterator, Iterable
+from pathlib import Path
+from .extraction_cache import ExtractionCache, file_hash
+from .text_chunker import TokenChunker, load_tokenizer, default_max_tokens
+
+
+def _process_file_worker(processor: "DocumentProcessor", pdf_path: str) -> Tuple[str, str, List[str]]:
+    """子进程入口：处理单个PDF文件，返回 (文件名, 文本, 文本块)"""
+    text, chunks = processor._extract_and_chunk(pdf_path)
+    return Path(pdf_path).name, text, chunks
+
+
+def _is_garbled(text: Optional[str]) -> bool:
+    """
+    判断快速提取的页面文本是否不可用：空白、含替换字符或(cid:x)占位符、
+    私有区/控制字符过多，或者几乎没有文字字符（常见于字体编码缺失的扫描件）
+    """
+    if not text or not text.strip():
+        return True
+    if '(cid:' in text:
+        return True
+    chars = [c for c in text if not c.isspace()]
+    bad = sum(1 for c in chars
+              if c == '\ufffd' or unicodedata.category(c) in ('Co', 'Cc', 'Cs'))
+    if bad > 0.05 * len(chars):
+        return True
+    alnum = sum(1 for c in chars if c.isalnum())
+    return alnum < 0.3 * len(chars)
+
+
+def _extract_range_worker(processor: "DocumentProcessor", pdf_path: str,
+                          start: int, end: int) -> List[str]:
+    """子进程入口：提取PDF指定页码范围的文本"""
+    return list(processor.iter_pages(pdf_path, start, end))
+
+
+def _isolated_worker(conn, processor: "DocumentProcessor", task: Tuple[str, int, Optional[int]]):
+    """子进程入口：在独立进程中处理单个任务，通过管道返回 (是否成功, 结果或错误信息)"""
+    path, start, end = task
+    try:
+        if end is None:
+            result = _process_file_worker(processor, path)
+        else:
+            result = _extract_range_worker(processor, path, start, end)
+        conn.send((True, result))
+    except Exception as e:
+        conn.send((False, str(e)))
+    finally:
+        conn.close()
+
+
+def _terminate_pool(executor: ProcessPoolExecutor):
+    """终止进程池的全部工作进程，正在运行的任务无法通过取消停止"""
+    terminate = getattr(executor, 'terminate_workers', None)  # Python 3.14+
+    if terminate is not None:
+        terminate()
+        return
+    for process in list((getattr(executor, '_processes', None) or {}).values()):
+        process.kill()
+
+
+class _StreamingChunker:
+    """
+    按字符数分块的增量分块器：文本可以分多次输入，输出与一次性对全文分块完全一致
+    只保留未完成的段落和当前块，超长段落按词边界边读边切分；
+    当前块以片段列表和累计长度表示，输出时才拼接，不做逐段字符串拼接
+    """
+    
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.current = []  # 当前块的片段（段落 + 分隔符，或按词切分的词 + 空格）
+        self.current_len = 0
+        self.buffer = ""  # 尚未遇到段落分隔符的文本
+        self.long_para = False  # 当前段落已确定超过chunk_size，正在按词切分
+        self.words = []  # 超长段落中正在累积的词
+        self.words_len = 0  # 各词加一个空格的总长度
+    
+    def feed(self, text: str) -> List[str]:
+        """输入一段文本，返回已完成的文本块"""
+        out = []
+        self.buffer += text
+        while True:
+            idx = self.buffer.find('\n\n')
+            if self.long_para:
+                if idx == -1:
+                    # 只切分到最后一个空白字符为止，保留可能未完整的词
+                    cut = len(self.buffer) - 1
+                    while cut >= 0 and not self.buffer[cut].isspace():
+                        cut -= 1
+                    if cut > 0:
+                        self._add_words(self.buffer[:cut].split(), out)
+                        self.buffer = self.buffer[cut:]
+                    break
+                self._add_words(self.buffer[:idx].split(), out)
+                self.buffer = self.buffer[idx + 2:]
+                self._end_long_para()
+                continue
+            if idx == -1:
+                if len(self.buffer) > self.chunk_size and len(self.buffer.strip()) > self.chunk_size:
+                    # 段落尚未结束但已超长，提前进入按词切分模式
+                    self._flush_current(out)
+                    self.long_para = True
+                    self.words, self.words_len = [], 0
+                    continue
+                break
+            para = self.buffer[:idx].strip()
+            self.buffer = self.buffer[idx + 2:]
+            if para:
+                self._add_paragraph(para, out)
+        return out
+    
+    def finish(self) -> List[str]:
+        """输入结束，返回剩余的文本块"""
+        out = []
+        if self.long_para:
+            self._add_words(self.buffer.split(), out)
+            self._end_long_para()
+        else:
+            para = self.buffer.strip()
+            if para:
+                self._add_paragraph(para, out)
+        self.buffer = ""
+        self._flush_current(out)
+        return out
+    
+    def _flush_current(self, out: List[str]):
+        """输出当前块（非空时）并清空"""
+        if self.current:
+            out.append("".join(self.current).strip())
+        self.current, self.current_len = [], 0
+    
+    def _add_paragraph(self, para: str, out: List[str]):
+        # 如果当前块加上新段落不超过chunk_size，则添加
+        if self.current_len + len(para) <= self.chunk_size:
+            self.current.extend((para, "\n\n"))
+            self.current_len += len(para) + 2
+        else:
+            # 保存当前块
+            self._flush_current(out)
+            # 如果段落本身很长，需要进一步分割
+            if len(para) > self.chunk_size:
+                self.words, self.words_len = [], 0
+                self._add_words(para.split(), out)
+                self._end_long_para()
+            else:
+                self.current, self.current_len = [para, "\n\n"], len(para) + 2
+    
+    def _add_words(self, words: List[str], out: List[str]):
+        for word in words:
+            if self.words_len + len(word) + 1 > self.chunk_size and self.words:
+                out.append(" ".join(self.words))
+                self.words, self.words_len = [], 0
+            self.words.append(word)
+            self.words_len += len(word) + 1
+    
+    def _end_long_para(self):
+        """超长段落结束，未满的最后一段词作为当前块继续累积后续段落"""
+        self.long_para = False
+        self.current = [" ".join(self.words) + " "] if self.words else []
+        self.current_len = self.words_len
+        self.words, self.words_len = [], 0
+
+
+class DocumentProcessor:
+    """文档处理器"""
+    
+    # 可选的文本提取后端
+    BACKENDS = ('pdfplumber', 'pypdf')
+    
+    def __init__(self, documents_dir: str = "documents", num_workers: int = 1,
+                 chunk_size: int = 500, chunk_overlap: int = 50,
+                 cache_dir: Optional[str] = None,
+                 extraction_backend: str = "pdfplumber",
+                 tokenizer_name: Optional[str] = None,
+                 max_tokens: Optional[int] = None):
+        """
+        初始化文档处理器
+        num_workers > 1 时使用多进程并行处理PDF，<= 0 表示使用全部CPU核心
+        cache_dir 不为空时按文件内容哈希缓存提取结果
+        extraction_backend 为 pypdf 时优先使用PyPDF2快速提取文本层，
+        空白或乱码页面自动回退到pdfplumber
+        tokenizer_name 不为空时使用该分词器按token分块，每块不超过 max_tokens
+        （默认为模型最大输入长度），chunk_overlap 表示重叠的token数；
+        否则按字符数 chunk_size 在段落和词边界处分块（块之间不重叠）
+        """
+        if extraction_backend not in self.BACKENDS:
+            raise ValueError(f"不支持的提取后端: {extraction_backend}，可选: {', '.join(self.BACKENDS)}")
+        self.documents_dir = Path(documents_dir)
+        self.documents_dir.mkdir(exist_ok=True)
+        if num_workers <= 0:
+            num_workers = os.cpu_count() or 1
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer_name = tokenizer_name
+        self.max_tokens = max_tokens
+        self.extraction_backend = extraction_backend
+        # 不同后端提取的文本不同，缓存按后端分目录存放
+        self.cache = ExtractionCache(str(Path(cache_dir) / extraction_backend)) if cache_dir else None
+        # 页数超过阈值的PDF在并行模式下按页码范围拆分给多个进程
+        self.split_page_threshold = 200
+        self.min_pages_per_task = 50
+        self.split_min_size = 2 * 1024 * 1024
+        # 并行模式下单个任务的最长处理时间（秒），超时的文件被跳过，下次处理时重试
+        self.task_timeout = 600
+    
+    def iter_pages(self, pdf_path: str, start: int = 0,
+                   end: Optional[int] = None) -> Iterator[str]:
+        """逐页提取PDF文本（可指定页码范围），解析完一页立即释放该页缓存的对象"""
+        if self.extraction_backend == 'pypdf':
+            for page_text, _ in self._iter_pages_pypdf(pdf_path, start, end):
+                yield page_text
+            return
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages[start:end]:
+                page_text = page.extract_text()
+                page.close()
+                if page_text:
+                    yield page_text
+    
+    def _iter_pages_pypdf(self, pdf_path: str, start: int = 0,
+                          end: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """
+        使用PyPDF2逐页提取文本，返回 (页面文本, 实际使用的后端)
+        PyPDF2只读取文本层，速度快但不做版面分析；结果为空或疑似乱码的页面用pdfplumber重新提取
+        """
+        reader = PdfReader(pdf_path)
+        plumber_pdf = None
+        try:
+            for page_no in range(len(reader.pages))[start:end]:
+                try:
+                    page_text = reader.pages[page_no].extract_text()
+                except Exception:
+                    page_text = ""
+                source = 'pypdf'
+                if _is_garbled(page_text):
+                    if plumber_pdf is None:
+                        plumber_pdf = pdfplumber.open(pdf_path)
+                    page = plumber_pdf.pages[page_no]
+                    page_text = page.extract_text()
+                    page.close()
+                    source = 'pdfplumber'
+                if page_text:
+                    yield page_text, source
+        finally:
+            if plumber_pdf is not None:
+                plumber_pdf.close()
+    
+    def extract_text_from_pdf(self, pdf_path: str) -> str:
+        """从PDF中提取文本"""
+        try:
+            return "\n".join(self.iter_pages(pdf_path)).strip()
+        except Exception as e:
+            print(f"提取PDF文本时出错 {pdf_path}: {e}")
+            return ""
+    
+    def chunk_text(self, text: str) -> List[str]:
+        """按配置的分块方式将文本分块，用于向量化；按token分块时相邻块重叠 chunk_overlap 个token"""
+        if not text:
+            return []
+        
+        chunker = self._new_chunker()
+        chunks = chunker.feed(text)
+        chunks.extend(chunker.finish())
+        return chunks
+        
+    def iter_chunks(self, pdf_path: str) -> Iterator[str]:
+        """
+        流式提取并分块：每解析一页就产出已完成的文本块
+        内存占用只与分块大小和单页文本有关，与文档总长度无关
+        解析出错时异常会抛给调用方，由调用方回滚已写入的部分结果
+        """
+        chunker = self._new_chunker()
+        for page_text in self.iter_pages(pdf_path):
+            yield from chunker.feed(page_text + "\n")
+        yield from chunker.finish()
+    
+    def _extract_and_chunk(self, pdf_path: str) -> Tuple[str, List[str]]:
+        """提取并分块单个PDF文件，返回 (文本, 文本块)"""
+        try:
+            pages = list(self.iter_pages(str(pdf_path)))
+        except Exception as e:
+            print(f"提取PDF文本时出错 {pdf_path}: {e}")
+            return "", []
+        return self._chunk_pages(pages)
+    
+    def _chunk_pages(self, pages: List[str]) -> Tuple[str, List[str]]:
+        """将按顺序排列的页面文本拼接并分块，结果与串行提取完全一致"""
+        text = "\n".join(pages).strip()
+        if not text:
+            return "", []
+        chunker = self._new_chunker()
+        chunks = []
+        for page_text in pages:
+            chunks.extend(chunker.feed(page_text + "\n"))
+        chunks.extend(chunker.finish())
+        return text, chunks
+    
+    def stream_chunks(self, pdf_path: str, content_hash: str) -> Iterator[str]:
+        """
+        逐块产出文档的文本块：提取缓存命中时逐行读取缓存，否则调用 iter_chunks 流式提取，
+        同时逐块写入缓存，全部完成后才生效；中途出错或未读完时不留下缓存
+        """
+        params_key = self._chunk_params_key()
+        cached = self.cache.iter_chunks(content_hash, params_key) if self.cache is not None else None
+        if cached is not None:
+            yield from cached
+            return
+        writer = self.cache.chunk_writer(content_hash, params_key) if self.cache is not None else None
+        try:
+            for chunk in self.iter_chunks(pdf_path):
+                if writer is not None:
+                    writer.write(chunk)
+                yield chunk
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            writer.commit()
+    
+    def prune_cache(self, live_hashes: Iterable[str]):
+        """删除不属于给定文件内容哈希的提取缓存，以及其他分块参数下的旧分块结果"""
+        if self.cache is not None:
+            self.cache.prune(live_hashes, self._chunk_params_key())
+    
+    def _new_chunker(self):
+        """按配置创建增量分块器：指定分词器时按token分块，否则按字符分块"""
+        if self.tokenizer_name:
+            tokenizer = load_tokenizer(self.tokenizer_name)
+            max_tokens = self.max_tokens or default_max_tokens(tokenizer)
+            return TokenChunker(tokenizer, max_tokens, self.chunk_overlap)
+        return _StreamingChunker(self.chunk_size)
+    
+    def _chunk_params_key(self) -> str:
+        """分块参数缓存键，参数变化时自动使旧分块缓存失效"""
+        if self.tokenizer_name:
+            return ExtractionCache.params_key(tokenizer=self.tokenizer_name,
+                                              max_tokens=self.max_tokens,
+                                              overlap=self.chunk_overlap)
+        # 按字符分块不使用重叠，重叠长度不影响结果
+        return ExtractionCache.params_key(chunk_size=self.chunk_size)
+    
+    def scan_documents(self, previous: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+        """
+        扫描文档目录，返回文件清单 {文件名: {'mtime', 'size', 'hash'}}
+        修改时间和大小都未变化的文件直接沿用 previous 中的哈希，避免重复读取
+        """
+        previous = previous or {}
+        manifest = {}
+        for pdf_path in sorted(self.documents_dir.glob("*.pdf")):
+            stat = pdf_path.stat()
+            entry = previous.get(pdf_path.name)
+            if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                content_hash = entry['hash']
+            else:
+                content_hash = file_hash(str(pdf_path))
+            manifest[pdf_path.name] = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'hash': content_hash
+            }
+        return manifest
+    
+    def process_documents(self, num_workers: Optional[int] = None,
+                          names: Optional[List[str]] = None,
+                          known_hashes: Optional[Dict[str, str]] = None) -> Dict[str, List[str]]:
+        """
+        处理所有PDF文档，指定 names 时只处理这些文件
+        known_hashes 为已知的 {文件名: 内容哈希}（如 scan_documents 的清单），这些文件不再重新计算哈希
+        """
+        known_hashes = known_hashes or {}
+        documents = {}
+        pdf_files = sorted(self.documents_dir.glob("*.pdf"))
+        if names is not None:
+            wanted = set(names)
+            pdf_files = [p for p in pdf_files if p.name in wanted]
+        
+        if not pdf_files:
+            print(f"在 {self.documents_dir} 中未找到PDF文件")
+            return documents
+        
+        print(f"找到 {len(pdf_files)} 个PDF文件，开始处理...")
+        
+        results = {}
+        hashes = {}
+        to_process = pdf_files
+        if self.cache is not None:
+            to_process = []
+            params_key = self._chunk_params_key()
+            for pdf_path in pdf_files:
+                content_hash = known_hashes.get(pdf_path.name) or file_hash(str(pdf_path))
+                hashes[pdf_path.name] = content_hash
+                chunks = self.cache.get_chunks(content_hash, params_key)
+                if chunks is None:
+                    # 文本已缓存但分块参数变化，只需重新分块
+                    text = self.cache.get_text(content_hash)
+                    if text is not None:
+                        chunks = self._chunk_pages([text])[1]
+                        self.cache.put_chunks(content_hash, params_key, chunks)
+                if chunks is None:
+                    to_process.append(pdf_path)
+                else:
+                    results[pdf_path.name] = chunks
+            if results:
+                print(f"从缓存加载 {len(results)} 个文件，需要解析 {len(to_process)} 个文件")
+        
+        num_workers = self.num_workers if num_workers is None else num_workers
+        tasks = self._plan_tasks(to_process, num_workers) if num_workers > 1 else []
+        
+        if len(tasks) > 1:
+            extracted = self._process_parallel(tasks, min(num_workers, len(tasks)))
+        else:
+            extracted = {}
+            for i, pdf_path in enumerate(to_process, 1):
+                print(f"[{i}/{len(to_process)}] 处理: {pdf_path.name}")
+                extracted[pdf_path.name] = self._extract_and_chunk(str(pdf_path))
+                print(f"  - 提取了 {len(extracted[pdf_path.name][1])} 个文本块")
+        
+        for name, (text, chunks) in extracted.items():
+            results[name] = chunks
+            # 只缓存成功提取的结果，失败的文件下次启动会重试
+            if self.cache is not None and text:
+                self.cache.put_text(hashes[name], text)
+                self.cache.put_chunks(hashes[name], self._chunk_params_key(), chunks)
+        
+        # 只处理部分文件时无法判断其余缓存是否过期，跳过清理
+        if self.cache is not None and names is None:
+            self.cache.prune(hashes.values(), self._chunk_params_key())
+        
+        # 按文件名顺序输出，保证与串行处理结果一致
+        for pdf_path in pdf_files:
+            chunks = results.get(pdf_path.name)
+            if chunks:
+                documents[pdf_path.name] = chunks
+        
+        return documents
+
+    def _count_pages(self, pdf_path: str) -> int:
+        """读取PDF页数，失败时返回0"""
+        try:
+            with pdfplumber.open(pdf_path) as pdf:
+                return len(pdf.pages)
+        except Exception:
+            return 0
+    
+    def _plan_tasks(self, pdf_files: List[Path], num_workers: int) -> List[Tuple[str, int, Optional[int]]]:
+        """
+        生成并行任务列表 (路径, 起始页, 结束页)
+        结束页为None表示整个文件；超大PDF按页码范围拆分成多个任务
+        """
+        tasks = []
+        for pdf_path in pdf_files:
+            page_count = 0
+            # 只对体积较大的文件读取页数，避免逐个打开所有PDF
+            if pdf_path.stat().st_size >= self.split_min_size:
+                page_count = self._count_pages(str(pdf_path))
+            if page_count >= self.split_page_threshold:
+                range_size = max(self.min_pages_per_task, -(-page_count // num_workers))
+                for start in range(0, page_count, range_size):
+                    tasks.append((str(pdf_path), start, min(start + range_size, page_count)))
+            else:
+                tasks.append((str(pdf_path), 0, None))
+        return tasks
+    
+    def _process_parallel(self, tasks: List[Tuple[str, int, Optional[int]]],
+                          num_workers: int) -> Dict[str, Tuple[str, List[str]]]:
+        """
+        使用进程池并行处理PDF，单个文件失败、崩溃或超时不影响其余文件
+        工作进程崩溃或任务超时后终止进程池，未完成的任务改为每个任务一个独立进程重新处理，
+        只跳过导致问题的文件
+        """
+        results = {}
+        # 按页码范围拆分的文件：{路径: {起始页: 页面文本列表}}
+        range_parts = {}
+        range_counts = {}
+        for path, start, end in tasks:
+            if end is not None:
+                range_parts[path] = {}
+                range_counts[path] = range_counts.get(path, 0) + 1
+        total = len({path for path, _, _ in tasks})
+        done = 0
+        
+        def finish(task, result, error=None):
+            nonlocal done
+            path, start, end = task
+            name = Path(path).name
+            if name in results:
+                # 同一文件的其他页码范围已失败
+                return
+            if error is not None:
+                print(f"处理PDF时出错 {name}: {error}")
+                text, chunks = "", []
+            elif end is None:
+                _, text, chunks = result
+            else:
+                parts = range_parts[path]
+                parts[start] = result
+                if len(parts) < range_counts[path]:
+                    return
+                # 所有页码范围完成后按顺序拼接，再统一分块
+                pages = [page for key in sorted(parts) for page in parts[key]]
+                text, chunks = self._chunk_pages(pages)
+            done += 1
+            results[name] = (text, chunks)
+            print(f"[{done}/{total}] 完成: {name} - 提取了 {len(chunks)} 个文本块")
+
+        print(f"使用 {num_workers} 个进程并行处理")
+        if range_parts:
+            print(f"{len(range_parts)} 个大文件按页码范围拆分为 {sum(range_counts.values())} 个任务")
+        
+        unfinished = self._run_pool(tasks, num_workers, finish)
+        pending = [task for task in unfinished if Path(task[0]).name not in results]
+        if pending:
+            print(f"在独立进程中重新处理剩余 {len(pending)} 个任务...")
+            self._run_isolated(pending, num_workers, finish)
+            
+        return results
+    
+    def _run_pool(self, tasks: List[Tuple[str, int, Optional[int]]], num_workers: int,
+                  finish) -> List[Tuple[str, int, Optional[int]]]:
+        """
+        在进程池中运行任务，完成的任务交给 finish 处理
+        工作进程崩溃或有任务超过 task_timeout 秒时终止进程池，返回未完成的任务
+        """
+        unfinished = []
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+        try:
+            futures = {}
+            for task in tasks:
+                path, start, end = task
+                if end is None:
+                    future = executor.submit(_process_file_worker, self, path)
+                else:
+                    future = executor.submit(_extract_range_worker, self, path, start, end)
+                futures[future] = task
+            
+            started = {}  # 任务 -> 开始运行的时间
+            not_done = set(futures)
+            while not_done:
+                finished, not_done = wait(not_done, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = futures[future]
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        # 工作进程崩溃（如解析器段错误），无法确定是哪个文件导致的，稍后逐个重试
+                        unfinished.append(task)
+                        continue
+                    except Exception as e:
+                        finish(task, None, e)
+                        continue
+                    finish(task, result)
+                    
+                now = time.monotonic()
+                for future in not_done:
+                    if future.running():
+                        started.setdefault(future, now)
+                if any(now - started[future] > self.task_timeout
+                       for future in not_done if future in started):
+                    print(f"有任务超过 {self.task_timeout} 秒未完成，终止进程池")
+                    unfinished.extend(futures[future] for future in not_done)
+                    _terminate_pool(executor)
+                    break
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return unfinished
+    
+    def _run_isolated(self, tasks: List[Tuple[str, int, Optional[int]]], num_workers: int, finish):
+        """
+        每个任务在单独的新进程中运行，同时最多 num_workers 个，完成的任务交给 finish 处理
+        进程崩溃或超过 task_timeout 秒的任务记为失败，不影响其他任务
+        """
+        context = multiprocessing.get_context()
+        pending = list(tasks)
+        running = {}  # 连接 -> (进程, 任务, 截止时间)
+        try:
+            while pending or running:
+                while pending and len(running) < num_workers:
+                    task = pending.pop(0)
+                    parent_conn, child_conn = context.Pipe(duplex=False)
+                    process = context.Process(target=_isolated_worker, args=(child_conn, self, task),
+                                              daemon=True)
+                    process.start()
+                    child_conn.close()
+                    running[parent_conn] = (process, task, time.monotonic() + self.task_timeout)
+                
+                for conn in connection.wait(list(running), timeout=1.0):
+                    process, task, _ = running.pop(conn)
+                    try:
+                        ok, payload = conn.recv()
+                    except EOFError:
+                        ok, payload = False, None
+                    conn.close()
+                    process.join()
+                    if payload is None:
+                        payload = f"工作进程异常退出（退出码 {process.exitcode}）"
+                    if ok:
+                        finish(task, payload)
+                    else:
+                        finish(task, None, payload)
+        
+                now = time.monotonic()
+                for conn, (process, task, deadline) in list(running.items()):
+                    if now > deadline:
+                        del running[conn]
+                        process.kill()
+                        process.join()
+                        conn.close()
+                        finish(task, None, f"处理超过 {self.task_timeout} 秒，已跳过")
+        finally:
+            for conn, (process, _, _) in running.items():
+                process.kill()
+                process.join()
+                conn.close()
+        
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+文档目录监视模块
+Web模式下在后台线程中轮询文档目录，文件变化稳定后自动增量更新索引
+"""
+import os
+import time
+import threading
+from typing import Callable, Dict, Tuple
+from pathlib import Path
+
+
+class DocumentWatcher(threading.Thread):
+    """
+    文档目录监视线程
+    每隔 interval 秒扫描一次目录中PDF文件的修改时间和大小；
+    检测到变化后等待目录连续 debounce 秒没有新变化（如大文件仍在复制）再触发回调，
+    多次连续的文件事件只触发一次更新
+    """
+    
+    def __init__(self, documents_dir: str, on_change: Callable[[], object],
+                 interval: float = 2.0, debounce: float = 5.0):
+        super().__init__(name="DocumentWatcher", daemon=True)
+        self.documents_dir = Path(documents_dir)
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self._stop_event = threading.Event()
+    
+    def snapshot(self) -> Dict[str, Tuple[float, int]]:
+        """目录中PDF文件的 {文件名: (修改时间, 大小)}"""
+        result = {}
+        try:
+            entries = list(os.scandir(self.documents_dir))
+        except OSError:
+            return result
+        for entry in entries:
+            if not entry.name.lower().endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # 扫描期间被删除
+                continue
+            if entry.is_file():
+                result[entry.name] = (stat.st_mtime, stat.st_size)
+        return result
+    
+    def run(self):
+        synced = self.snapshot()  # 上次更新索引时的目录状态
+        last = synced
+        changed_at = None
+        while not self._stop_event.wait(self.interval):
+            current = self.snapshot()
+            if current != last:
+                # 仍有文件在变化，重新计时
+                last = current
+                changed_at = time.monotonic()
+                continue
+            if current == synced or time.monotonic() - changed_at < self.debounce:
+                continue
+            print(f"检测到文档目录变化，开始更新索引: {self.documents_dir}")
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"自动更新索引时出错: {e}")
+            synced = current
+            changed_at = None
+    
+    def stop(self, timeout: float = None):
+        """停止监视线程"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,178 @@
+"""
+向量缓存模块
+按 (embedding模型, 文本块哈希) 在磁盘上缓存文本块向量，重建索引或更换索引类型时
+只需向量化之前没有见过的文本块
+"""
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只保证单进程内的一致性
+    fcntl = None
+
+
+def chunk_key(chunk: str) -> str:
+    """文本块的内容哈希"""
+    return hashlib.sha1(chunk.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    只追加的向量缓存
+    每个模型一个目录：vectors.bin 为按行存放的原始 float32/float16 向量（可用 np.memmap 直接映射），
+    keys.txt 每行一个文本块哈希，行号即向量所在行。先写向量再写哈希，进程中断时
+    以两者中较短的一方为准，多出的部分在下次写入时截掉。
+    多个进程可以共用同一个缓存目录：写入时持有目录的文件锁，按磁盘上的实际行数追加，
+    读写前先加载其他进程追加的哈希，行号与文件保持一致
+    """
+    
+    DTYPES = ('float32', 'float16')
+    
+    def __init__(self, cache_dir: str, model_name: str, dtype: str = "float32"):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"不支持的向量缓存精度: {dtype}，可选: {', '.join(self.DTYPES)}")
+        slug = re.sub(r'[^\w.-]+', '_', model_name)
+        self.cache_dir = Path(cache_dir) / f"{slug}_{dtype}"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = self.cache_dir / "vectors.bin"
+        self.keys_path = self.cache_dir / "keys.txt"
+        self.meta_path = self.cache_dir / "meta.json"
+        self.lock_path = self.cache_dir / "lock"
+        self.lock = threading.Lock()
+        self.rows = {}  # 文本块哈希 -> 行号
+        self.dim = None
+        self._count = 0  # 已加载的行数（keys.txt 中完整的行数）
+        self._keys_offset = 0  # keys.txt 中已加载部分的字节数
+        self._vectors = None  # 延迟创建的只读内存映射
+        with self.lock, self._file_lock():
+            self._refresh()
+    
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的缓存目录锁"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _refresh(self):
+        """加载其他进程（或本进程打开前）追加的哈希，只加载以换行结尾的完整行"""
+        if self.dim is None:
+            try:
+                meta = json.loads(self.meta_path.read_text(encoding='utf-8'))
+                self.dim = int(meta['dim'])
+            except (OSError, ValueError, KeyError):
+                return
+        try:
+            with open(self.keys_path, 'rb') as f:
+                f.seek(self._keys_offset)
+                data = f.read()
+        except OSError:
+            return
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return
+        # 哈希行在对应的向量写完之后才写入，已写入的哈希的向量一定完整
+        row_bytes = self.dim * self.dtype.itemsize
+        size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        for line in data[:end - 1].split(b'\n'):
+            if (self._count + 1) * row_bytes > size:
+                break
+            self.rows.setdefault(line.strip().decode('ascii', 'replace'), self._count)
+            self._count += 1
+            self._keys_offset += len(line) + 1
+    
+    def _repair(self):
+        """持有文件锁时截掉中断写入留下的不完整部分，使两个文件的行数一致"""
+        row_bytes = self.dim * self.dtype.itemsize
+        with open(self.keys_path, 'ab') as f:
+            f.truncate(self._keys_offset)
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(self._count * row_bytes)
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def _mapped(self) -> Optional[np.ndarray]:
+        if self._vectors is None and self._count:
+            self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r',
+                                      shape=(self._count, self.dim))
+        return self._vectors
+    
+    def get(self, keys: List[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """
+        批量读取向量
+        返回 (float32矩阵, 未命中的下标列表)；矩阵中未命中的行为0，需由调用方填充
+        """
+        with self.lock:
+            count = self._count
+            if any(k not in self.rows for k in keys):
+                # 其他进程可能已写入这些文本块
+                self._refresh()
+                if self._count != count:
+                    self._vectors = None
+            hit = [(i, self.rows[k]) for i, k in enumerate(keys) if k in self.rows]
+            missing = [i for i, k in enumerate(keys) if k not in self.rows]
+            if not hit:
+                return None, missing
+            result = np.zeros((len(keys), self.dim), dtype='float32')
+            positions = np.array([i for i, _ in hit], dtype='int64')
+            rows = np.array([r for _, r in hit], dtype='int64')
+            result[positions] = self._mapped()[rows]
+            return result, missing
+    
+    def put(self, keys: List[str], embeddings: np.ndarray):
+        """追加新向量，已存在的哈希会被跳过"""
+        with self.lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                self.meta_path.write_text(json.dumps({
+                    'model_name': self.model_name,
+                    'dim': self.dim,
+                    'dtype': self.dtype.name
+                }), encoding='utf-8')
+            elif embeddings.shape[1] != self.dim:
+                print(f"向量维度 {embeddings.shape[1]} 与缓存维度 {self.dim} 不一致，跳过写入缓存")
+                return
+            
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for i, key in enumerate(keys):
+                if key not in self.rows and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(i)
+            if not new_keys:
+                return
+            
+            # 从磁盘上的实际行数开始追加
+            self._repair()
+            data = np.ascontiguousarray(embeddings[new_rows], dtype=self.dtype)
+            with open(self.vectors_path, 'ab') as f:
+                f.write(data.tobytes())
+            lines = ''.join(k + '\n' for k in new_keys).encode('utf-8')
+            with open(self.keys_path, 'ab') as f:
+                f.write(lines)
+            
+            for offset, key in enumerate(new_keys):
+                self.rows[key] = self._count + offset
+            self._count += len(new_keys)
+            self._keys_offset += len(lines)
+            # 文件已变长，下次读取时重新映射
+            self._vectors = None
@@ -0,0 +1,196 @@
+"""
+Embedding模型加载模块
+支持在CPU上使用量化或ONNX Runtime加速的编码器后端
+"""
+import os
+import re
+import platform
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+from pathlib import Path
+from sentence_transformers import SentenceTransformer
+
+# torch: 原始fp32模型；torch-int8: PyTorch动态int8量化；
+# onnx: ONNX Runtime fp32；onnx-int8: ONNX Runtime动态int8量化
+ENCODER_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+# 文本块少于该数量时启动工作进程（每个进程加载一份模型）的开销大于收益，使用单进程向量化
+PARALLEL_MIN_CHUNKS = 1024
+
+# 自动选择进程数时每个进程至少分到的CPU线程数，线程更少时多加载一份模型的开销大于并行收益
+MIN_THREADS_PER_WORKER = 4
+
+_worker_model = None  # 工作进程中加载的模型
+
+
+def encoder_id(model_name: str, backend: str) -> str:
+    """
+    编码器标识，用于向量缓存和索引元数据
+    不同后端生成的向量存在细微差异，不能混用
+    """
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+
+def _quantization_config() -> str:
+    """按CPU指令集选择ONNX动态量化配置"""
+    machine = platform.machine().lower()
+    if machine in ('arm64', 'aarch64'):
+        return 'arm64'
+    try:
+        flags = Path('/proc/cpuinfo').read_text()
+    except OSError:
+        flags = ''
+    if 'avx512_vnni' in flags:
+        return 'avx512_vnni'
+    if 'avx512f' in flags:
+        return 'avx512'
+    return 'avx2'
+
+
+def _load_onnx(model_name: str, quantized: bool, cache_dir: str) -> SentenceTransformer:
+    """
+    加载ONNX模型，首次使用时导出（及量化）并保存到 cache_dir/encoders 下，之后直接加载
+    需要 sentence-transformers>=3.2 和 optimum[onnxruntime]
+    """
+    slug = re.sub(r'[^\w.-]+', '_', model_name)
+    export_dir = Path(cache_dir) / "encoders" / f"{slug}-onnx"
+    if not any(export_dir.rglob("model.onnx")):
+        print(f"首次使用ONNX后端，正在导出模型到 {export_dir}...")
+        model = SentenceTransformer(model_name, device='cpu', backend='onnx')
+        model.save(str(export_dir))
+    if not quantized:
+        return SentenceTransformer(str(export_dir), device='cpu', backend='onnx')
+    
+    config = _quantization_config()
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    if not (export_dir / file_name).exists():
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        print(f"正在对ONNX模型进行int8动态量化 ({config})...")
+        model = SentenceTransformer(str(export_dir), device='cpu', backend='onnx')
+        export_dynamic_quantized_onnx_model(model, config, str(export_dir))
+    return SentenceTransformer(str(export_dir), device='cpu', backend='onnx',
+                               model_kwargs={'file_name': file_name})
+
+
+def load_encoder(model_name: str, backend: str = "torch",
+                 cache_dir: str = ".cache") -> Tuple[SentenceTransformer, str]:
+    """
+    加载embedding模型，返回 (模型, 实际使用的后端)
+    加速后端的依赖缺失或加载失败时回退到fp32模型
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"不支持的编码器后端: {backend}，可选: {', '.join(ENCODER_BACKENDS)}")
+    
+    try:
+        if backend == 'torch-int8':
+            import torch
+            model = SentenceTransformer(model_name, device='cpu')
+            # 全部Linear层的权重以int8存储，激活在运行时动态量化
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8,
+                                                inplace=True)
+            return model, backend
+        if backend in ('onnx', 'onnx-int8'):
+            return _load_onnx(model_name, backend == 'onnx-int8', cache_dir), backend
+    except Exception as e:
+        print(f"无法使用 {backend} 编码器后端，回退到fp32模型: {e}")
+    
+    # 使用CPU模式以节省显存
+    return SentenceTransformer(model_name, device='cpu'), 'torch'
+
+
+def _model_bytes(model) -> int:
+    """模型参数占用的字节数，无法获取（如ONNX后端）时返回0"""
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    except Exception:
+        return 0
+
+
+def _available_memory() -> int:
+    """当前可用的物理内存字节数，无法获取时返回0"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def auto_encode_workers(model) -> int:
+    """
+    自动选择并行向量化的进程数：CPU核心数除以每个进程的最少线程数，
+    且不超过可用内存能容纳的模型份数（每个工作进程加载一份模型）
+    """
+    workers = max(1, (os.cpu_count() or 1) // MIN_THREADS_PER_WORKER)
+    model_bytes = _model_bytes(model)
+    available = _available_memory()
+    if model_bytes and available:
+        # 每个进程按模型大小的两倍估算（含推理时的激活），并为主进程保留一半可用内存
+        workers = min(workers, max(1, available // 2 // (model_bytes * 2)))
+    return workers
+
+
+def _init_encode_worker(model_name: str, backend: str, cache_dir: str, num_threads: int):
+    """工作进程初始化：限制计算线程数，避免多个进程争用CPU核心，然后加载模型"""
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    _worker_model, _ = load_encoder(model_name, backend, cache_dir)
+
+
+def _encode_worker(chunks: List[str], batch_size: int) -> np.ndarray:
+    """工作进程入口：向量化一组文本块"""
+    embeddings = _worker_model.encode(
+        chunks,
+        show_progress_bar=False,
+        batch_size=batch_size,
+        convert_to_numpy=True
+    )
+    return embeddings.astype('float32')
+
+
+def encode_parallel(model_name: str, backend: str, chunks: List[str], num_workers: int,
+                    batch_size: int = 32, cache_dir: str = ".cache",
+                    show_progress_bar: bool = True) -> np.ndarray:
+    """
+    多进程向量化文本块，返回与 chunks 顺序一致的float32矩阵
+    每个工作进程加载一份模型，CPU核心在进程间平均分配；文本块按长度排序后切分为任务，
+    同一批内长度相近，减少填充带来的无效计算。长文本块最先分配，最后剩下的短任务用于平衡各进程负载
+    """
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]), reverse=True)
+    task_size = batch_size * 4
+    tasks = [order[i:i + task_size] for i in range(0, len(order), task_size)]
+    num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    if show_progress_bar:
+        print(f"使用 {num_workers} 个进程并行向量化（每个进程 {num_threads} 个线程）")
+    
+    embeddings = None
+    done = 0
+    # 使用spawn启动工作进程：主进程中已有模型和后台线程，fork可能导致死锁
+    with ProcessPoolExecutor(max_workers=num_workers,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_encode_worker,
+                             initargs=(model_name, backend, cache_dir, num_threads)) as executor:
+        futures = {executor.submit(_encode_worker, [chunks[i] for i in task], batch_size): task
+                   for task in tasks}
+        for future in as_completed(futures):
+            result = future.result()
+            if embeddings is None:
+                embeddings = np.empty((len(chunks), result.shape[1]), dtype='float32')
+            embeddings[futures[future]] = result
+            done += len(result)
+            if show_progress_bar:
+                print(f"\r向量化进度: {done}/{len(chunks)}", end="", flush=True)
+    if show_progress_bar:
+        print()
+    return embeddings
@@ -0,0 +1,148 @@
+"""
+文档提取缓存模块
+按文件内容哈希缓存PDF提取文本和分块结果，避免重启时重复解析
+"""
+import os
+import json
+import hashlib
+from typing import List, Optional, Iterable, Iterator
+from pathlib import Path
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """计算文件内容的SHA-256哈希"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _atomic_write_text(path: Path, content: str):
+    """先写临时文件再替换，避免进程中断留下半个缓存文件"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ChunkWriter:
+    """逐块写入分块结果：先写临时文件，commit 后才替换正式文件，abort 时丢弃"""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._tmp_path = path.with_name(path.name + '.tmp')
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+    
+    def write(self, chunk: str):
+        self._file.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+    
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+    
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+class ExtractionCache:
+    """
+    提取结果缓存
+    文本按内容哈希存储（与分块参数无关），分块结果按内容哈希+分块参数存储，
+    每行一个文本块，大文档可以逐块写入和读取
+    """
+    
+    def __init__(self, cache_dir: str = ".cache/extracted"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _text_path(self, content_hash: str) -> Path:
+        return self.cache_dir / f"{content_hash}.txt"
+    
+    def _chunks_path(self, content_hash: str, params_key: str) -> Path:
+        return self.cache_dir / f"{content_hash}_{params_key}.jsonl"
+    
+    @staticmethod
+    def params_key(**params) -> str:
+        """将分块参数编码为简短的缓存键"""
+        raw = json.dumps(params, sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+    
+    def get_text(self, content_hash: str) -> Optional[str]:
+        """读取缓存的提取文本"""
+        path = self._text_path(content_hash)
+        if not path.exists():
+            return None
+        try:
+            return path.read_text(encoding='utf-8')
+        except OSError:
+            return None
+    
+    def put_text(self, content_hash: str, text: str):
+        """写入提取文本"""
+        _atomic_write_text(self._text_path(content_hash), text)
+    
+    def get_chunks(self, content_hash: str, params_key: str) -> Optional[List[str]]:
+        """读取缓存的分块结果"""
+        chunks = self.iter_chunks(content_hash, params_key)
+        if chunks is None:
+            return None
+        try:
+            return list(chunks)
+        except (OSError, ValueError):
+            # 缓存损坏时视为未命中，重新提取后覆盖
+            return None
+    
+    def iter_chunks(self, content_hash: str, params_key: str) -> Optional[Iterator[str]]:
+        """逐块读取缓存的分块结果，未命中时返回None"""
+        path = self._chunks_path(content_hash, params_key)
+        if not path.exists():
+            return None
+        return self._read_lines(path)
+    
+    @staticmethod
+    def _read_lines(path: Path) -> Iterator[str]:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+    
+    def chunk_writer(self, content_hash: str, params_key: str) -> ChunkWriter:
+        """逐块写入分块结果"""
+        return ChunkWriter(self._chunks_path(content_hash, params_key))
+    
+    def put_chunks(self, content_hash: str, params_key: str, chunks: Iterable[str]):
+        """写入分块结果"""
+        writer = self.chunk_writer(content_hash, params_key)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+    
+    def prune(self, live_hashes: Iterable[str], params_key: Optional[str] = None) -> int:
+        """
+        删除不再对应任何现有文件的缓存条目，返回删除的文件数
+        指定 params_key 时同时删除其他分块参数下的旧分块结果
+        """
+        live = set(live_hashes)
+        removed = 0
+        for path in self.cache_dir.iterdir():
+            if path.suffix == '.tmp':
+                # 可能正在写入；中断留下的临时文件下次写入同一条目时被覆盖
+                continue
+            content_hash, _, key = path.stem.partition('_')
+            stale_params = params_key is not None and key and key != params_key
+            # 旧版的分块结果为整个JSON文件
+            if content_hash not in live or stale_params or path.suffix == '.json':
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
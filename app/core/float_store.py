@@ -0,0 +1,159 @@
+"""
+原始向量存储模块
+压缩索引（int8标量量化或二值编码）只保存压缩后的编码用于初筛，
+原始float32向量按索引位置保存在单独的文件中，以内存映射方式打开，只读取候选向量做精确重排序
+"""
+import os
+import mmap
+import numpy as np
+from typing import Optional, Tuple
+from pathlib import Path
+
+
+def _open_mapped(path: Path) -> np.ndarray:
+    """内存映射方式打开向量文件；重排序是随机读取，关闭预读以免把整个文件读入页缓存"""
+    array = np.load(str(path), mmap_mode='r')
+    mapped = getattr(array, '_mmap', None)
+    if mapped is not None and hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+        mapped.madvise(mmap.MADV_RANDOM)
+    return array
+
+
+class FloatStore:
+    """
+    按索引位置排列的float32向量
+    已保存的部分内存映射，新追加的向量在保存前保存在内存中；
+    select 得到的子集只记录位置到行的映射，与原存储共用已映射的文件，保存时才写出
+    """
+    
+    def __init__(self, embeddings: np.ndarray):
+        self._base = np.ascontiguousarray(embeddings, dtype='float32')
+        self._tail = []  # 追加的向量块
+        self._rows = None  # 位置 -> 行号（已保存部分之后接追加的部分），None 表示一一对应
+        self.path = None  # 当前映射的文件
+        self.modified = True
+        self.dim = self._base.shape[1]
+    
+    def _stored_len(self) -> int:
+        return len(self._base) + sum(len(block) for block in self._tail)
+    
+    def __len__(self) -> int:
+        return len(self._rows) if self._rows is not None else self._stored_len()
+    
+    @property
+    def nbytes(self) -> int:
+        return len(self) * self.dim * 4
+    
+    def append(self, embeddings: np.ndarray):
+        if self._rows is not None:
+            start = self._stored_len()
+            self._rows = np.concatenate([self._rows, np.arange(start, start + len(embeddings))])
+        self._tail.append(np.array(embeddings, dtype='float32'))
+        self.modified = True
+    
+    def _tail_matrix(self) -> np.ndarray:
+        if len(self._tail) > 1:
+            self._tail = [np.concatenate(self._tail)]
+        return self._tail[0]
+    
+    def get(self, positions: np.ndarray) -> np.ndarray:
+        """读取指定位置的向量"""
+        positions = np.asarray(positions, dtype='int64')
+        if self._rows is not None:
+            positions = self._rows[positions]
+        base_n = len(self._base)
+        in_base = positions < base_n
+        if in_base.all():
+            return np.asarray(self._base[positions], dtype='float32')
+        result = np.empty((len(positions), self.dim), dtype='float32')
+        result[in_base] = self._base[positions[in_base]]
+        result[~in_base] = self._tail_matrix()[positions[~in_base] - base_n]
+        return result
+    
+    def all(self) -> np.ndarray:
+        """全部向量（读入内存）"""
+        if self._rows is not None:
+            return self.get(np.arange(len(self)))
+        return np.concatenate([np.asarray(self._base)] + self._tail)
+    
+    def select(self, positions: np.ndarray) -> 'FloatStore':
+        """只含指定位置向量（按给定顺序）的新存储，不复制向量数据"""
+        store = FloatStore.__new__(FloatStore)
+        store._base = self._base
+        store._tail = list(self._tail)
+        positions = np.asarray(positions, dtype='int64')
+        store._rows = self._rows[positions] if self._rows is not None else positions
+        store.path = self.path
+        store.modified = True
+        store.dim = self.dim
+        return store
+    
+    def save(self, path: str):
+        """保存为 .npy 文件并改为内存映射"""
+        vars(self).update(vars(self.write(path)))
+    
+    def write(self, path: str) -> 'FloatStore':
+        """
+        写出 .npy 文件，返回内存映射该文件的存储；本对象不变，可与检索并发进行
+        内容未变化时不重写，写到新位置时尽量硬链接已有文件
+        """
+        save_path = Path(path)
+        if not self.modified and self.path is not None:
+            if Path(self.path).resolve() == save_path.resolve():
+                return self
+            try:
+                os.link(self.path, save_path)
+                return FloatStore.load(str(save_path))
+            except OSError:
+                pass
+        tmp_path = save_path.with_name(save_path.name + '.tmp')
+        # 逐块写入，无需把已映射的向量全部读入内存
+        out = np.lib.format.open_memmap(str(tmp_path), mode='w+', dtype='float32',
+                                        shape=(len(self), self.dim))
+        for start in range(0, len(self), 65536):
+            end = min(start + 65536, len(self))
+            out[start:end] = self.get(np.arange(start, end))
+        out.flush()
+        del out
+        os.replace(tmp_path, save_path)
+        return FloatStore.load(str(save_path))
+    
+    @classmethod
+    def load(cls, path: str) -> Optional['FloatStore']:
+        """内存映射方式加载，文件不存在或损坏时返回None"""
+        load_path = Path(path)
+        if not load_path.exists():
+            return None
+        try:
+            base = _open_mapped(load_path)
+        except (OSError, ValueError) as e:
+            print(f"读取向量文件失败: {e}")
+            return None
+        store = cls.__new__(cls)
+        store._base = base
+        store._tail = []
+        store._rows = None
+        store.path = str(load_path)
+        store.modified = False
+        store.dim = base.shape[1]
+        return store
+
+
+def rerank(query_embeddings: np.ndarray, candidates: np.ndarray, store: FloatStore,
+           top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    用原始向量对压缩索引返回的候选重新计算精确L2距离，返回 (distances, indices)，格式与faiss检索一致
+    候选不足 top_k 时以 -1 补齐
+    """
+    distances = np.full((len(query_embeddings), top_k), np.inf, dtype='float32')
+    indices = np.full((len(query_embeddings), top_k), -1, dtype='int64')
+    for row, (query, ids) in enumerate(zip(query_embeddings, candidates)):
+        ids = ids[ids >= 0]
+        if not len(ids):
+            continue
+        vectors = store.get(ids)
+        exact = np.sum((vectors - query) ** 2, axis=1)
+        order = np.argsort(exact, kind='stable')[:top_k]
+        distances[row, :len(order)] = exact[order]
+        indices[row, :len(order)] = ids[order]
+    return distances, indices
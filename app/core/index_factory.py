@@ -0,0 +1,267 @@
+"""
+向量索引工厂模块
+根据向量数量选择并构建FAISS索引：flat（精确检索）、IVF-Flat、IVF-PQ、HNSW，
+以及用于初筛的压缩索引：int8标量量化 (sq8) 和二值编码 (binary)；
+可选在索引前加一层训练得到的降维变换 (PCA/OPQ)，查询向量检索时自动经过同一变换。
+向量以文本块的稳定ID加入索引（倒排索引原生支持，其余类型外包一层 IndexIDMap2），
+检索结果返回ID而非位置，删除和压缩后ID保持不变
+"""
+import math
+import numpy as np
+import faiss
+from typing import Optional, Tuple
+
+INDEX_TYPES = ('auto', 'flat', 'ivf', 'ivfpq', 'hnsw', 'sq8', 'binary')
+# 压缩索引只保存编码（sq8每维1字节，binary每维1位），检索后用原始向量对候选精确重排序
+COMPRESSED_TYPES = ('sq8', 'binary')
+# 重排序的候选数为 top_k 的倍数：二值编码丢失的信息更多，需要更多候选
+RERANK_FACTORS = {'sq8': 4, 'binary': 16}
+
+# auto 模式的切换阈值：小语料精确检索即可，大语料用倒排索引，超大语料再加乘积量化压缩内存
+FLAT_MAX_VECTORS = 50000
+IVF_MAX_VECTORS = 1000000
+# 每个聚类中心至少需要的训练样本数，向量太少时倒排索引退化为flat
+MIN_POINTS_PER_CENTROID = 39
+TRAIN_POINTS_PER_CENTROID = 64
+# 乘积量化每个子空间训练256个中心，同样需要每个中心约39个样本
+PQ_MIN_TRAIN = 256 * MIN_POINTS_PER_CENTROID
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+
+REDUCTION_METHODS = ('pca', 'opq')
+
+# 索引规格 (类型, 聚类中心数)，非倒排索引的中心数为0
+IndexSpec = Tuple[str, int]
+# 降维规格 (方法, 目标维度)，None 表示不降维
+ReductionSpec = Optional[Tuple[str, int]]
+
+
+def choose_index_type(n_vectors: int) -> str:
+    """按向量数量自动选择索引类型"""
+    if n_vectors < FLAT_MAX_VECTORS:
+        return 'flat'
+    if n_vectors < IVF_MAX_VECTORS:
+        return 'ivf'
+    return 'ivfpq'
+
+
+def index_spec(index_type: str, n_vectors: int) -> IndexSpec:
+    """
+    计算给定向量数量下的索引规格
+    聚类中心数取 4*sqrt(n) 附近的2的幂，语料每增长约4倍才变化一次，避免频繁重新训练
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}，可选: {', '.join(INDEX_TYPES)}")
+    if index_type == 'auto':
+        index_type = choose_index_type(n_vectors)
+    if index_type in ('flat', 'hnsw') or index_type in COMPRESSED_TYPES:
+        return index_type, 0
+    
+    nlist = 1 << max(int(round(math.log2(4 * math.sqrt(max(n_vectors, 1))))), 0)
+    nlist = min(nlist, n_vectors // MIN_POINTS_PER_CENTROID)
+    if nlist < 2 or (index_type == 'ivfpq' and n_vectors < PQ_MIN_TRAIN):
+        # 向量太少，无法可靠训练
+        return 'flat', 0
+    return index_type, 1 << int(math.log2(nlist))
+
+
+def reduction_spec(method: Optional[str], out_dim: Optional[int], n_vectors: int,
+                   in_dim: int) -> ReductionSpec:
+    """
+    计算给定向量数量下的降维规格
+    PCA至少需要与输入维度相同数量的样本才能估计协方差，OPQ还要训练乘积量化码本；
+    样本不足时暂不降维，语料增长跨过阈值后再重建
+    """
+    if not method or not out_dim or out_dim >= in_dim:
+        return None
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"不支持的降维方法: {method}，可选: {', '.join(REDUCTION_METHODS)}")
+    if n_vectors < (PQ_MIN_TRAIN if method == 'opq' else in_dim):
+        return None
+    return method, out_dim
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """选择能整除维度、每段约8维的子量化器数量（每个向量压缩为 dim/8 字节）"""
+    for m in (dim // 8, 128, 96, 64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if 0 < m <= dim and dim % m == 0:
+            return m
+    return 1
+
+
+def create_index(spec: IndexSpec, embeddings: np.ndarray, seed: int = 1234,
+                 reduction: ReductionSpec = None, ids: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    按规格创建索引，需要训练时从向量中随机抽样训练，并加入全部向量
+    ids 不为空时向量以这些ID加入，检索返回ID；否则返回加入的顺序号
+    """
+    index_type, nlist = spec
+    in_dim = embeddings.shape[1]
+    dim = reduction[1] if reduction else in_dim
+    
+    if index_type == 'flat':
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type in COMPRESSED_TYPES:
+        if index_type == 'sq8':
+            # 每维按训练样本的取值范围量化为8位
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+        else:
+            # 每维1位：以训练样本各维的中位数为阈值，按汉明距离检索
+            index = faiss.IndexLSH(dim, dim, False, True)
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == 'ivf':
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8)
+    if ids is not None and not isinstance(index, faiss.IndexIVF):
+        # 位于降维变换之内，内层索引仍按加入顺序存放向量
+        index = faiss.IndexIDMap2(index)
+    
+    if reduction:
+        if reduction[0] == 'pca':
+            transform = faiss.PCAMatrix(in_dim, dim)
+        else:
+            # 旋转并降维，使各子空间的方差均衡，适合后续乘积量化
+            transform = faiss.OPQMatrix(in_dim, _pq_subquantizers(dim), dim)
+        index = faiss.IndexPreTransform(transform, index)
+    
+    if not index.is_trained:
+        # 降维变换和索引在同一份随机样本上训练
+        n_train = min(len(embeddings), max(nlist * TRAIN_POINTS_PER_CENTROID, PQ_MIN_TRAIN))
+        rng = np.random.default_rng(seed)
+        sample = embeddings[np.sort(rng.choice(len(embeddings), n_train, replace=False))]
+        index.train(np.ascontiguousarray(sample, dtype='float32'))
+    
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    if ids is None:
+        index.add(embeddings)
+    else:
+        index.add_with_ids(embeddings, np.ascontiguousarray(ids, dtype='int64'))
+    return index
+
+
+def read_index(path: str, mmap: bool = False) -> Tuple[faiss.Index, bool]:
+    """
+    读取索引文件，返回 (索引, 是否为内存映射)
+    mmap 为True时以内存映射方式打开；较早的faiss版本没有 IO_FLAG_MMAP_IFC，改为完整读入
+    """
+    flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', None) if mmap else None
+    if flag is None:
+        if mmap:
+            print("当前faiss版本不支持内存映射读取索引，改为读入内存")
+        return faiss.read_index(path), False
+    return faiss.read_index(path, flag), True
+
+
+def empty_index(dim: int) -> faiss.Index:
+    """空的flat索引，可按ID加入向量；语料增长后再按配置重建"""
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+
+def _id_index(index: faiss.Index) -> faiss.Index:
+    """去掉降维变换，返回以ID检索的索引"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """去掉降维变换和ID映射，返回实际存放向量的索引"""
+    index = _id_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def has_stable_ids(index: faiss.Index) -> bool:
+    """索引是否按ID检索；旧版非倒排索引返回的是位置，需要重建"""
+    return isinstance(_id_index(index), (faiss.IndexIDMap, faiss.IndexIVF))
+
+
+def stored_vectors(index: faiss.Index, positions: Optional[np.ndarray] = None) -> np.ndarray:
+    """按加入顺序（位置）取出flat/HNSW索引中的向量，positions 为空时取出全部"""
+    base = _base_index(index)
+    if positions is None:
+        return base.reconstruct_n(0, base.ntotal)
+    return base.reconstruct_batch(np.ascontiguousarray(positions, dtype='int64'))
+
+
+def current_reduction(index: faiss.Index) -> ReductionSpec:
+    """识别已有索引的降维规格"""
+    index = faiss.downcast_index(index)
+    if not isinstance(index, faiss.IndexPreTransform):
+        return None
+    transform = faiss.downcast_VectorTransform(index.chain.at(0))
+    # OPQ矩阵保存后读回为普通的 LinearTransform
+    method = 'pca' if isinstance(transform, faiss.PCAMatrix) else 'opq'
+    return method, transform.d_out
+
+
+def exact_vectors(index: faiss.Index) -> bool:
+    """索引能否精确还原加入的原始向量（flat/HNSW且未降维）"""
+    return current_reduction(index) is None and current_spec(index)[0] in ('flat', 'hnsw')
+
+
+def current_spec(index: faiss.Index) -> IndexSpec:
+    """识别已有索引的规格"""
+    index = _base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw', 0
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivfpq', index.nlist
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf', index.nlist
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return 'sq8', 0
+    if isinstance(index, faiss.IndexLSH):
+        return 'binary', 0
+    return 'flat', 0
+
+
+def code_bytes(index: faiss.Index) -> int:
+    """索引中向量编码占用的字节数（不含聚类中心等结构）"""
+    index = _base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    code_size = getattr(index, 'code_size', None)
+    if code_size is None:
+        code_size = index.d * 4
+    return int(code_size) * index.ntotal
+
+
+def filter_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """
+    构造只检索 selector 中向量的检索参数，沿用索引当前的 nprobe / efSearch
+    二值索引 (IndexLSH) 不支持ID选择器
+    """
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    if current_reduction(index) is not None:
+        params = faiss.SearchParametersPreTransform(index_params=params)
+    return params
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None):
+    """
+    设置检索参数
+    nprobe: 倒排索引每次检索的聚类数，默认为 nlist/16（至少8），越大召回越高、越慢
+    ef_search: HNSW检索时的候选队列长度，越大召回越高、越慢
+    """
+    index = _base_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        if nprobe is None:
+            nprobe = max(8, index.nlist // 16)
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search or 64
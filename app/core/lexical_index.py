@@ -0,0 +1,267 @@
+"""
+词法检索模块
+BM25倒排索引：对精确的术语、缩写、公式名、作者名等关键词检索，无需运行embedding模型。
+文本块中的中日韩文字按相邻两字和单字索引，查询中连续的中日韩文字按相邻两字检索、
+只有一个字时按单字检索，其他文字按单词切分；
+倒排表以文本块的稳定ID为文档编号，与向量索引共用删除标记
+"""
+import os
+import re
+import copy
+import json
+import unicodedata
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Iterable, Optional, Tuple
+from pathlib import Path
+
+FORMAT_VERSION = 2
+
+# BM25参数：k1 控制词频饱和速度，b 控制文本块长度归一化的强度
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 假名、中日韩统一汉字（含扩展A）、韩文音节、兼容汉字
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_CJK_RUN = re.compile(f'[{_CJK}]+')
+_TOKEN = re.compile(f'[{_CJK}]+|[^\\W_{_CJK}]+')
+
+_ARRAYS = ('offsets', 'post_ids', 'post_tfs', 'doc_ids', 'doc_lens')
+
+
+def tokenize(text: str, unigrams: bool = False) -> List[str]:
+    """
+    切分为检索词：先做NFKC规范化（全角字母数字转为半角）并转为小写，
+    中日韩文字取相邻两字，其他文字取整个单词；
+    unigrams 为True时（索引文本块）中日韩文字另外逐字切分，使单字查询也能命中
+    """
+    tokens = []
+    for run in _TOKEN.findall(unicodedata.normalize('NFKC', text).lower()):
+        if _CJK_RUN.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if unigrams:
+                tokens.extend(run)
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25倒排索引
+    已保存的倒排表按CSR格式存放（词 -> 连续的 (ID, 词频) 区间）并内存映射；
+    新加入的文本块保存在内存中，与删除标记一起在保存时合并为新的倒排表
+    """
+    
+    def __init__(self):
+        self.path = None  # 当前映射的目录
+        self._set_base([], {name: np.zeros(1 if name == 'offsets' else 0,
+                                           dtype='int64' if name in ('offsets', 'post_ids', 'doc_ids')
+                                           else 'int32')
+                            for name in _ARRAYS})
+        self._tail_postings = {}  # 词 -> ([ID, ...], [词频, ...])
+        self._tail_lens = {}  # ID -> 文本块长度（词数）
+        self.removed = set()  # 已删除的ID
+        self.modified = True
+    
+    def _set_base(self, terms: List[str], arrays: Dict[str, np.ndarray]):
+        self._terms = terms
+        self._vocab = {term: i for i, term in enumerate(terms)}
+        self._base = arrays
+        self._total_len = int(np.sum(arrays['doc_lens'], dtype='int64'))
+    
+    def __len__(self) -> int:
+        """未删除的文本块数"""
+        return len(self._base['doc_ids']) + len(self._tail_lens) - len(self.removed)
+    
+    def add(self, ids: Iterable[int], texts: Iterable[str]):
+        """加入文本块"""
+        for uid, text in zip(ids, texts):
+            counts = Counter(tokenize(text, unigrams=True))
+            self._tail_lens[int(uid)] = sum(counts.values())
+            self._total_len += sum(counts.values())
+            for term, tf in counts.items():
+                postings = self._tail_postings.setdefault(term, ([], []))
+                postings[0].append(int(uid))
+                postings[1].append(tf)
+        self.modified = True
+    
+    def remove(self, ids: Iterable[int]):
+        """标记删除，保存时才从倒排表中移除"""
+        ids = [int(uid) for uid in ids if int(uid) not in self.removed]
+        if not ids:
+            return
+        self._total_len -= int(self._lengths(np.array(ids, dtype='int64')).sum())
+        self.removed.update(ids)
+        self.modified = True
+    
+    def _lengths(self, ids: np.ndarray) -> np.ndarray:
+        base_ids = self._base['doc_ids']
+        result = np.zeros(len(ids), dtype='float32')
+        if len(base_ids):
+            found = np.minimum(np.searchsorted(base_ids, ids), len(base_ids) - 1)
+            hit = base_ids[found] == ids
+            result[hit] = self._base['doc_lens'][found[hit]]
+        else:
+            hit = np.zeros(len(ids), dtype=bool)
+        for i in np.flatnonzero(~hit).tolist():
+            result[i] = self._tail_lens.get(int(ids[i]), 0)
+        return result
+    
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """某个词的倒排表 (IDs, 词频)，包括已删除的ID"""
+        ids, tfs = [], []
+        term_id = self._vocab.get(term)
+        if term_id is not None:
+            start, end = self._base['offsets'][term_id], self._base['offsets'][term_id + 1]
+            ids.append(np.asarray(self._base['post_ids'][start:end]))
+            tfs.append(np.asarray(self._base['post_tfs'][start:end]))
+        if term in self._tail_postings:
+            tail_ids, tail_tfs = self._tail_postings[term]
+            ids.append(np.array(tail_ids, dtype='int64'))
+            tfs.append(np.array(tail_tfs, dtype='int32'))
+        if not ids:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int32')
+        return np.concatenate(ids), np.concatenate(tfs)
+    
+    def search(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算含有任一查询词的全部文本块的BM25得分，返回 (IDs, 得分)，按得分降序
+        已删除的ID仍会计入词的文档频率，保存合并后才更新
+        """
+        n_docs = len(self)
+        if not n_docs:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+        avg_len = max(self._total_len / n_docs, 1.0)
+        all_ids, all_scores = [], []
+        for term in set(tokenize(query)):
+            ids, tfs = self._postings(term)
+            if not len(ids):
+                continue
+            idf = np.log(1.0 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            tfs = tfs.astype('float32')
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths(ids) / avg_len)
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+        if not all_ids:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype('float32')
+        if self.removed:
+            keep = ~np.isin(ids, np.fromiter(self.removed, dtype='int64'))
+            ids, scores = ids[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')
+        return ids[order], scores[order]
+    
+    # ---------- 持久化 ----------
+    
+    def _consolidate(self) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """合并已保存的倒排表和新加入的文本块，去掉已删除的ID和不再出现的词"""
+        base = self._base
+        n_base_terms = len(self._terms)
+        terms = list(self._terms) + [t for t in self._tail_postings if t not in self._vocab]
+        vocab = {term: i for i, term in enumerate(terms)}
+        
+        term_ids = [np.repeat(np.arange(n_base_terms, dtype='int64'), np.diff(base['offsets']))]
+        post_ids = [np.asarray(base['post_ids'])]
+        post_tfs = [np.asarray(base['post_tfs'])]
+        for term, (ids, tfs) in self._tail_postings.items():
+            term_ids.append(np.full(len(ids), vocab[term], dtype='int64'))
+            post_ids.append(np.array(ids, dtype='int64'))
+            post_tfs.append(np.array(tfs, dtype='int32'))
+        term_ids = np.concatenate(term_ids)
+        post_ids = np.concatenate(post_ids)
+        post_tfs = np.concatenate(post_tfs)
+        
+        doc_ids = np.concatenate([np.asarray(base['doc_ids']),
+                                  np.array(list(self._tail_lens), dtype='int64')])
+        doc_lens = np.concatenate([np.asarray(base['doc_lens']),
+                                   np.array(list(self._tail_lens.values()), dtype='int32')])
+        if self.removed:
+            removed = np.fromiter(self.removed, dtype='int64')
+            keep = ~np.isin(post_ids, removed)
+            term_ids, post_ids, post_tfs = term_ids[keep], post_ids[keep], post_tfs[keep]
+            keep = ~np.isin(doc_ids, removed)
+            doc_ids, doc_lens = doc_ids[keep], doc_lens[keep]
+        
+        # 去掉没有任何文本块的词并重新编号
+        counts = np.bincount(term_ids, minlength=len(terms))
+        used = np.flatnonzero(counts)
+        remap = np.full(len(terms), -1, dtype='int64')
+        remap[used] = np.arange(len(used))
+        term_ids = remap[term_ids]
+        order = np.lexsort((post_ids, term_ids))
+        doc_order = np.argsort(doc_ids, kind='stable')
+        offsets = np.zeros(len(used) + 1, dtype='int64')
+        offsets[1:] = np.cumsum(counts[used])
+        arrays = {
+            'offsets': offsets,
+            'post_ids': post_ids[order],
+            'post_tfs': post_tfs[order].astype('int32'),
+            'doc_ids': doc_ids[doc_order],
+            'doc_lens': doc_lens[doc_order].astype('int32'),
+        }
+        return [terms[i] for i in used.tolist()], arrays
+    
+    def save(self, directory: str):
+        """保存为数组文件并改为内存映射；未修改时对已有文件创建硬链接"""
+        vars(self).update(vars(self.write(directory)))
+    
+    def write(self, directory: str) -> 'LexicalIndex':
+        """
+        写出数组文件，返回内存映射这些文件的索引；本对象不变，可与检索并发进行
+        未修改时对已有文件创建硬链接
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        if not self.modified and self.path is not None:
+            try:
+                for name in list(_ARRAYS) + ['terms.json', 'meta.json']:
+                    file_name = name if name.endswith('.json') else f"{name}.npy"
+                    os.link(Path(self.path) / file_name, path / file_name)
+                saved = copy.copy(self)
+                saved.path = str(path)
+                return saved
+            except OSError:
+                pass
+        
+        terms, arrays = self._consolidate()
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array)
+        (path / "terms.json").write_text(json.dumps(terms, ensure_ascii=False), encoding='utf-8')
+        # meta.json 最后写入，用于加载时校验
+        meta = {'version': FORMAT_VERSION, 'terms': len(terms), 'postings': len(arrays['post_ids']),
+                'docs': len(arrays['doc_ids'])}
+        (path / "meta.json").write_text(json.dumps(meta), encoding='utf-8')
+        
+        saved = LexicalIndex.load(directory)
+        if saved is None:
+            saved = LexicalIndex()
+            saved._set_base(terms, arrays)
+        saved.path = str(path)
+        saved.modified = False
+        return saved
+    
+    @classmethod
+    def load(cls, directory: str) -> Optional['LexicalIndex']:
+        """内存映射方式加载，文件缺失、损坏或版本不符时返回None"""
+        path = Path(directory)
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding='utf-8'))
+            if meta.get('version') != FORMAT_VERSION:
+                return None
+            terms = json.loads((path / "terms.json").read_text(encoding='utf-8'))
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode='r', allow_pickle=False)
+                      for name in _ARRAYS}
+        except (OSError, ValueError) as e:
+            print(f"读取词法索引失败: {e}")
+            return None
+        if (len(terms) != meta['terms'] or len(arrays['offsets']) != len(terms) + 1
+                or len(arrays['post_ids']) != meta['postings'] or len(arrays['doc_ids']) != meta['docs']):
+            print("词法索引文件不完整")
+            return None
+        index = cls()
+        index._set_base(terms, arrays)
+        index.path = str(path)
+        index.modified = False
+        return index
@@ -0,0 +1,72 @@
+"""
+查询向量缓存模块
+缓存查询文本的向量，重复或重试的提问无需再次运行embedding模型
+"""
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+from .embedding_cache import EmbeddingCache, chunk_key
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询文本：去掉首尾空白并合并连续空白（不改变大小写，以免影响向量）"""
+    return " ".join(query.split())
+
+
+class QueryCache:
+    """
+    有界LRU查询向量缓存
+    可选的磁盘层复用 EmbeddingCache：查询在内存中第二次命中（即被问过至少两次）时写入磁盘，
+    重启后常用查询仍然命中，只出现一次的查询不会占用磁盘
+    """
+    
+    def __init__(self, max_size: int = 1024, disk_dir: Optional[str] = None,
+                 model_name: str = ""):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # 规范化查询 -> [向量, 是否已写入磁盘]
+        self.disk = EmbeddingCache(disk_dir, model_name) if disk_dir else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                if self.disk is not None and not entry[1]:
+                    self.disk.put([chunk_key(key)], entry[0])
+                    entry[1] = True
+                return entry[0]
+            if self.disk is not None:
+                embedding, missing = self.disk.get([chunk_key(key)])
+                if not missing:
+                    self.disk_hits += 1
+                    self._insert(key, [embedding, True])
+                    return embedding
+            self.misses += 1
+            return None
+    
+    def put(self, query: str, embedding: np.ndarray):
+        with self.lock:
+            self._insert(normalize_query(query), [embedding, False])
+    
+    def _insert(self, key: str, entry: list):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, int]:
+        """命中统计"""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses
+            }
@@ -1,154 +1,454 @@
-"""
-科研助手核心类
-整合文档处理、向量检索和LLM功能
-"""
-from typing import Dict, List, Optional
-from pathlib import Path
-from .document_processor import DocumentProcessor
-from .vector_store import VectorStore
-from .llm_agent import LLMAgent
-from .web_scraper import WebScraper
-
-
-class ResearchAssistant:
-    """科研助手主类"""
-    
-    def __init__(self, documents_dir: str = "documents", 
-                 use_quantization: bool = True):
-        self.documents_dir = documents_dir
-        self.processor = DocumentProcessor(documents_dir)
-        self.vector_store = VectorStore()
-        self.llm_agent = LLMAgent(use_quantization=use_quantization)
-        self.web_scraper = WebScraper()
-        self.documents_text = {}  # 存储完整文档文本
-        self.web_contents = {}  # 存储网页内容 {title: content}
-        self.is_indexed = False
-    
-    def initialize(self, rebuild_index: bool = False):
-        """初始化助手，处理文档并构建索引"""
-        index_path = Path(".cache/vector_index.faiss")
-        
-        if not rebuild_index and index_path.exists():
-            print("加载已有索引...")
-            if self.vector_store.load_index(str(index_path)):
-                print("索引加载成功")
-                # 需要重新加载文档文本
-                self._load_documents_text()
-                self.is_indexed = True
-                return
-        
-        print("开始处理文档...")
-        # 处理文档
-        documents = self.processor.process_documents()
-        
-        if not documents:
-            print("未找到可处理的文档")
-            return
-        
-        # 保存完整文档文本
-        for doc_name, chunks in documents.items():
-            self.documents_text[doc_name] = "\n\n".join(chunks)
-        
-        # 构建向量索引
-        self.vector_store.build_index(documents)
-        
-        # 保存索引
-        self.vector_store.save_index(str(index_path))
-        self.is_indexed = True
-        print("初始化完成")
-    
-    def _load_documents_text(self):
-        """从索引元数据中加载文档文本"""
-        # 重新处理文档以获取完整文本
-        documents = self.processor.process_documents()
-        for doc_name, chunks in documents.items():
-            self.documents_text[doc_name] = "\n\n".join(chunks)
-    
-    def ask(self, question: str, top_k: int = 5) -> str:
-        """询问问题"""
-        if not self.is_indexed:
-            return "请先初始化助手（处理文档）。"
-        
-        # 检索相关文档块
-        relevant_chunks = self.vector_store.search(question, top_k=top_k)
-        
-        if not relevant_chunks:
-            return "未找到相关文档内容。"
-        
-        # 使用LLM生成回答
-        answer = self.llm_agent.answer_question(question, relevant_chunks)
-        return answer
-    
-    def analyze_similarity(self) -> str:
-        """分析文档相似性"""
-        if not self.is_indexed or len(self.documents_text) < 2:
-            return "至少需要2个文档才能进行相似性分析。"
-        
-        return self.llm_agent.analyze_similarity(self.documents_text)
-    
-    def recommend_research(self) -> str:
-        """推荐研究问题和方法"""
-        if not self.is_indexed:
-            return "请先初始化助手（处理文档）。"
-        
-        return self.llm_agent.recommend_research(self.documents_text)
-    
-    def get_document_list(self) -> List[str]:
-        """获取文档列表"""
-        return list(self.documents_text.keys())
-    
-    def fetch_web_content(self, url: str) -> Optional[Dict[str, str]]:
-        """抓取网页内容"""
-        result = self.web_scraper.fetch_url(url)
-        if result:
-            # 保存网页内容
-            key = f"网页_{result['title'][:50]}" if result['title'] else f"网页_{url[:50]}"
-            self.web_contents[key] = result['content']
-            print(f"网页内容已保存: {key} ({result['length']} 字符)")
-        return result
-    
-    def summarize_web_content(self, url: str, focus: str = "复习总结") -> str:
-        """总结网页内容（用于复习）"""
-        print(f"正在抓取并总结网页: {url}")
-        web_data = self.fetch_web_content(url)
-        
-        if not web_data:
-            return "无法抓取网页内容，请检查URL是否正确或网络连接是否正常。"
-        
-        # 截取内容以避免token限制
-        content = web_data['content']
-        if len(content) > 8000:
-            content = content[:8000] + "\n\n[内容已截断...]"
-        
-        prompt = f"""请对以下网页内容进行{focus}，生成结构化的总结，帮助用户复习和理解：
-
-网页标题：{web_data['title']}
-网页地址：{web_data['url']}
-
-网页内容：
-{content}
-
-请提供以下方面的总结：
-1. 主要内容概述
-2. 关键知识点
-3. 重要概念和术语
-4. 要点总结
-5. 可能的实践建议或思考题
-
-请用清晰的结构化格式输出："""
-        
-        return self.llm_agent.generate_response(prompt, max_length=1024)
-    
-    def get_web_contents_list(self) -> List[str]:
-        """获取已抓取的网页内容列表"""
-        return list(self.web_contents.keys())
-    
-    def batch_summarize_urls(self, urls: List[str], focus: str = "复习总结") -> Dict[str, str]:
-        """批量总结多个网页"""
-        results = {}
-        for url in urls:
-            print(f"\n处理URL {urls.index(url) + 1}/{len(urls)}: {url}")
-            summary = self.summarize_web_content(url, focus)
-            results[url] = summary
-        return results
-
+"""
+科研助手核心类
+整合文档处理、向量检索和LLM功能
+"""
+import sys
+import threading
+from collections.abc import MutableMapping
+from typing import Dict, List, Optional, Iterator
+from pathlib import Path
+from .document_processor import DocumentProcessor
+from .document_watcher import DocumentWatcher
+from .vector_store import VectorStore, RETRIEVAL_MODES
+from .llm_agent import LLMAgent
+from .web_scraper import WebScraper
+
+
+class DocumentTexts(MutableMapping):
+    """
+    文档全文 {文档名: 文本}
+    普通文档的全文保存在内存中；流式处理的大文档只记录内容哈希，读取时再从提取缓存拼接，不常驻内存
+    """
+    
+    def __init__(self, processor: DocumentProcessor):
+        self.processor = processor
+        self._texts = {}  # 文档名 -> 全文
+        self._streamed = {}  # 文档名 -> 内容哈希
+    
+    def __getitem__(self, name: str) -> str:
+        text = self._texts.get(name)
+        if text is not None:
+            return text
+        content_hash = self._streamed[name]
+        # 缓存被清理时重新提取并写回缓存
+        return "\n\n".join(self.processor.stream_chunks(str(self.processor.documents_dir / name),
+                                                        content_hash))
+    
+    def __setitem__(self, name: str, text: str):
+        self._streamed.pop(name, None)
+        self._texts[name] = text
+    
+    def set_streamed(self, name: str, content_hash: str):
+        """记录流式处理的大文档，全文在读取时从提取缓存加载"""
+        self._texts.pop(name, None)
+        self._streamed[name] = content_hash
+    
+    def __delitem__(self, name: str):
+        if self._texts.pop(name, None) is None and self._streamed.pop(name, None) is None:
+            raise KeyError(name)
+    
+    def discard(self, name: str):
+        """删除文档（不存在时忽略），不加载流式文档的全文"""
+        self._texts.pop(name, None)
+        self._streamed.pop(name, None)
+    
+    def __iter__(self) -> Iterator[str]:
+        # 后台更新可能同时增删文档，遍历快照
+        return iter(list(self._texts) + list(self._streamed))
+    
+    def __len__(self) -> int:
+        return len(self._texts) + len(self._streamed)
+    
+    def copy(self) -> 'DocumentTexts':
+        """浅复制，流式文档仍在读取时才加载"""
+        result = DocumentTexts(self.processor)
+        result._texts = dict(self._texts)
+        result._streamed = dict(self._streamed)
+        return result
+    
+    def resident_bytes(self) -> int:
+        """常驻内存的全文占用的字节数"""
+        return sum(sys.getsizeof(text) for text in list(self._texts.values()))
+
+
+class ResearchAssistant:
+    """科研助手主类"""
+    
+    def __init__(self, documents_dir: str = "documents", 
+                 use_quantization: bool = True,
+                 num_workers: int = 1,
+                 extraction_backend: str = "pdfplumber",
+                 chunker: str = "token",
+                 dedup: bool = True,
+                 embedding_cache: Optional[str] = "float32",
+                 index_type: str = "auto",
+                 nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None,
+                 mmap_index: bool = False,
+                 query_cache_size: int = 1024,
+                 query_cache_disk: bool = False,
+                 encoder_backend: str = "torch",
+                 encode_workers: int = 1,
+                 encode_batch_size: int = 32,
+                 rerank_factor: Optional[int] = None,
+                 reduce_dim: Optional[int] = None,
+                 reduce_method: str = "pca",
+                 compact_threshold: Optional[float] = 0.2,
+                 keep_snapshots: int = 2,
+                 retrieval: str = "vector",
+                 shards: int = 0,
+                 index_path: str = ".cache/vector_index.faiss",
+                 share_from: Optional['ResearchAssistant'] = None):
+        """
+        index_path 为索引的保存位置，不同文档集合各用一个，PDF提取缓存保存在其旁边的 extracted/ 中；
+        share_from 不为空时与该助手共用embedding模型、向量缓存和LLM，不再重复加载
+        """
+        self.documents_dir = documents_dir
+        self.vector_store = VectorStore(dedup=dedup, embedding_cache=embedding_cache,
+                                        index_type=index_type, nprobe=nprobe,
+                                        ef_search=ef_search, mmap_index=mmap_index,
+                                        query_cache_size=query_cache_size,
+                                        query_cache_disk=query_cache_disk,
+                                        encoder_backend=encoder_backend,
+                                        encode_workers=encode_workers,
+                                        encode_batch_size=encode_batch_size,
+                                        rerank_factor=rerank_factor,
+                                        reduce_dim=reduce_dim,
+                                        reduce_method=reduce_method,
+                                        compact_threshold=compact_threshold,
+                                        keep_snapshots=keep_snapshots,
+                                        shards=shards,
+                                        share_from=share_from.vector_store if share_from else None)
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"不支持的检索方式: {retrieval}，可选: {', '.join(RETRIEVAL_MODES)}")
+        self.retrieval = retrieval  # 默认检索方式，ask 可单独指定
+        # 按token分块时使用embedding模型自带的分词器，保证文本块不超过模型输入长度
+        tokenizer_name = self.vector_store.model_name if chunker == "token" else None
+        # 提取缓存按集合分开：清理过期条目时只对照本集合的文档，不会删掉其他集合的缓存
+        self.processor = DocumentProcessor(documents_dir, num_workers=num_workers,
+                                           cache_dir=str(Path(index_path).parent / "extracted"),
+                                           extraction_backend=extraction_backend,
+                                           tokenizer_name=tokenizer_name)
+        if share_from is not None:
+            self.llm_agent = share_from.llm_agent
+        else:
+            self.llm_agent = LLMAgent(use_quantization=use_quantization)
+        self.web_scraper = WebScraper()
+        self.documents_text = DocumentTexts(self.processor)  # 存储完整文档文本
+        self.web_contents = {}  # 存储网页内容 {title: content}
+        self.index_path = index_path
+        # 超过该大小的新文档边解析边向量化，不在内存中保留全文
+        self.stream_threshold = 50 * 1024 * 1024
+        self.is_indexed = False
+        # 手动更新与后台监视线程的更新串行执行
+        self.update_lock = threading.Lock()
+        self.is_updating = False
+        self.watcher = None
+    
+    def initialize(self, rebuild_index: bool = False):
+        """初始化助手，处理文档并构建索引"""
+        index_path = Path(self.index_path)
+        
+        if not rebuild_index and self.vector_store.has_index(str(index_path)):
+            print("加载已有索引...")
+            if self.vector_store.load_index(str(index_path)):
+                print("索引加载成功")
+                if self.vector_store.manifest is None:
+                    print("索引缺少文件清单，重新构建索引...")
+                    return self.initialize(rebuild_index=True)
+                # 增量处理启动前新增、修改或删除的文档
+                self.update_index()
+                # 需要重新加载文档文本
+                self._load_documents_text()
+                self.is_indexed = True
+                return
+        
+        print("开始处理文档...")
+        manifest = self.processor.scan_documents()
+        # 大文档边解析边向量化，其余文档一起处理
+        streamed = [name for name, entry in manifest.items() if entry['size'] >= self.stream_threshold]
+        batched = [name for name in manifest if name not in streamed]
+        documents = self.processor.process_documents(
+            names=batched, known_hashes={name: manifest[name]['hash'] for name in batched}
+        ) if batched else {}
+        
+        # 保存完整文档文本
+        self.documents_text = DocumentTexts(self.processor)
+        for doc_name, chunks in documents.items():
+            self.documents_text[doc_name] = "\n\n".join(chunks)
+        
+        # 构建向量索引
+        self.vector_store.build_index(documents)
+        indexed = set(documents)
+        for name in streamed:
+            if self._ingest_stream(name, manifest[name]['hash']):
+                indexed.add(name)
+        
+        if not indexed:
+            print("未找到可处理的文档")
+            return
+        self.processor.prune_cache(entry['hash'] for entry in manifest.values())
+        # 提取失败的文件不记入清单，下次更新时重试
+        self.vector_store.manifest = {
+            name: entry for name, entry in manifest.items() if name in indexed
+        }
+        
+        # 保存索引
+        self.vector_store.save_index(str(index_path))
+        self.is_indexed = True
+        print("初始化完成")
+    
+    def update_index(self) -> Dict[str, List[str]]:
+        """
+        增量更新索引：只向量化新增或修改的文档，删除已移除文档的文本块
+        返回 {'added': [...], 'modified': [...], 'deleted': [...]}
+        """
+        with self.update_lock:
+            self.is_updating = True
+            try:
+                return self._update_index()
+            finally:
+                self.is_updating = False
+    
+    def _update_index(self) -> Dict[str, List[str]]:
+        old_manifest = self.vector_store.manifest or {}
+        manifest = self.processor.scan_documents(old_manifest)
+        
+        added = [name for name in manifest if name not in old_manifest]
+        modified = [name for name in manifest
+                    if name in old_manifest and manifest[name]['hash'] != old_manifest[name]['hash']]
+        deleted = [name for name in old_manifest if name not in manifest]
+        changes = {'added': added, 'modified': modified, 'deleted': deleted}
+        
+        if not (added or modified or deleted):
+            # 仅修改时间变化（如touch）时也刷新清单，下次无需重新计算哈希
+            if manifest != old_manifest:
+                self.vector_store.manifest = manifest
+                self.vector_store.save_index(self.index_path)
+            return changes
+        
+        print(f"检测到文档变化: 新增 {len(added)}，修改 {len(modified)}，删除 {len(deleted)}")
+        
+        removed = self.vector_store.remove_documents(modified + deleted)
+        if removed:
+            print(f"已删除 {removed} 个过期文本块")
+        for name in modified + deleted:
+            self.documents_text.discard(name)
+        
+        changed = added + modified
+        streamed = [name for name in changed if manifest[name]['size'] >= self.stream_threshold]
+        documents = {}
+        batched = [name for name in changed if name not in streamed]
+        if batched:
+            documents = self.processor.process_documents(
+                names=batched, known_hashes={name: manifest[name]['hash'] for name in batched})
+            self.vector_store.add_documents(documents)
+        for doc_name, chunks in documents.items():
+            self.documents_text[doc_name] = "\n\n".join(chunks)
+        indexed = set(documents)
+        for name in streamed:
+            if self._ingest_stream(name, manifest[name]['hash']):
+                indexed.add(name)
+        
+        # 提取失败的文件不记入清单，下次更新时重试
+        self.vector_store.manifest = {
+            name: entry for name, entry in manifest.items()
+            if name in indexed or (name in old_manifest and name not in modified)
+        }
+        self.vector_store.save_index(self.index_path)
+        self.is_indexed = self.vector_store.index is not None
+        return changes
+    
+    def reload_index(self) -> bool:
+        """
+        加载其他进程（如命令行重建索引）保存的最新索引快照，返回是否已切换
+        切换过程中检索不中断，进行中的问答在旧索引上完成
+        """
+        with self.update_lock:
+            if not self.vector_store.reload_index(self.index_path):
+                return False
+            self._load_documents_text()
+            self.is_indexed = self.vector_store.index is not None
+            print(f"已切换到索引快照 {self.vector_store.snapshot}")
+            return True
+    
+    def start_watcher(self, interval: float = 2.0, debounce: float = 5.0):
+        """启动后台线程监视文档目录，新增或修改的PDF稳定后自动增量入库"""
+        if self.watcher is not None and self.watcher.is_alive():
+            return
+        self.watcher = DocumentWatcher(self.documents_dir, self.update_index,
+                                       interval=interval, debounce=debounce)
+        self.watcher.start()
+        print(f"正在监视文档目录: {self.documents_dir}")
+    
+    def stop_watcher(self):
+        """停止后台监视线程"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+    
+    def memory_usage(self) -> int:
+        """估算索引和文档全文占用的内存字节数，不含共用的模型"""
+        return self.vector_store.memory_usage() + self.documents_text.resident_bytes()
+    
+    def close(self):
+        """停止后台监视线程和检索分片，卸载文档集合时调用"""
+        self.stop_watcher()
+        self.vector_store.close()
+    
+    def _ingest_stream(self, doc_name: str, content_hash: str) -> bool:
+        """
+        流式处理大文档：逐页提取（已缓存时逐块读取缓存）、分块并直接写入向量索引，
+        不在内存中保留文本块和全文，返回是否成功写入
+        """
+        pdf_path = Path(self.documents_dir) / doc_name
+        print(f"流式处理大文档: {doc_name}")
+        try:
+            count = self.vector_store.add_chunk_stream(
+                doc_name, self.processor.stream_chunks(str(pdf_path), content_hash)
+            )
+        except Exception as e:
+            print(f"提取PDF文本时出错 {pdf_path}: {e}")
+            # 回滚已写入索引的部分文本块
+            self.vector_store.remove_documents([doc_name])
+            return False
+        print(f"  - 提取了 {count} 个文本块")
+        if not count:
+            return False
+        self.documents_text.set_streamed(doc_name, content_hash)
+        return True
+    
+    def _load_documents_text(self):
+        """按索引的文件清单加载文档文本，大文档只记录内容哈希，使用时再从提取缓存读取"""
+        manifest = self.vector_store.manifest or {}
+        documents_text = DocumentTexts(self.processor)
+        batched = []
+        for name, entry in manifest.items():
+            if entry['size'] >= self.stream_threshold:
+                documents_text.set_streamed(name, entry['hash'])
+            else:
+                batched.append(name)
+        # 未变化的文档直接命中提取缓存，无需重新解析PDF；内容哈希取自清单，也不重新读取文件
+        if batched:
+            known_hashes = {name: manifest[name]['hash'] for name in batched}
+            for doc_name, chunks in self.processor.process_documents(names=batched,
+                                                                     known_hashes=known_hashes).items():
+                documents_text[doc_name] = "\n\n".join(chunks)
+        self.processor.prune_cache(entry['hash'] for entry in manifest.values())
+        # 整体替换，重新加载索引时并发读取不会看到一半的结果
+        self.documents_text = documents_text
+    
+    def ask(self, question: str, top_k: int = 5,
+            documents: Optional[List[str]] = None, retrieval: Optional[str] = None) -> str:
+        """
+        询问问题，documents 不为空时只在这些文档中检索
+        retrieval 为检索方式：vector（向量）、lexical（BM25关键词，适合术语、缩写、作者名等精确查询）
+        或 hybrid（两者融合），默认使用初始化时指定的方式
+        """
+        if not self.is_indexed:
+            return "请先初始化助手（处理文档）。"
+        
+        # 检索相关文档块
+        relevant_chunks = self.vector_store.search(question, top_k=top_k, documents=documents,
+                                                   mode=retrieval or self.retrieval)
+        
+        if not relevant_chunks:
+            return "未找到相关文档内容。"
+        
+        # 使用LLM生成回答
+        answer = self.llm_agent.answer_question(question, relevant_chunks)
+        return answer
+    
+    def ask_batch(self, questions: List[str], top_k: int = 5,
+                  documents: Optional[List[str]] = None,
+                  retrieval: Optional[str] = None) -> List[str]:
+        """一次询问多个问题：批量检索后逐个生成回答"""
+        if not self.is_indexed:
+            return ["请先初始化助手（处理文档）。" for _ in questions]
+        
+        # 所有问题一次向量化、一次检索
+        all_chunks = self.vector_store.search_batch(questions, top_k=top_k, documents=documents,
+                                                    mode=retrieval or self.retrieval)
+        
+        answers = []
+        for question, relevant_chunks in zip(questions, all_chunks):
+            if not relevant_chunks:
+                answers.append("未找到相关文档内容。")
+            else:
+                answers.append(self.llm_agent.answer_question(question, relevant_chunks))
+        return answers
+    
+    def analyze_similarity(self) -> str:
+        """分析文档相似性"""
+        if not self.is_indexed or len(self.documents_text) < 2:
+            return "至少需要2个文档才能进行相似性分析。"
+        
+        # 复制一份，避免后台更新索引时字典在遍历中被修改
+        return self.llm_agent.analyze_similarity(self.documents_text.copy())
+    
+    def recommend_research(self) -> str:
+        """推荐研究问题和方法"""
+        if not self.is_indexed:
+            return "请先初始化助手（处理文档）。"
+        
+        return self.llm_agent.recommend_research(self.documents_text.copy())
+    
+    def get_document_list(self) -> List[str]:
+        """获取文档列表"""
+        return list(self.documents_text.keys())
+    
+    def fetch_web_content(self, url: str) -> Optional[Dict[str, str]]:
+        """抓取网页内容"""
+        result = self.web_scraper.fetch_url(url)
+        if result:
+            # 保存网页内容
+            key = f"网页_{result['title'][:50]}" if result['title'] else f"网页_{url[:50]}"
+            self.web_contents[key] = result['content']
+            print(f"网页内容已保存: {key} ({result['length']} 字符)")
+        return result
+    
+    def summarize_web_content(self, url: str, focus: str = "复习总结") -> str:
+        """总结网页内容（用于复习）"""
+        print(f"正在抓取并总结网页: {url}")
+        web_data = self.fetch_web_content(url)
+        
+        if not web_data:
+            return "无法抓取网页内容，请检查URL是否正确或网络连接是否正常。"
+        
+        # 截取内容以避免token限制
+        content = web_data['content']
+        if len(content) > 8000:
+            content = content[:8000] + "\n\n[内容已截断...]"
+        
+        prompt = f"""请对以下网页内容进行{focus}，生成结构化的总结，帮助用户复习和理解：
+
+网页标题：{web_data['title']}
+网页地址：{web_data['url']}
+
+网页内容：
+{content}
+
+请提供以下方面的总结：
+1. 主要内容概述
+2. 关键知识点
+3. 重要概念和术语
+4. 要点总结
+5. 可能的实践建议或思考题
+
+请用清晰的结构化格式输出："""
+        
+        return self.llm_agent.generate_response(prompt, max_length=1024)
+    
+    def get_web_contents_list(self) -> List[str]:
+        """获取已抓取的网页内容列表"""
+        return list(self.web_contents.keys())
+    
+    def batch_summarize_urls(self, urls: List[str], focus: str = "复习总结") -> Dict[str, str]:
+        """批量总结多个网页"""
+        results = {}
+        for url in urls:
+            print(f"\n处理URL {urls.index(url) + 1}/{len(urls)}: {url}")
+            summary = self.summarize_web_content(url, focus)
+            results[url] = summary
+        return results
+
@@ -0,0 +1,216 @@
+"""
+分片检索模块
+把向量按ID切分为N个分片，每个分片由一个本地工作进程加载并通过管道提供精确检索；
+协调方把查询并行发给全部分片，再按距离合并各分片的前k条，新增和删除的向量直接发给所在的分片。
+各分片的数据保存在独立的文件中，任一工作进程退出后可以单独重新同步
+"""
+import os
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
+import faiss
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from pathlib import Path
+
+# 等待工作进程加载分片的最长秒数
+SHARD_START_TIMEOUT = 600
+# 写入分片文件时每次读取的向量数
+SYNC_BLOCK_SIZE = 16384
+
+
+def _shard_main(conn, directory: str, shard: int, num_threads: int):
+    """
+    工作进程入口：加载分片向量，循环处理请求：
+    ('search', 查询向量, k) 返回 (距离, ID)；('add', 向量, ID) 和 ('remove', ID) 返回分片中的向量数
+    收到None或管道关闭时退出
+    """
+    faiss.omp_set_num_threads(num_threads)
+    path = Path(directory)
+    vectors = np.load(path / f"{shard}_vectors.npy", mmap_mode='r')
+    ids = np.load(path / f"{shard}_ids.npy")
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+    for start in range(0, len(ids), SYNC_BLOCK_SIZE):
+        index.add_with_ids(np.ascontiguousarray(vectors[start:start + SYNC_BLOCK_SIZE]),
+                           ids[start:start + SYNC_BLOCK_SIZE])
+    del vectors, ids
+    conn.send(('ready', index.ntotal))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        if request[0] == 'add':
+            index.add_with_ids(request[1], request[2])
+            conn.send(index.ntotal)
+        elif request[0] == 'remove':
+            index.remove_ids(faiss.IDSelectorBatch(request[1]))
+            conn.send(index.ntotal)
+        else:
+            _, queries, k = request
+            k = min(k, index.ntotal)
+            if not k:
+                conn.send((np.full((len(queries), 0), np.inf, dtype='float32'),
+                           np.full((len(queries), 0), -1, dtype='int64')))
+                continue
+            conn.send(index.search(queries, k))
+    conn.close()
+
+
+class ShardPool:
+    """
+    分片检索进程池
+    向量按ID对分片数取模分配到各分片（ID不随压缩变化，增删时可直接定位所在分片），
+    工作进程用flat索引精确检索，合并后的结果与在全部向量上建一个flat索引检索的结果一致。
+    sync 写入分片文件并启动工作进程，之后的增删通过 add、remove 直接发给对应的工作进程
+    """
+    
+    def __init__(self, num_shards: int, cache_dir: str, dim: int):
+        """分片文件保存在 cache_dir 下独立的临时目录中，关闭或进程退出时删除"""
+        self.num_shards = num_shards
+        self.dim = dim
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self._tmp_dir = tempfile.TemporaryDirectory(prefix="shards-", dir=cache_dir)
+        self.directory = Path(self._tmp_dir.name)
+        self._processes = [None] * num_shards
+        self._conns = [None] * num_shards
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+        self._executor = ThreadPoolExecutor(max_workers=num_shards)
+        self.num_threads = max(1, (os.cpu_count() or 1) // num_shards)
+    
+    def sync(self, ids: np.ndarray, read: Callable[[np.ndarray], Optional[np.ndarray]],
+             shards: Optional[List[int]] = None) -> bool:
+        """
+        重新写入分片文件并重启对应的工作进程，shards 为空时为全部分片
+        read 按ID分批读取向量，返回None表示无法读取；返回全部分片是否都在运行
+        """
+        ids = np.asarray(ids, dtype='int64')
+        for shard in range(self.num_shards) if shards is None else shards:
+            shard_ids = ids[ids % self.num_shards == shard]
+            # 先写临时文件再替换，分批读取，不把全部向量读入内存
+            tmp_path = self.directory / f"{shard}_vectors.tmp.npy"
+            vectors = np.lib.format.open_memmap(tmp_path, mode='w+', dtype='float32',
+                                                shape=(len(shard_ids), self.dim))
+            for start in range(0, len(shard_ids), SYNC_BLOCK_SIZE):
+                block = read(shard_ids[start:start + SYNC_BLOCK_SIZE])
+                if block is None:
+                    del vectors
+                    os.remove(tmp_path)
+                    return False
+                vectors[start:start + len(block)] = block
+            vectors.flush()
+            del vectors
+            os.replace(tmp_path, self.directory / f"{shard}_vectors.npy")
+            np.save(self.directory / f"{shard}_ids.npy", shard_ids)
+            self.restart(shard)
+        return all(self.alive())
+    
+    def restart(self, shard: int) -> bool:
+        """按分片文件重启单个分片的工作进程，其他分片不受影响；返回是否启动成功"""
+        with self._locks[shard]:
+            self._stop(shard)
+            parent, child = multiprocessing.Pipe()
+            # 使用spawn启动：主进程中已有模型和后台线程，fork可能导致死锁
+            process = multiprocessing.get_context('spawn').Process(
+                target=_shard_main, args=(child, str(self.directory), shard, self.num_threads),
+                daemon=True)
+            process.start()
+            child.close()
+            try:
+                if not parent.poll(SHARD_START_TIMEOUT):
+                    raise TimeoutError("加载超时")
+                parent.recv()
+            except (EOFError, OSError, TimeoutError) as e:
+                print(f"分片 {shard} 启动失败: {e}")
+                process.kill()
+                return False
+            self._processes[shard] = process
+            self._conns[shard] = parent
+            return True
+    
+    def _stop(self, shard: int):
+        conn, process = self._conns[shard], self._processes[shard]
+        self._conns[shard] = self._processes[shard] = None
+        if conn is not None:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        if process is not None:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+    
+    def alive(self) -> List[bool]:
+        """各分片工作进程是否在运行"""
+        return [process is not None and process.is_alive() for process in self._processes]
+    
+    def _request(self, shard: int, request):
+        """向单个分片发送请求并等待结果；工作进程无响应时停止该分片并抛出RuntimeError"""
+        with self._locks[shard]:
+            conn = self._conns[shard]
+            if conn is not None:
+                try:
+                    conn.send(request)
+                    return conn.recv()
+                except (EOFError, OSError):
+                    self._stop(shard)
+        raise RuntimeError(f"分片 {shard} 不可用")
+    
+    def _update(self, ids: np.ndarray, make_request) -> bool:
+        """把增删按ID分发给所在的分片，返回是否全部成功；未运行的分片不会收到，视为失败"""
+        ok = True
+        owners = ids % self.num_shards
+        for shard in range(self.num_shards):
+            mask = owners == shard
+            if not mask.any():
+                continue
+            try:
+                self._request(shard, make_request(mask))
+            except RuntimeError:
+                ok = False
+        return ok
+    
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> bool:
+        """把新向量加入所在的分片，返回是否全部成功"""
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        ids = np.asarray(ids, dtype='int64')
+        return self._update(ids, lambda mask: ('add', vectors[mask], ids[mask]))
+    
+    def remove(self, ids: np.ndarray) -> bool:
+        """从所在的分片中移除向量，返回是否全部成功"""
+        ids = np.asarray(ids, dtype='int64')
+        return self._update(ids, lambda mask: ('remove', ids[mask]))
+    
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        并行检索全部分片并合并，返回 (distances, ids)，格式与faiss检索一致
+        有分片不可用时抛出RuntimeError
+        """
+        queries = np.ascontiguousarray(queries, dtype='float32')
+        futures = [self._executor.submit(self._request, shard, ('search', queries, k))
+                   for shard in range(self.num_shards)]
+        results = [future.result() for future in futures]
+        distances = np.concatenate([r[0] for r in results], axis=1)
+        ids = np.concatenate([r[1] for r in results], axis=1)
+        # 距离相同时ID（即加入顺序）靠前的结果在前，与flat索引一致
+        order = np.lexsort((ids, distances), axis=1)[:, :k]
+        distances = np.take_along_axis(distances, order, axis=1)
+        ids = np.take_along_axis(ids, order, axis=1)
+        if distances.shape[1] < k:
+            pad = k - distances.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+        return distances, ids
+    
+    def close(self):
+        """停止全部工作进程"""
+        for shard in range(self.num_shards):
+            with self._locks[shard]:
+                self._stop(shard)
+        self._executor.shutdown(wait=False)
+        self._tmp_dir.cleanup()
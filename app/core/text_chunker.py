@@ -0,0 +1,196 @@
+"""
+基于分词器的文本分块模块
+按embedding模型的token数而不是字符数切分文本，保证每个块不超过模型的最大输入长度
+"""
+import re
+from collections import deque
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from transformers import AutoTokenizer
+
+# 句子边界：中文句末标点、后跟空白的英文句末标点、段落分隔（空行）
+_SENTENCE_END = re.compile(r'[。！？；]+|[.!?;]+(?=\s)|\n\s*\n')
+
+# 每个token平均对应的字符数上限，用于估计超长句子的字符长度
+_CHARS_PER_TOKEN = 4
+
+
+class TokenChunker:
+    """
+    按token数分块
+    以句子为基本单元贪心装箱，块之间按token数保留重叠；
+    超长句子（如不含标点的中文长段）先按字符数在空白处切开，再按分词器的偏移量切分，
+    长时间没有句子边界时不会反复扫描同一段文本，缓冲区也不会无限增长。
+    块文本通过偏移量从缓冲区切片得到，不做逐词字符串拼接，整体为线性时间。
+    支持流式输入：feed() 返回已完成的块，finish() 返回剩余的块。
+    """
+    
+    def __init__(self, tokenizer, max_tokens: int = 510, overlap_tokens: int = 50):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens 必须小于 max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.buffer = ""
+        self.scan_pos = 0  # 缓冲区中尚未切分成句子的起始位置
+        self.max_span = max_tokens * _CHARS_PER_TOKEN  # 句子单元的最大字符数
+        # 当前窗口中的句子单元 (起始偏移, 结束偏移, token数)
+        self.units = deque()
+        self.window_tokens = 0
+        self.window_new = False  # 窗口中是否有尚未输出过的单元
+    
+    def feed(self, text: str) -> List[str]:
+        """输入一段文本，返回已完成的文本块"""
+        self.buffer += text
+        spans = []
+        for match in _SENTENCE_END.finditer(self.buffer, self.scan_pos):
+            # 位于缓冲区末尾的边界可能尚未结束（如后续还有标点或换行），留到下次处理
+            if match.end() == len(self.buffer):
+                break
+            self._cut_long(match.end(), spans)
+            spans.append((self.scan_pos, match.end()))
+            self.scan_pos = match.end()
+        # 尚未遇到句子边界的部分超长时提前切出，切分位置只取决于文本本身，与输入的分段方式无关
+        self._cut_long(len(self.buffer), spans)
+        out = self._add_spans(spans)
+        self._compact()
+        return out
+    
+    def finish(self) -> List[str]:
+        """输入结束，返回剩余的文本块"""
+        out = []
+        if self.scan_pos < len(self.buffer):
+            out = self._add_spans([(self.scan_pos, len(self.buffer))])
+            self.scan_pos = len(self.buffer)
+        if self.window_new:
+            self._emit(out)
+        self.buffer = ""
+        self.scan_pos = 0
+        self.units.clear()
+        self.window_tokens = 0
+        self.window_new = False
+        return out
+    
+    def _cut_long(self, end: int, spans: List[Tuple[int, int]]):
+        """把 scan_pos 到 end 之间超过 max_span 个字符的部分切成单元，尽量在空白处切分"""
+        while end - self.scan_pos > self.max_span:
+            cut = self.scan_pos + self.max_span
+            low = self.scan_pos + self.max_span // 2
+            while cut > low and not self.buffer[cut - 1].isspace():
+                cut -= 1
+            if cut == low:
+                cut = self.scan_pos + self.max_span
+            spans.append((self.scan_pos, cut))
+            self.scan_pos = cut
+    
+    def _add_spans(self, spans: List[Tuple[int, int]]) -> List[str]:
+        """统计一批句子的token数并装入窗口"""
+        spans = [(s, e) for s, e in spans if self.buffer[s:e].strip()]
+        if not spans:
+            return []
+        out = []
+        encodings = self.tokenizer(
+            [self.buffer[s:e] for s, e in spans],
+            add_special_tokens=False,
+            return_offsets_mapping=True
+        )
+        for (start, end), offsets in zip(spans, encodings['offset_mapping']):
+            if len(offsets) <= self.max_tokens:
+                self._add_unit((start, end, len(offsets)), out)
+                continue
+            # 超长句子按token偏移量切成不超过max_tokens的片段，尽量在词首处切分
+            text = self.buffer[start:end]
+            i = 0
+            while i < len(offsets):
+                j = min(i + self.max_tokens, len(offsets))
+                if j < len(offsets):
+                    k = j
+                    while k > i + self.max_tokens // 2 and _is_continuation(text, offsets, k):
+                        k -= 1
+                    if not _is_continuation(text, offsets, k):
+                        j = k
+                piece_start = start + offsets[i][0] if i > 0 else start
+                piece_end = start + offsets[j][0] if j < len(offsets) else end
+                self._add_unit((piece_start, piece_end, j - i), out)
+                i = j
+        return out
+    
+    def _add_unit(self, unit: Tuple[int, int, int], out: List[str]):
+        """向窗口追加一个单元，窗口满时输出一个块并保留重叠部分"""
+        if self.window_tokens + unit[2] > self.max_tokens:
+            if self.window_new:
+                self._emit(out)
+            # 从窗口头部丢弃单元，直到剩余部分不超过重叠长度且能容纳新单元
+            dropped = None
+            while self.units and (self.window_tokens > self.overlap_tokens
+                                  or self.window_tokens + unit[2] > self.max_tokens):
+                dropped = self.units.popleft()
+                self.window_tokens -= dropped[2]
+            # 句子比重叠长度长时，用最后丢弃句子的末尾若干token补足重叠
+            need = min(self.overlap_tokens - self.window_tokens,
+                       self.max_tokens - self.window_tokens - unit[2])
+            if dropped is not None and need > 0:
+                self._keep_tail(dropped, need)
+        self.units.append(unit)
+        self.window_tokens += unit[2]
+        self.window_new = True
+    
+    def _keep_tail(self, unit: Tuple[int, int, int], tokens: int):
+        """把单元末尾不超过tokens个token（从词首开始）放回窗口头部作为重叠"""
+        start, end, _ = unit
+        text = self.buffer[start:end]
+        offsets = self.tokenizer(text, add_special_tokens=False,
+                                 return_offsets_mapping=True)['offset_mapping']
+        k = max(len(offsets) - tokens, 1)
+        while k < len(offsets) and _is_continuation(text, offsets, k):
+            k += 1
+        if k < len(offsets):
+            self.units.appendleft((start + offsets[k][0], end, len(offsets) - k))
+            self.window_tokens += len(offsets) - k
+    
+    def _emit(self, out: List[str]):
+        chunk = self.buffer[self.units[0][0]:self.units[-1][1]].strip()
+        if chunk:
+            out.append(chunk)
+        self.window_new = False
+    
+    def _compact(self):
+        """丢弃缓冲区中已不再需要的前缀，已丢弃部分不超过缓冲区一半时跳过以保证摊还线性"""
+        keep_from = self.units[0][0] if self.units else self.scan_pos
+        if keep_from > len(self.buffer) // 2:
+            self.buffer = self.buffer[keep_from:]
+            self.scan_pos -= keep_from
+            self.units = deque((s - keep_from, e - keep_from, n) for s, e, n in self.units)
+
+
+def _is_cjk(char: str) -> bool:
+    return '\u4e00' <= char <= '\u9fff' or '\u3400' <= char <= '\u4dbf'
+
+
+def _is_continuation(text: str, offsets: List[Tuple[int, int]], j: int) -> bool:
+    """第j个token是否紧接上一个token、属于同一个词（如WordPiece的##子词）"""
+    start = offsets[j][0]
+    if start == 0 or start != offsets[j - 1][1]:
+        return False
+    prev, cur = text[start - 1], text[start]
+    return prev.isalnum() and cur.isalnum() and not _is_cjk(prev) and not _is_cjk(cur)
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_name: str):
+    """加载与embedding模型配套的快速分词器（需要偏移量支持），每个进程只加载一次"""
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if not getattr(tokenizer, 'is_fast', False):
+        raise ValueError(f"分词器 {model_name} 不支持偏移量，无法按token分块")
+    return tokenizer
+
+
+def default_max_tokens(tokenizer, limit: Optional[int] = None) -> int:
+    """模型最大输入长度减去 [CLS]/[SEP] 等特殊token"""
+    max_len = tokenizer.model_max_length
+    # 部分分词器未配置最大长度时会返回一个极大的占位值
+    if not max_len or max_len > 100000:
+        max_len = 512
+    if limit:
+        max_len = min(max_len, limit)
+    return max_len - tokenizer.num_special_tokens_to_add(pair=False)
@@ -1,138 +1,1050 @@
-"""
-向量存储模块
-使用sentence-transformers和FAISS实现文档向量化和检索
-"""
-import os
-import pickle
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Tuple
-from pathlib import Path
-
-
-class VectorStore:
-    """向量存储和检索"""
-    
-    def __init__(self, model_name: str = "BAAI/bge-large-zh-v1.5",
-                 cache_dir: str = ".cache"):
-        """
-        初始化向量存储
-        使用轻量级的多语言模型，适合6G显存
-        """
-        self.model_name = model_name
-        self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
-        
-        print(f"加载embedding模型: {model_name}")
-        # 使用CPU模式以节省显存
-        self.embedding_model = SentenceTransformer(model_name, device='cpu')
-        self.index = None
-        self.documents = []
-        self.metadata = []  # 存储文档来源信息
-        
-    def build_index(self, documents: Dict[str, List[str]]):
-        """构建向量索引"""
-        print("构建向量索引...")
-        
-        all_chunks = []
-        self.metadata = []
-        
-        for doc_name, chunks in documents.items():
-            for i, chunk in enumerate(chunks):
-                all_chunks.append(chunk)
-                self.metadata.append({
-                    'doc_name': doc_name,
-                    'chunk_id': i,
-                    'chunk': chunk
-                })
-        
-        if not all_chunks:
-            print("没有文档内容可索引")
-            return
-        
-        print(f"正在向量化 {len(all_chunks)} 个文本块...")
-        # 批量向量化
-        embeddings = self.embedding_model.encode(
-            all_chunks,
-            show_progress_bar=True,
-            batch_size=32,
-            convert_to_numpy=True
-        )
-        
-        # 创建FAISS索引
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings.astype('float32'))
-        self.documents = all_chunks
-        
-        print(f"索引构建完成，共 {self.index.ntotal} 个向量")
-    
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """搜索相关文档块"""
-        if self.index is None or len(self.documents) == 0:
-            return []
-        
-        # 向量化查询
-        query_embedding = self.embedding_model.encode(
-            [query],
-            convert_to_numpy=True
-        ).astype('float32')
-        
-        # 搜索
-        distances, indices = self.index.search(query_embedding, min(top_k, len(self.documents)))
-        
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.metadata):
-                results.append({
-                    'doc_name': self.metadata[idx]['doc_name'],
-                    'chunk_id': self.metadata[idx]['chunk_id'],
-                    'chunk': self.metadata[idx]['chunk'],
-                    'distance': float(distances[0][i])
-                })
-        
-        return results
-    
-    def get_document_embedding(self, text: str) -> np.ndarray:
-        """获取文档的整体向量表示"""
-        embedding = self.embedding_model.encode(
-            [text],
-            convert_to_numpy=True
-        )
-        return embedding[0]
-    
-    def save_index(self, path: str):
-        """保存索引"""
-        save_path = Path(path)
-        save_path.parent.mkdir(exist_ok=True)
-        
-        faiss.write_index(self.index, str(save_path))
-        
-        # 保存元数据
-        metadata_path = save_path.parent / f"{save_path.stem}_metadata.pkl"
-        with open(metadata_path, 'wb') as f:
-            pickle.dump({
-                'documents': self.documents,
-                'metadata': self.metadata
-            }, f)
-    
-    def load_index(self, path: str):
-        """加载索引"""
-        load_path = Path(path)
-        
-        if not load_path.exists():
-            return False
-        
-        self.index = faiss.read_index(str(load_path))
-        
-        # 加载元数据
-        metadata_path = load_path.parent / f"{load_path.stem}_metadata.pkl"
-        if metadata_path.exists():
-            with open(metadata_path, 'rb') as f:
-                data = pickle.load(f)
-                self.documents = data['documents']
-                self.metadata = data['metadata']
-        
-        return True
-
+"""
+向量存储模块
+使用sentence-transformers和FAISS实现文档向量化和检索
+"""
+import os
+import json
+import time
+import shutil
+import threading
+import numpy as np
+import faiss
+from typing import List, Dict, Tuple, Iterable, Optional
+from pathlib import Path
+from .deduplicator import ChunkDeduplicator
+from .chunk_store import ChunkStore
+from .embedding_cache import EmbeddingCache, chunk_key
+from .encoder import (load_encoder, encoder_id, encode_parallel, auto_encode_workers,
+                      PARALLEL_MIN_CHUNKS)
+from .query_cache import QueryCache, normalize_query
+from .float_store import FloatStore, rerank
+from .lexical_index import LexicalIndex
+from .shard_search import ShardPool
+from .index_factory import (INDEX_TYPES, COMPRESSED_TYPES, RERANK_FACTORS, REDUCTION_METHODS,
+                            FLAT_MAX_VECTORS, index_spec, current_spec, reduction_spec, current_reduction,
+                            exact_vectors, create_index, empty_index, has_stable_ids, stored_vectors,
+                            set_search_params, filter_params, code_bytes, read_index)
+
+# vector: 向量检索；lexical: BM25关键词检索，不运行embedding模型；hybrid: 两者按倒数排名融合
+RETRIEVAL_MODES = ('vector', 'lexical', 'hybrid')
+# 混合检索时两种检索各取 top_k 的该倍数条候选参与融合
+HYBRID_CANDIDATES = 4
+# 倒数排名融合的平滑常数，越大排名靠后的结果权重下降越慢
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], top_k: int) -> List[Tuple[int, float]]:
+    """
+    倒数排名融合：每个结果的得分为它在各个排名中 1/(RRF_K+名次) 之和，返回得分最高的 (位置, 得分)
+    只用名次，不需要统一向量距离和BM25得分的尺度
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, 1):
+            scores[position] = scores.get(position, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+
+
+def _link(source: str, target: Path) -> bool:
+    """为未修改的文件创建硬链接，新快照无需复制；不支持硬链接时返回False"""
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        return False
+
+
+def _new_snapshot_dir(root: Path) -> Path:
+    """创建下一个版本号的快照目录，多个进程同时保存时各自得到不同的版本"""
+    version = max((int(p.name) for p in root.iterdir() if p.name.isdigit()), default=0) + 1
+    while True:
+        snapshot = root / f"{version:06d}"
+        try:
+            snapshot.mkdir()
+            return snapshot
+        except FileExistsError:
+            version += 1
+
+
+class VectorStore:
+    """向量存储和检索"""
+    
+    def __init__(self, model_name: str = "BAAI/bge-large-zh-v1.5",
+                 cache_dir: str = ".cache", dedup: bool = True,
+                 embedding_cache: Optional[str] = "float32",
+                 index_type: str = "auto", nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None, mmap_index: bool = False,
+                 query_cache_size: int = 1024, query_cache_disk: bool = False,
+                 encoder_backend: str = "torch", encode_workers: int = 1,
+                 encode_batch_size: int = 32, rerank_factor: Optional[int] = None,
+                 reduce_dim: Optional[int] = None, reduce_method: str = "pca",
+                 compact_threshold: Optional[float] = 0.2, keep_snapshots: int = 2,
+                 shards: int = 0, share_from: Optional['VectorStore'] = None):
+        """
+        初始化向量存储
+        使用轻量级的多语言模型，适合6G显存
+        dedup 为True时入库前合并完全重复和近似重复的文本块
+        embedding_cache 为向量缓存的存储精度 (float32/float16)，None 表示不缓存
+        index_type 为索引类型 (auto/flat/ivf/ivfpq/hnsw/sq8/binary)，auto 按向量数量自动选择；
+        nprobe、ef_search 分别为倒排索引和HNSW的检索参数
+        sq8、binary 为压缩索引，原始向量保存在索引旁的文件中并内存映射，
+        检索时取 top_k * rerank_factor 个候选用原始向量精确重排序
+        reduce_dim 不为空时在索引前加一层降维变换 (reduce_method 为 pca 或 opq)，构建索引时训练，
+        随索引一起保存，检索时查询向量自动经过同一变换
+        mmap_index 为True时以内存映射方式加载索引文件：启动几乎不耗时，多个进程共享页缓存，
+        但首次检索需要从磁盘读入用到的页
+        query_cache_size 为内存中缓存的查询向量条数，0 表示不缓存；
+        query_cache_disk 为True时常用查询的向量同时保存到磁盘，重启后仍然命中
+        encoder_backend 为编码器后端 (torch/torch-int8/onnx/onnx-int8)
+        encode_workers > 1 时构建索引等大批量向量化使用多进程，<= 0 表示按CPU核心数和可用内存自动选择；
+        encode_batch_size 为向量化的批大小
+        删除文档时只把文本块标记为已删除（检索时跳过），已删除的比例超过 compact_threshold 后
+        在后台线程中压缩索引和元数据，None 或 0 表示不自动压缩
+        keep_snapshots 为磁盘上保留的索引快照数（包括当前快照），供仍在使用旧快照的进程读取
+        shards > 1 时加载或构建索引后把向量按ID切分到多个本地工作进程，向量检索并行发往各分片后合并，
+        结果与flat索引一致；之后的增删直接同步到所在的分片，本进程的索引以内存映射方式打开
+        share_from 不为空时与该向量存储共用embedding模型、向量缓存和查询缓存，不再加载模型
+        （model_name、encoder_backend、embedding_cache、query_cache_* 参数被忽略）
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"不支持的索引类型: {index_type}，可选: {', '.join(INDEX_TYPES)}")
+        if reduce_method not in REDUCTION_METHODS:
+            raise ValueError(f"不支持的降维方法: {reduce_method}，可选: {', '.join(REDUCTION_METHODS)}")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        
+        if share_from is not None:
+            self.model_name = share_from.model_name
+            self.embedding_model = share_from.embedding_model
+            self.encoder_backend = share_from.encoder_backend
+        else:
+            self.model_name = model_name
+            print(f"加载embedding模型: {model_name}")
+            self.embedding_model, self.encoder_backend = load_encoder(model_name, encoder_backend,
+                                                                      cache_dir)
+        # 向量缓存和索引按编码器区分，更换后端不会混用向量
+        self.encoder_id = encoder_id(self.model_name, self.encoder_backend)
+        self.dim = self.embedding_model.get_sentence_embedding_dimension()
+        if reduce_dim is not None and not 0 < reduce_dim < self.dim:
+            raise ValueError(f"降维目标维度须在 1 到 {self.dim - 1} 之间: {reduce_dim}")
+        if encode_workers <= 0:
+            encode_workers = auto_encode_workers(self.embedding_model)
+            print(f"自动选择 {encode_workers} 个向量化进程")
+        self.encode_workers = encode_workers
+        self.encode_batch_size = encode_batch_size
+        self.index = None
+        self._mapped_path = None  # 当前索引映射的文件，为None表示索引在内存中
+        self._index_bytes = 0  # 最近加载或保存的索引文件大小，用于估算内存占用
+        self.vectors = None  # 压缩索引对应的原始向量，位置与索引一致
+        self.rerank_factor = rerank_factor
+        self.reduce_dim = reduce_dim
+        self.reduce_method = reduce_method
+        self.chunks = ChunkStore()  # 文本块及其来源，位置与索引中的向量一一对应，检索按ID查找位置
+        self.lexical = LexicalIndex()  # 与向量索引同步维护的BM25倒排索引
+        self.manifest = {}  # 已索引文件清单 {doc_name: {'mtime', 'size', 'hash'}}
+        self.deduplicator = ChunkDeduplicator() if dedup else None
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.mmap_index = mmap_index
+        self.query_cache = None
+        self.embedding_cache = None
+        if share_from is not None:
+            # 同一进程中同一缓存目录只能有一个实例，否则各自追加的行号会错乱
+            self.query_cache = share_from.query_cache
+            self.embedding_cache = share_from.embedding_cache
+        elif query_cache_size > 0:
+            disk_dir = str(self.cache_dir / "queries") if query_cache_disk else None
+            self.query_cache = QueryCache(query_cache_size, disk_dir, self.encoder_id)
+        if embedding_cache and share_from is None:
+            self.embedding_cache = EmbeddingCache(str(self.cache_dir / "embeddings"),
+                                                  self.encoder_id, dtype=embedding_cache)
+        self.compact_threshold = compact_threshold
+        self.keep_snapshots = max(keep_snapshots, 1)
+        self.snapshot = None  # 已加载或最近保存的快照版本
+        self.shard_pool = ShardPool(shards, str(self.cache_dir), self.dim) if shards > 1 else None
+        self._shards_ready = False  # 分片与索引中未删除的向量一致时为True，否则检索使用本进程的索引
+        # 保护索引和元数据：后台更新与检索并发时，检索只会看到已完整写入的向量
+        self.lock = threading.RLock()
+        self._version = 0  # 索引或元数据每次变化时递增，压缩和重建据此判断期间是否有写入
+        self._live_filter = None  # (版本, 跳过已删除向量的检索参数, 选择器)
+        self._compacting = False
+        self._pending_ingests = 0  # 已登记文本块、尚未写入索引的入库数，期间不压缩
+        # 原地修改索引（追加向量）与压缩时在锁外复制索引互斥；须先于 lock 获取
+        self._write_lock = threading.Lock()
+    
+    def _encode_chunks(self, chunks: List[str], show_progress_bar: bool = True) -> np.ndarray:
+        """批量向量化文本块，返回float32矩阵；启用向量缓存时只向量化缓存中没有的文本块"""
+        if self.embedding_cache is None:
+            return self._encode(chunks, show_progress_bar)
+        
+        keys = [chunk_key(chunk) for chunk in chunks]
+        embeddings, missing = self.embedding_cache.get(keys)
+        if embeddings is not None and show_progress_bar:
+            print(f"向量缓存命中 {len(chunks) - len(missing)} 个文本块")
+        if missing:
+            encoded = self._encode([chunks[i] for i in missing], show_progress_bar)
+            self.embedding_cache.put([keys[i] for i in missing], encoded)
+            if embeddings is None:
+                return encoded
+            embeddings[missing] = encoded
+        return embeddings
+    
+    def _encode(self, chunks: List[str], show_progress_bar: bool = True) -> np.ndarray:
+        """向量化文本块；文本块足够多且 encode_workers > 1 时使用多进程"""
+        start = time.perf_counter()
+        embeddings = None
+        if self.encode_workers > 1 and len(chunks) >= PARALLEL_MIN_CHUNKS:
+            try:
+                embeddings = encode_parallel(self.model_name, self.encoder_backend, chunks,
+                                             self.encode_workers, self.encode_batch_size,
+                                             str(self.cache_dir), show_progress_bar)
+            except Exception as e:
+                print(f"多进程向量化失败，改为单进程: {e}")
+        if embeddings is None:
+            embeddings = self.embedding_model.encode(
+                chunks,
+                show_progress_bar=show_progress_bar,
+                batch_size=self.encode_batch_size,
+                convert_to_numpy=True
+            ).astype('float32')
+        if show_progress_bar:
+            elapsed = time.perf_counter() - start
+            print(f"向量化 {len(chunks)} 个文本块耗时 {elapsed:.1f} 秒 "
+                  f"({len(chunks) / max(elapsed, 1e-6):.1f} 块/秒)")
+        return embeddings
+        
+    def _stage_chunks(self, items: Iterable[Tuple[str, int, str]],
+                      merged: List[int]) -> List[str]:
+        """
+        登记待入库的 (文档名, 块序号, 文本块)，返回需要向量化的新文本块
+        与已有块完全重复或近似重复的文本块只在代表块的 sources 中记录来源，不再重复索引；
+        被追加来源的代表块位置记录在 merged 中，便于失败时撤销
+        """
+        new_chunks = []
+        if self.deduplicator is not None and self.deduplicator.stale:
+            self.deduplicator.rebuild(self.chunks.fingerprints())
+        for doc_name, chunk_id, chunk in items:
+            fingerprint = None
+            if self.deduplicator is not None:
+                fingerprint = self.deduplicator.fingerprint(chunk)
+                position = self.deduplicator.find(fingerprint)
+                if position is not None:
+                    self.chunks.add_source(position, doc_name, chunk_id)
+                    merged.append(position)
+                    continue
+                self.deduplicator.add(fingerprint, len(self.chunks))
+            self.chunks.append(doc_name, chunk_id, chunk, fingerprint)
+            new_chunks.append(chunk)
+        return new_chunks
+    
+    def _ingest(self, items: Iterable[Tuple[str, int, str]], verbose: bool = True) -> int:
+        """
+        去重、向量化并追加文本块，返回新增的向量数
+        耗时的向量化在锁外进行，不阻塞并发检索；已登记但尚未写入索引的文本块位于
+        chunks 末尾，检索返回的位置小于 index.ntotal，不会访问到它们
+        """
+        self._prepare_deduplicator()
+        with self.lock:
+            checkpoint = len(self.chunks)
+            merged = []
+            new_chunks = self._stage_chunks(items, merged)
+            self._version += 1
+            if not new_chunks:
+                return 0
+            # 已登记的文本块位于 chunks 末尾，压缩会改变它们的位置，写入索引前不压缩
+            self._pending_ingests += 1
+        
+        try:
+            if verbose:
+                if merged:
+                    print(f"去重: {len(merged)} 个文本块与已有内容重复，只记录来源")
+                print(f"正在向量化 {len(new_chunks)} 个文本块...")
+            try:
+                embeddings = self._encode_chunks(new_chunks, show_progress_bar=verbose)
+            except Exception:
+                # 向量化失败时撤销登记，保持文本块与索引位置一一对应
+                with self.lock:
+                    self._version += 1
+                    self.chunks.truncate(checkpoint)
+                    for position in reversed(merged):
+                        if position < checkpoint:
+                            self.chunks.pop_source(position)
+                    if self.deduplicator is not None:
+                        self.deduplicator.invalidate()
+                raise
+            
+            with self._write_lock:
+                self._load_mapped_index()
+                with self.lock:
+                    positions = np.arange(checkpoint, checkpoint + len(new_chunks))
+                    ids = self.chunks.ids(positions)
+                    created = self.index is None
+                    if created:
+                        self._set_index(*self._create_index(embeddings, ids))
+                    else:
+                        self._writable_index().add_with_ids(embeddings, ids)
+                        if self.vectors is not None:
+                            self.vectors.append(embeddings)
+                        self._version += 1
+                    self.lexical.add(ids, new_chunks)
+                    # 向量化期间已被删除的文本块不加入分片
+                    live = ~np.isin(positions, list(self.chunks.deleted))
+                # 分片在写锁内、索引锁外同步，不阻塞检索，与其他写入的顺序一致
+                if not created:
+                    self._update_shards('add', embeddings[live], ids[live])
+            if created:
+                self._sync_shards()
+        finally:
+            with self.lock:
+                self._pending_ingests -= 1
+        # 语料规模跨过阈值时切换索引类型或重新训练聚类中心
+        self._maybe_rebuild_index()
+        self._maybe_compact()
+        return len(new_chunks)
+    
+    def _prepare_deduplicator(self):
+        """
+        加载或压缩后失效的去重查找表在入库前重建：耗时与文本块数成正比，在锁外构建后替换，不阻塞检索；
+        期间位置有变化时留给登记文本块时在锁内重建
+        """
+        with self.lock:
+            if self.deduplicator is None or not self.deduplicator.stale:
+                return
+            version = self._version
+            frozen = self.chunks.freeze(len(self.chunks))
+        deduplicator = ChunkDeduplicator(self.deduplicator.max_distance, self.deduplicator.shingle_size)
+        deduplicator.rebuild(frozen.fingerprints())
+        with self.lock:
+            if self._version == version and self.deduplicator is not None:
+                self.deduplicator = deduplicator
+    
+    def _set_index(self, index: Optional[faiss.Index], vectors: Optional[FloatStore] = None,
+                   mapped_path: Optional[str] = None):
+        self.index = index
+        self.vectors = vectors
+        self._mapped_path = mapped_path
+        self._version += 1
+    
+    def _load_mapped_index(self):
+        """
+        内存映射的索引是只读的，第一次写入前在检索锁外复制到内存再替换，复制期间检索照常；
+        调用方须持有写锁，期间没有其他原地写入
+        """
+        with self.lock:
+            index = self.index
+            if index is None or self._mapped_path is None:
+                return
+        loaded = faiss.deserialize_index(faiss.serialize_index(index))
+        set_search_params(loaded, self.nprobe, self.ef_search)
+        with self.lock:
+            if self.index is index:
+                self._set_index(loaded, self.vectors)
+    
+    def _writable_index(self) -> faiss.Index:
+        """
+        返回可修改的索引
+        内存映射的索引是只读的（faiss对其写入会直接终止进程），修改前先复制到内存
+        """
+        if self._mapped_path is not None:
+            index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            set_search_params(index, self.nprobe, self.ef_search)
+            self._set_index(index, self.vectors)
+        return self.index
+    
+    def _reduction(self, n_vectors: int):
+        return reduction_spec(self.reduce_method if self.reduce_dim else None, self.reduce_dim,
+                              n_vectors, self.dim)
+    
+    def _create_index(self, embeddings: np.ndarray,
+                      ids: np.ndarray) -> Tuple[faiss.Index, Optional[FloatStore]]:
+        """
+        按配置的索引类型和向量数量创建索引，向量以文本块的ID加入；
+        压缩索引同时返回保存原始向量的 FloatStore
+        """
+        spec = index_spec(self.index_type, len(embeddings))
+        reduction = self._reduction(len(embeddings))
+        if spec[0] != 'flat' or reduction:
+            print(f"构建 {spec[0]} 索引" + (f" (nlist={spec[1]})" if spec[1] else "")
+                  + (f"，{reduction[0].upper()} 降维 {embeddings.shape[1]} -> {reduction[1]}" if reduction else "")
+                  + "...")
+        index = create_index(spec, embeddings, reduction=reduction, ids=ids)
+        set_search_params(index, self.nprobe, self.ef_search)
+        if spec[0] not in COMPRESSED_TYPES:
+            return index, None
+        self._report_compression(index)
+        return index, FloatStore(embeddings)
+    
+    def _report_compression(self, index: faiss.Index):
+        """输出压缩索引的内存占用"""
+        codes_mb = code_bytes(index) / 1024 / 1024
+        floats_mb = index.ntotal * index.d * 4 / 1024 / 1024
+        print(f"{current_spec(index)[0]} 索引编码占用 {codes_mb:.1f} MB（float32为 {floats_mb:.1f} MB），"
+              f"原始向量内存映射，只读取候选向量重排序")
+    
+    def _all_embeddings(self, index: faiss.Index, texts: Optional[List[str]]) -> np.ndarray:
+        """取出索引中全部向量，按位置排列；近似或降维的索引无法精确还原时按文本从向量缓存读取"""
+        if exact_vectors(index):
+            return stored_vectors(index)
+        return self._encode_chunks(texts, show_progress_bar=False)
+    
+    def _maybe_rebuild_index(self):
+        """
+        当前索引规格与配置不符（如语料增长跨过阈值）或是不按ID检索的旧版索引时，
+        从已有向量重建索引
+        """
+        with self.lock:
+            if self.index is None or self.index.ntotal == 0:
+                return
+            if (index_spec(self.index_type, self.index.ntotal) == current_spec(self.index)
+                    and self._reduction(self.index.ntotal) == current_reduction(self.index)
+                    and has_stable_ids(self.index)):
+                return
+            index = self.index
+            version = self._version
+            ids = self.chunks.ids(np.arange(index.ntotal))
+            # 可精确还原的索引在锁内取出向量，避免与并发写入交错
+            embeddings, texts = None, None
+            if self.vectors is not None:
+                embeddings = self.vectors.all()
+            elif exact_vectors(index):
+                embeddings = self._all_embeddings(index, None)
+            else:
+                texts = self.chunks.texts(range(index.ntotal))
+        if embeddings is None:
+            embeddings = self._all_embeddings(index, texts)
+        # 训练新索引较慢，在锁外进行，期间检索继续使用旧索引
+        new_index, vectors = self._create_index(embeddings, ids)
+        with self.lock:
+            # 期间有写入（包括原地追加向量）时放弃，下次写入后再检查
+            if self._version == version:
+                self._set_index(new_index, vectors)
+    
+    def build_index(self, documents: Dict[str, List[str]]):
+        """构建向量索引"""
+        print("构建向量索引...")
+        
+        with self._write_lock, self.lock:
+            self._set_index(None)
+            self.chunks = ChunkStore()
+            self.lexical = LexicalIndex()
+            if self.deduplicator is not None:
+                self.deduplicator.rebuild([])
+            # 分片中是旧的向量，建好索引后重新同步
+            self._shards_ready = False
+        
+        added = self._ingest(
+            (doc_name, i, chunk)
+            for doc_name, chunks in documents.items()
+            for i, chunk in enumerate(chunks)
+        )
+        
+        if not added:
+            print("没有文档内容可索引")
+            return
+        
+        print(f"索引构建完成，共 {self.index.ntotal} 个向量")
+    
+    def add_documents(self, documents: Dict[str, List[str]]):
+        """向已有索引追加文档，只向量化新增的文本块"""
+        added = self._ingest(
+            (doc_name, i, chunk)
+            for doc_name, chunks in documents.items()
+            for i, chunk in enumerate(chunks)
+        )
+        
+        if added:
+            print(f"索引已更新，共 {self.index.ntotal} 个向量")
+    
+    def add_chunk_stream(self, doc_name: str, chunks: Iterable[str],
+                         batch_size: int = 32) -> int:
+        """
+        流式追加单个文档：每凑满一批文本块就向量化并写入索引
+        与流式提取配合使用时，无需等待整个文档解析完成，也不保留已写入的文本块
+        返回该文档的文本块数
+        """
+        count = 0
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                self._add_batch(doc_name, batch, count)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._add_batch(doc_name, batch, count)
+            count += len(batch)
+        return count
+    
+    def _add_batch(self, doc_name: str, chunks: List[str], start_id: int):
+        """向量化一批文本块并追加到索引"""
+        self._ingest(((doc_name, start_id + i, chunk) for i, chunk in enumerate(chunks)),
+                     verbose=False)
+    
+    def remove_documents(self, doc_names: List[str]) -> int:
+        """
+        删除指定文档的全部文本块，返回删除的向量数
+        去重后被多个文档共享的向量只移除对应来源，仍有其他来源时保留；
+        向量只标记为已删除，检索时跳过，已删除的比例超过阈值后在后台压缩
+        """
+        with self._write_lock:
+            with self.lock:
+                positions = self.chunks.remove_documents(doc_names)
+                if not positions:
+                    return 0
+                self._version += 1
+                ids = self.chunks.ids(np.array(positions, dtype='int64'))
+                self.lexical.remove(ids)
+                if self.deduplicator is not None:
+                    # 已删除的行不再作为代表块，其余行的位置不变
+                    for position in positions:
+                        fingerprint = self.chunks.fingerprint(position)
+                        if fingerprint is not None:
+                            self.deduplicator.remove(fingerprint, position)
+            self._update_shards('remove', ids)
+        self._maybe_compact()
+        return len(positions)
+        
+    def remove_document(self, doc_name: str) -> int:
+        """删除单个文档的全部文本块，返回删除的向量数"""
+        return self.remove_documents([doc_name])
+    
+    def _maybe_compact(self):
+        """已删除的向量超过 compact_threshold 比例时，在后台线程中压缩"""
+        with self.lock:
+            if (not self.compact_threshold or self._compacting or self.index is None
+                    or self._pending_ingests
+                    or len(self.chunks.deleted) <= self.compact_threshold * len(self.chunks)):
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact_in_background, daemon=True).start()
+    
+    def _compact_in_background(self):
+        deferred = False
+        try:
+            # 压缩期间有写入时放弃本次结果，重试几次；有入库进行中时由入库完成后重新触发
+            for _ in range(3):
+                if self.compact() is not None:
+                    break
+                if self._pending_ingests:
+                    deferred = True
+                    break
+        except Exception as e:
+            print(f"压缩索引失败: {e}")
+        finally:
+            with self.lock:
+                self._compacting = False
+                # 入库在本线程退出前已完成时，它触发的压缩被跳过，在这里补上
+                retry = deferred and not self._pending_ingests
+        if retry:
+            self._maybe_compact()
+    
+    def compact(self) -> Optional[int]:
+        """
+        从索引和元数据中移除已删除的向量，其余向量的ID不变，返回移除的向量数
+        耗时的部分在锁外进行，期间检索照常；期间索引或元数据有变化，
+        或有已登记但尚未写入索引的文本块时，放弃并返回None
+        """
+        with self.lock:
+            if self.index is None or not self.chunks.deleted:
+                return 0
+            if self._pending_ingests:
+                return None
+            version = self._version
+            index = self.index
+            old_vectors = self.vectors
+            live = self.chunks.live_positions()
+            live_ids = self.chunks.ids(live)
+            deleted_ids = self.chunks.ids(np.array(sorted(self.chunks.deleted), dtype='int64'))
+            # HNSW不支持删除，用剩余向量重建
+            rebuild = len(live) > 0 and current_spec(index)[0] == 'hnsw'
+            texts = self.chunks.texts(live) if rebuild and not exact_vectors(index) else None
+        
+        # 复制索引在锁外进行，不阻塞检索；写锁防止复制期间有入库原地修改同一个索引
+        new_index, embeddings, vectors = None, None, None
+        with self._write_lock:
+            if self._version != version:
+                return None
+            if not len(live):
+                new_index = empty_index(index.d)
+            elif rebuild:
+                if texts is None:
+                    embeddings = stored_vectors(index, live)
+            else:
+                # 内存映射的索引复制后仍引用只读的映射，需经序列化复制到内存
+                new_index = faiss.deserialize_index(faiss.serialize_index(index))
+                if old_vectors is not None:
+                    # 原始向量仍从已映射的文件读取，下次保存时才写出压缩后的文件
+                    vectors = old_vectors.select(live)
+        
+        if rebuild:
+            if embeddings is None:
+                embeddings = self._encode_chunks(texts, show_progress_bar=False)
+            new_index = create_index(current_spec(index), embeddings,
+                                     reduction=current_reduction(index), ids=live_ids)
+        elif len(live):
+            # 其余向量保持原有顺序，与压缩后文本块的位置一一对应
+            new_index.remove_ids(faiss.IDSelectorBatch(deleted_ids))
+        set_search_params(new_index, self.nprobe, self.ef_search)
+        
+        with self.lock:
+            if self._version != version:
+                return None
+            removed = self.chunks.compact()
+            self._set_index(new_index, vectors)
+            if self.deduplicator is not None:
+                self.deduplicator.invalidate()
+        print(f"索引压缩完成，移除 {len(removed)} 个已删除的向量")
+        return len(removed)
+    
+    def search(self, query: str, top_k: int = 5, documents: Optional[List[str]] = None,
+               mode: str = "vector") -> List[Dict]:
+        """搜索相关文档块，documents 不为空时只在这些文档的文本块中检索，mode 为检索方式"""
+        return self.search_batch([query], top_k, documents, mode)[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = 5,
+                     documents: Optional[List[str]] = None,
+                     mode: str = "vector") -> List[List[Dict]]:
+        """
+        批量搜索：所有查询一次向量化、一次FAISS检索
+        返回与 queries 一一对应的结果列表，每项格式与 search 相同
+        documents 不为空时只在这些文档（包括去重时合并进来的来源）的文本块中检索
+        mode 为检索方式：vector 为向量检索，结果带 distance；lexical 为BM25关键词检索，
+        不运行embedding模型，结果带 score；hybrid 将两种检索的候选按倒数排名融合，结果带融合后的 score，
+        向量检索命中的结果还带 distance
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"不支持的检索方式: {mode}，可选: {', '.join(RETRIEVAL_MODES)}")
+        if not queries or self.index is None or self.index.ntotal == 0:
+            return [[] for _ in queries]
+        
+        # 向量化查询，纯关键词检索不需要
+        query_embeddings = self._encode_queries(queries) if mode != 'lexical' else None
+        k = top_k * HYBRID_CANDIDATES if mode == 'hybrid' else top_k
+        
+        # 搜索
+        results = []
+        with self.lock:
+            positions = None
+            if documents is not None:
+                positions = self.chunks.positions(documents)
+                # 已登记但尚未写入索引的文本块不参与检索
+                positions = positions[positions < self.index.ntotal]
+                if not len(positions):
+                    return [[] for _ in queries]
+            vector_hits = [[] for _ in queries]
+            if mode != 'lexical':
+                if positions is None:
+                    distances, indices = self._search_global(query_embeddings, k)
+                else:
+                    distances, indices = self._search_subset(query_embeddings, k, positions)
+                vector_hits = [[(int(idx), float(distance)) for distance, idx in zip(row_distances, row_indices)
+                                if 0 <= idx < len(self.chunks) and int(idx) not in self.chunks.deleted]
+                               for row_distances, row_indices in zip(distances, indices)]
+            # 只解码命中的前k行
+            for query, row_hits in zip(queries, vector_hits):
+                hits = []
+                if mode == 'vector':
+                    for idx, distance in row_hits:
+                        result = self.chunks.row(idx)
+                        result['distance'] = distance
+                        hits.append(result)
+                else:
+                    lexical_hits = self._search_lexical(query, k, positions)
+                    if mode == 'hybrid':
+                        vector_distances = dict(row_hits)
+                        lexical_hits = reciprocal_rank_fusion(
+                            [[idx for idx, _ in row_hits], [idx for idx, _ in lexical_hits]], top_k)
+                    for idx, score in lexical_hits:
+                        result = self.chunks.row(idx)
+                        result['score'] = score
+                        if mode == 'hybrid' and idx in vector_distances:
+                            result['distance'] = vector_distances[idx]
+                        hits.append(result)
+                results.append(hits)
+        
+        return results
+    
+    def _search_global(self, query_embeddings: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """在全部向量中检索，返回 (distances, 位置)；分片与当前索引一致时并行检索各分片"""
+        if self._shards_ready:
+            try:
+                distances, labels = self.shard_pool.search(query_embeddings, top_k)
+                return distances, self.chunks.positions_of(labels)
+            except RuntimeError as e:
+                print(f"分片检索失败，改用本进程的索引: {e}")
+                self._shards_ready = False
+                self._resync_shards_in_background()
+        return self._search_index(query_embeddings, top_k)
+    
+    def _search_lexical(self, query: str, top_k: int,
+                        positions: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """BM25检索，返回得分最高的 (位置, 得分)，跳过已删除的文本块，positions 可限定参与检索的位置"""
+        ids, scores = self.lexical.search(query)
+        found = self.chunks.positions_of(ids)
+        keep = found >= 0
+        if self.chunks.deleted:
+            keep &= ~np.isin(found, list(self.chunks.deleted))
+        if positions is not None:
+            keep &= np.isin(found, positions)
+        return list(zip(found[keep][:top_k].tolist(), scores[keep][:top_k].tolist()))
+    
+    def _live_params(self) -> Optional[faiss.SearchParameters]:
+        """跳过已删除向量的检索参数，按版本缓存；没有已删除的向量时返回None"""
+        if not self.chunks.deleted:
+            return None
+        if self._live_filter is None or self._live_filter[0] != self._version:
+            deleted_ids = self.chunks.ids(np.array(sorted(self.chunks.deleted), dtype='int64'))
+            selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(deleted_ids))
+            # 保留选择器的引用，检索参数只持有其指针
+            self._live_filter = (self._version, filter_params(self.index, selector), selector)
+        return self._live_filter[1]
+    
+    def _search_index(self, query_embeddings: np.ndarray, top_k: int,
+                      params: Optional[faiss.SearchParameters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        在索引中检索，返回 (distances, 位置)
+        params 可限定参与检索的向量，未指定时跳过已删除的向量
+        """
+        k = min(top_k, self.index.ntotal)
+        extra = 0
+        if params is None and self.chunks.deleted:
+            if current_spec(self.index)[0] == 'binary':
+                # 二值索引不支持ID选择器，多取候选后去掉已删除的
+                extra = len(self.chunks.deleted)
+            else:
+                params = self._live_params()
+        if self.vectors is None:
+            distances, labels = self.index.search(query_embeddings, k, params=params)
+            return distances, self.chunks.positions_of(labels)
+        # 压缩索引初筛出更多候选，再用原始向量计算精确距离
+        factor = self.rerank_factor or RERANK_FACTORS[current_spec(self.index)[0]]
+        _, labels = self.index.search(query_embeddings, min(top_k * factor + extra, self.index.ntotal),
+                                      params=params)
+        candidates = self.chunks.positions_of(labels)
+        if extra:
+            candidates[np.isin(candidates, list(self.chunks.deleted))] = -1
+        return rerank(query_embeddings, candidates, self.vectors, k)
+    
+    def _search_subset(self, query_embeddings: np.ndarray, top_k: int,
+                       positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """只在给定位置的向量中检索"""
+        exact = self.vectors is not None or exact_vectors(self.index)
+        # 二值索引不支持ID选择器，直接用原始向量
+        if exact and (len(positions) <= FLAT_MAX_VECTORS or current_spec(self.index)[0] == 'binary'):
+            # 子集不大时取出这些向量精确计算距离，耗时只与子集大小成正比
+            if self.vectors is not None:
+                vectors = self.vectors.get(positions)
+            else:
+                vectors = stored_vectors(self.index, positions)
+            distances, local = faiss.knn(query_embeddings, vectors, min(top_k, len(positions)))
+            return distances, positions[local]
+        # 否则在索引内部用ID选择器跳过其他文档的向量
+        selector = faiss.IDSelectorBatch(self.chunks.ids(positions))
+        return self._search_index(query_embeddings, top_k, filter_params(self.index, selector))
+    
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """批量向量化查询，缓存未命中的查询合并为一次模型调用"""
+        embeddings = [None] * len(queries)
+        if self.query_cache is not None:
+            for i, query in enumerate(queries):
+                cached = self.query_cache.get(query)
+                if cached is not None:
+                    embeddings[i] = cached[0]
+        
+        # 同一批中重复的查询只向量化一次
+        missing = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(normalize_query(queries[i]), []).append(i)
+        if missing:
+            texts = list(missing)
+            encoded = self.embedding_model.encode(
+                texts,
+                batch_size=self.encode_batch_size,
+                convert_to_numpy=True
+            ).astype('float32')
+            for text, embedding in zip(texts, encoded):
+                for i in missing[text]:
+                    embeddings[i] = embedding
+                if self.query_cache is not None:
+                    self.query_cache.put(text, embedding.reshape(1, -1).copy())
+        return np.ascontiguousarray(np.stack(embeddings), dtype='float32')
+    
+    def get_document_embedding(self, text: str) -> np.ndarray:
+        """获取文档的整体向量表示"""
+        embedding = self.embedding_model.encode(
+            [text],
+            convert_to_numpy=True
+        )
+        return embedding[0]
+    
+    def _metadata_dir(self, index_path: Path) -> Path:
+        return index_path.parent / f"{index_path.stem}_metadata"
+    
+    def _vectors_path(self, index_path: Path) -> Path:
+        return index_path.parent / f"{index_path.stem}_vectors.npy"
+    
+    def _lexical_dir(self, index_path: Path) -> Path:
+        return index_path.parent / f"{index_path.stem}_lexical"
+    
+    def _snapshot_root(self, index_path: Path) -> Path:
+        return index_path.parent / f"{index_path.stem}_snapshots"
+    
+    def current_snapshot(self, path: str) -> Optional[Path]:
+        """CURRENT 指针所指的快照目录，还没有快照时返回None"""
+        root = self._snapshot_root(Path(path))
+        try:
+            name = (root / "CURRENT").read_text(encoding='utf-8').strip()
+        except OSError:
+            return None
+        snapshot = root / name
+        return snapshot if name and (snapshot / "snapshot.json").exists() else None
+    
+    def has_index(self, path: str) -> bool:
+        """是否已有保存的索引（快照或旧版布局的索引文件）"""
+        return self.current_snapshot(path) is not None or Path(path).exists()
+    
+    def save_index(self, path: str):
+        """
+        保存索引快照：索引、原始向量和元数据写入新的版本目录 <名称>_snapshots/<版本>/，
+        连同记录版本信息的 snapshot.json 全部写完后，再原子地替换 CURRENT 指针。
+        中断或并发读取只会看到上一个或这一个完整快照，不会读到不匹配的索引和元数据。
+        写文件时只持有写锁（期间没有原地写入和删除），不阻塞检索
+        """
+        save_path = Path(path)
+        root = self._snapshot_root(save_path)
+        
+        with self._write_lock:
+            # 在索引锁内只取得各部分的引用，文本块元数据取前 ntotal 行的副本（不含已登记、尚未写入索引的行）
+            with self.lock:
+                index = self.index
+                if index is None:
+                    return
+                mapped_path = self._mapped_path
+                vectors = self.vectors
+                chunks = self.chunks
+                frozen = chunks.freeze(index.ntotal)
+                lexical = self.lexical
+                manifest = self.manifest
+            
+            root.mkdir(parents=True, exist_ok=True)
+            snapshot = _new_snapshot_dir(root)
+            index_path = snapshot / save_path.name
+            # 映射中的索引未被修改过，与上一个快照中的文件一致，直接硬链接
+            linked = mapped_path is not None and _link(mapped_path, index_path)
+            if not linked:
+                faiss.write_index(index, str(index_path))
+            saved_vectors = vectors.write(str(self._vectors_path(index_path))) if vectors is not None else None
+            frozen.save(str(self._metadata_dir(index_path)), extra={
+                'manifest': manifest,
+                'encoder': self.encoder_id
+            })
+            saved_lexical = lexical.write(str(self._lexical_dir(index_path)))
+            info = {
+                'version': snapshot.name,
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'index_type': current_spec(index)[0],
+                'vectors': index.ntotal,
+                'deleted': len(frozen.deleted),
+                'encoder': self.encoder_id
+            }
+            (snapshot / "snapshot.json").write_text(json.dumps(info, ensure_ascii=False), encoding='utf-8')
+            # 指针最后替换，之前的步骤中断时当前快照不受影响
+            tmp_pointer = root / "CURRENT.tmp"
+            tmp_pointer.write_text(snapshot.name, encoding='utf-8')
+            os.replace(tmp_pointer, root / "CURRENT")
+            
+            # 改为映射写出的文件；期间被压缩或重建替换掉的部分不再替换
+            with self.lock:
+                if self.index is index:
+                    if linked:
+                        self._mapped_path = str(index_path)
+                    else:
+                        # 写入过的索引保留在内存中，之后的增量写入无需再复制
+                        self._index_bytes = os.path.getsize(index_path)
+                if vectors is not None and self.vectors is vectors:
+                    self.vectors = saved_vectors
+                if self.chunks is chunks:
+                    chunks.adopt(frozen)
+                self.lexical = saved_lexical
+                self.snapshot = snapshot.name
+        
+        self._prune_snapshots(root, snapshot.name)
+        # 旧版布局（索引文件和元数据直接位于索引路径旁）及pickle元数据已被取代
+        for legacy_path in (save_path, self._vectors_path(save_path),
+                            save_path.parent / f"{save_path.stem}_metadata.pkl"):
+            try:
+                legacy_path.unlink()
+            except OSError:
+                pass
+        shutil.rmtree(self._metadata_dir(save_path), ignore_errors=True)
+    
+    def memory_usage(self) -> int:
+        """
+        估算本进程中索引占用的内存字节数：读入内存的索引按文件大小计，未映射的原始向量按实际大小计；
+        内存映射的文件由操作系统页缓存管理，可随时回收，不计入
+        """
+        with self.lock:
+            usage = self._index_bytes if self.index is not None and self._mapped_path is None else 0
+            if self.vectors is not None and self.vectors.path is None:
+                usage += self.vectors.nbytes
+            return usage
+    
+    def close(self):
+        """停止分片工作进程"""
+        if self.shard_pool is not None:
+            with self._write_lock, self.lock:
+                self._shards_ready = False
+                shard_pool, self.shard_pool = self.shard_pool, None
+            shard_pool.close()
+    
+    def _update_shards(self, method: str, *args):
+        """
+        把一次新增 ('add', 向量, ID) 或删除 ('remove', ID) 同步到所在的分片，调用方须持有写锁
+        有分片失败时检索改用本进程的索引，并在后台重新同步失败的分片
+        """
+        if self.shard_pool is None:
+            return
+        if not getattr(self.shard_pool, method)(*args) and self._shards_ready:
+            print("分片同步失败，检索暂时改用本进程的索引")
+            with self.lock:
+                self._shards_ready = False
+            self._resync_shards_in_background()
+    
+    def _resync_shards_in_background(self):
+        threading.Thread(target=self._sync_shards, kwargs={'failed_only': True}, daemon=True).start()
+    
+    def _sync_shards(self, failed_only: bool = False):
+        """
+        把索引中未删除的向量按ID写入各分片并重启分片进程，failed_only 为True时只同步未运行的分片
+        期间持有写锁，写入等待同步完成；向量分批读取，每批只短暂持有索引锁，检索使用本进程的索引
+        """
+        with self._write_lock:
+            if self.shard_pool is None:
+                return
+            with self.lock:
+                self._shards_ready = False
+                if self.index is None:
+                    return
+                live = self.chunks.live_positions()
+                # 已登记但尚未写入索引的文本块由入库完成后同步
+                ids = self.chunks.ids(live[live < self.index.ntotal])
+            shards = None
+            if failed_only:
+                shards = [shard for shard, alive in enumerate(self.shard_pool.alive()) if not alive]
+            ready = self.shard_pool.sync(ids, self._shard_vectors, shards)
+            with self.lock:
+                self._shards_ready = ready
+            if ready:
+                print(f"已同步 {len(shards) if shards is not None else self.shard_pool.num_shards} 个检索分片，"
+                      f"共 {len(ids)} 个向量")
+            else:
+                print("分片未能全部启动，检索使用本进程的索引")
+    
+    def _shard_vectors(self, ids: np.ndarray) -> Optional[np.ndarray]:
+        """
+        按ID读取一批文本块的原始向量：压缩索引从原始向量文件读取，flat/HNSW从索引中读取，
+        其他索引从向量缓存读取；无法读取时返回None，不重新向量化
+        """
+        with self.lock:
+            positions = self.chunks.positions_of(ids)
+            if self.vectors is not None:
+                return self.vectors.get(positions)
+            if exact_vectors(self.index):
+                return stored_vectors(self.index, positions)
+            if self.embedding_cache is not None:
+                keys = [chunk_key(text) for text in self.chunks.texts(positions)]
+                embeddings, missing = self.embedding_cache.get(keys)
+                if not missing:
+                    return embeddings
+            index_type = current_spec(self.index)[0]
+        print(f"{index_type} 索引无法还原原始向量，且向量缓存中没有全部文本块，不启用分片")
+        return None
+    
+    def _prune_snapshots(self, root: Path, current: str):
+        """
+        删除比当前快照旧、且不在保留数量内的快照，以及中断保存留下的不完整目录
+        比当前快照新或刚创建的不完整目录可能是其他进程正在写入的快照，不删除
+        """
+        older = sorted(p for p in root.iterdir() if p.is_dir() and p.name < current)
+        complete = [p for p in older if (p / "snapshot.json").exists()]
+        stale = [p for p in older if p not in complete and time.time() - p.stat().st_mtime > 3600]
+        for snapshot in complete[:max(len(complete) - (self.keep_snapshots - 1), 0)] + stale:
+            # 其他进程映射中的文件在部分系统上无法删除，留到下次保存时再试
+            shutil.rmtree(snapshot, ignore_errors=True)
+    
+    def reload_index(self, path: str) -> bool:
+        """
+        CURRENT 指向的快照比已加载的新时（如另一个进程重建了索引），加载并替换当前索引，返回是否已切换
+        新快照在锁外读入，只在锁内替换：进行中的检索在旧索引上完成，之后的检索使用新索引。
+        尚未保存的修改会被丢弃
+        """
+        snapshot = self.current_snapshot(path)
+        if snapshot is None or snapshot.name == self.snapshot:
+            return False
+        return self.load_index(path)
+    
+    def load_index(self, path: str):
+        """加载 CURRENT 所指的索引快照，元数据以内存映射方式打开"""
+        snapshot = self.current_snapshot(path)
+        # 没有快照时按旧版布局读取，下次保存时转换为快照
+        load_path = snapshot / Path(path).name if snapshot is not None else Path(path)
+        
+        if not load_path.exists():
+            return False
+        
+        loaded = ChunkStore.load(str(self._metadata_dir(load_path)))
+        if loaded is None:
+            if (load_path.parent / f"{load_path.stem}_metadata.pkl").exists():
+                # 不再反序列化pickle文件（可执行任意代码），需要重新构建索引
+                print("检测到旧版pickle元数据，出于安全考虑不再加载")
+            else:
+                print("索引元数据缺失或不完整")
+            return False
+        
+        # 启用分片时检索由分片负责，本进程的索引同样以内存映射方式打开
+        index, mapped = read_index(str(load_path), self.mmap_index or self.shard_pool is not None)
+        chunks, extra = loaded
+        # 没有记录编码器的索引由默认的fp32模型生成
+        if extra.get('encoder', self.model_name) != self.encoder_id:
+            print(f"索引由编码器 {extra.get('encoder', self.model_name)} 生成，"
+                  f"与当前编码器 {self.encoder_id} 不一致，需要重新构建")
+            return False
+        if index.ntotal != len(chunks):
+            print(f"索引向量数 {index.ntotal} 与元数据行数 {len(chunks)} 不一致")
+            return False
+        vectors = None
+        if current_spec(index)[0] in COMPRESSED_TYPES:
+            vectors = FloatStore.load(str(self._vectors_path(load_path)))
+            if vectors is None or len(vectors) != index.ntotal:
+                print("压缩索引的原始向量文件缺失或不完整")
+                return False
+            self._report_compression(index)
+        lexical = None
+        if self._lexical_dir(load_path).exists():
+            lexical = LexicalIndex.load(str(self._lexical_dir(load_path)))
+        if lexical is None:
+            # 旧版索引没有词法索引，用未删除的文本块重建
+            print("词法索引缺失，正在从文本块重建...")
+            live = chunks.live_positions()
+            lexical = LexicalIndex()
+            lexical.add(chunks.ids(live), chunks.texts(live))
+        
+        set_search_params(index, self.nprobe, self.ef_search)
+        with self._write_lock, self.lock:
+            self._set_index(index, vectors, str(load_path) if mapped else None)
+            self._index_bytes = os.path.getsize(load_path)
+            self.chunks = chunks
+            self.lexical = lexical
+            # 旧版索引没有文件清单，由调用方决定是否重建
+            self.manifest = extra.get('manifest')
+            self.snapshot = snapshot.name if snapshot is not None else None
+            # 去重查找表到第一次入库时才构建，启动时不逐行读取指纹
+            if self.deduplicator is not None:
+                self.deduplicator.invalidate()
+        # 索引类型配置变化时直接用已有向量重建，无需重新解析和向量化
+        self._maybe_rebuild_index()
+        self._sync_shards()
+        
+        return True
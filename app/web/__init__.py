@@ -1,2 +1,2 @@
-# Web界面模块
-
+# Web界面模块
+
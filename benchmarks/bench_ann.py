@@ -0,0 +1,151 @@
+"""
+近似最近邻索引基准测试
+以 IndexFlatL2 的精确结果为基准，比较 IVF-Flat、IVF-PQ、HNSW 在不同检索参数下，
+以及 sq8/binary 压缩索引在不同重排序倍数下、PCA/OPQ 降到不同维度后的 recall@k、单条查询延迟、
+构建耗时和常驻内存的索引大小，用于选择 --index-type / --nprobe / --ef-search / --rerank-factor / --reduce-dim
+
+用法: python -m benchmarks.bench_ann [--n 100000] [--dim 1024] [--k 10]
+      python -m benchmarks.bench_ann --from-cache .cache/embeddings/BAAI_bge-large-zh-v1.5_float32
+      python -m benchmarks.bench_ann --types --reduce-dims 64 128 256 512 --reduce-method opq
+"""
+import os
+import argparse
+import tempfile
+import time
+import numpy as np
+import faiss
+from pathlib import Path
+
+from app.core.embedding_cache import EmbeddingCache
+from app.core.float_store import FloatStore, rerank
+from app.core.index_factory import (COMPRESSED_TYPES, REDUCTION_METHODS, index_spec, reduction_spec,
+                                    create_index, set_search_params)
+
+
+def synthetic_vectors(n: int, dim: int, n_queries: int, seed: int = 0):
+    """生成带聚类结构的向量（比均匀随机向量更接近真实文本向量），查询不在库中"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 100, 1), dim)).astype('float32')
+    
+    def sample(count):
+        assign = rng.integers(0, len(centers), count)
+        return centers[assign] + 0.6 * rng.standard_normal((count, dim)).astype('float32')
+    
+    return sample(n), sample(n_queries)
+
+
+def cached_vectors(cache_dir: str, n_queries: int, seed: int = 0):
+    """从向量缓存目录读取真实文本块向量，随机留出一部分作为查询"""
+    path = Path(cache_dir)
+    name, _, dtype = path.name.rpartition('_')
+    cache = EmbeddingCache(str(path.parent), name, dtype=dtype)
+    if not len(cache):
+        raise ValueError(f"向量缓存为空: {cache_dir}")
+    vectors = np.asarray(cache._mapped(), dtype='float32')
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    return vectors[order[n_queries:]], vectors[order[:n_queries]]
+
+
+def measure(search, queries: np.ndarray, truth: np.ndarray, k: int):
+    """逐条查询（与线上检索一致），返回 recall@k、平均延迟和P95延迟（毫秒）"""
+    latencies = []
+    hits = 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(ids[0].tolist()) & set(truth[i].tolist()))
+    return hits / truth.size, float(np.mean(latencies)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='近似最近邻索引基准测试')
+    parser.add_argument('--n', type=int, default=100000, help='合成向量数量')
+    parser.add_argument('--dim', type=int, default=1024, help='合成向量维度（bge-large为1024）')
+    parser.add_argument('--from-cache', default=None, help='改用向量缓存目录中的真实向量')
+    parser.add_argument('--queries', type=int, default=200, help='查询数量')
+    parser.add_argument('--k', type=int, default=10, help='recall@k 的 k')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[16, 32, 64, 128])
+    parser.add_argument('--rerank-factor', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--types', nargs='*', default=['ivf', 'ivfpq', 'hnsw', 'sq8', 'binary'],
+                        choices=['ivf', 'ivfpq', 'hnsw', 'sq8', 'binary'])
+    parser.add_argument('--reduce-dims', type=int, nargs='*', default=[128, 256, 512],
+                        help='依次测试的降维目标维度')
+    parser.add_argument('--reduce-method', default='pca', choices=REDUCTION_METHODS)
+    parser.add_argument('--reduce-types', nargs='+', default=['flat', 'ivf'],
+                        choices=['flat', 'ivf', 'ivfpq', 'hnsw'], help='降维后测试的索引类型（使用默认检索参数）')
+    args = parser.parse_args()
+    
+    if args.from_cache:
+        base, queries = cached_vectors(args.from_cache, args.queries)
+    else:
+        base, queries = synthetic_vectors(args.n, args.dim, args.queries)
+    print(f"向量: {len(base)} x {base.shape[1]}，查询: {len(queries)}，k={args.k}")
+    print(f"auto 模式将选择: {index_spec('auto', len(base))}")
+    
+    start = time.perf_counter()
+    flat = create_index(('flat', 0), base)
+    flat_build = time.perf_counter() - start
+    _, truth = flat.search(queries, args.k)
+    
+    print(f"{'索引':<20}{'参数':<14}{'构建(s)':>10}{'大小(MB)':>10}"
+          f"{'recall@k':>10}{'平均(ms)':>10}{'P95(ms)':>10}")
+    
+    def report(label, params, index, build_time, search=None):
+        size_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+        recall, mean_ms, p95_ms = measure(search or index.search, queries, truth, args.k)
+        print(f"{label:<20}{params:<14}{build_time:>10.2f}{size_mb:>10.1f}"
+              f"{recall:>10.3f}{mean_ms:>10.3f}{p95_ms:>10.3f}")
+    
+    report('flat', '-', flat, flat_build)
+    for index_type in args.types:
+        spec = index_spec(index_type, len(base))
+        if spec[0] != index_type:
+            print(f"{index_type:<20}向量数量不足，跳过")
+            continue
+        start = time.perf_counter()
+        index = create_index(spec, base)
+        build_time = time.perf_counter() - start
+        label = f"{index_type} (nlist={spec[1]})" if spec[1] else index_type
+        if index_type == 'hnsw':
+            for ef in args.ef_search:
+                set_search_params(index, ef_search=ef)
+                report(label, f"efSearch={ef}", index, build_time)
+        elif index_type in COMPRESSED_TYPES:
+            # 原始向量与线上一致，保存为文件后内存映射读取（大小不计入索引）
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                vectors = FloatStore(base)
+                vectors.save(os.path.join(tmp_dir, 'vectors.npy'))
+                for factor in args.rerank_factor:
+                    def search(xq, k, factor=factor):
+                        _, candidates = index.search(xq, k * factor)
+                        return rerank(xq, candidates, vectors, k)
+                    report(label, f"rerank={factor}", index, build_time, search)
+                del vectors
+        else:
+            for nprobe in args.nprobe:
+                set_search_params(index, nprobe=nprobe)
+                report(label, f"nprobe={nprobe}", index, build_time)
+
+    for dim in args.reduce_dims:
+        reduction = reduction_spec(args.reduce_method, dim, len(base), base.shape[1])
+        if reduction is None:
+            print(f"{args.reduce_method}{dim:<17}维度不小于原始维度或向量数量不足，跳过")
+            continue
+        for index_type in args.reduce_types:
+            spec = index_spec(index_type, len(base))
+            if spec[0] != index_type:
+                print(f"{index_type:<20}向量数量不足，跳过")
+                continue
+            start = time.perf_counter()
+            index = create_index(spec, base, reduction=reduction)
+            build_time = time.perf_counter() - start
+            set_search_params(index)
+            label = f"{index_type}+{args.reduce_method}{dim}"
+            report(label, f"nprobe={faiss.extract_index_ivf(index).nprobe}" if spec[1] else '-', index, build_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+分块器基准测试
+比较按字符分块（DocumentProcessor.chunk_text）与按token分块（TokenChunker）的吞吐量，
+并统计超出模型最大输入长度（会被截断）的块所占比例
+
+用法: python -m benchmarks.bench_chunking [--pdf PATH] [--tokenizer NAME] [--scales 1 4 16]
+"""
+import argparse
+import time
+from typing import Callable, List
+
+from app.core.document_processor import DocumentProcessor
+from app.core.text_chunker import TokenChunker, load_tokenizer, default_max_tokens
+
+# 不含空白的中文样例文本，用于检查无空格文本的切分
+CJK_SAMPLE = ("深度算子网络由分支网络和主干网络组成分支网络编码输入函数在固定传感器位置的取值"
+              "主干网络编码输出函数的位置坐标两者的输出做内积得到算子在该位置的取值") * 400
+
+
+def _time_it(fn: Callable[[], List[str]], repeat: int):
+    """返回最快一次的耗时和结果"""
+    best, result = float('inf'), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_text(name: str, text: str, processor: DocumentProcessor, tokenizer,
+               max_tokens: int, repeat: int):
+    """对同一段文本运行两种分块器并打印结果"""
+    limit = max_tokens + tokenizer.num_special_tokens_to_add(pair=False)
+    size_mb = len(text.encode('utf-8')) / 1024 / 1024
+    
+    def run_token():
+        chunker = TokenChunker(tokenizer, max_tokens, 50)
+        chunks = chunker.feed(text)
+        chunks.extend(chunker.finish())
+        return chunks
+    
+    for label, fn in (('char', lambda: processor.chunk_text(text)), ('token', run_token)):
+        elapsed, chunks = _time_it(fn, repeat)
+        lengths = [len(ids) for ids in tokenizer(chunks, add_special_tokens=True)['input_ids']]
+        over = sum(1 for n in lengths if n > limit)
+        print(f"{name:<14}{label:<7}{size_mb:>8.2f}{elapsed:>10.3f}{size_mb / elapsed:>10.2f}"
+              f"{len(chunks):>8}{sum(lengths) / max(len(lengths), 1):>10.1f}{max(lengths, default=0):>8}"
+              f"{over / max(len(chunks), 1):>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分块器基准测试')
+    parser.add_argument('--pdf', default='documents/deeponet.pdf', help='用于提取样例文本的PDF')
+    parser.add_argument('--tokenizer', default='BAAI/bge-large-zh-v1.5', help='embedding模型的分词器')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16],
+                        help='将样例文本重复的倍数，用于观察耗时是否随文本长度线性增长')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+    
+    processor = DocumentProcessor(documents_dir="documents")
+    tokenizer = load_tokenizer(args.tokenizer)
+    max_tokens = default_max_tokens(tokenizer)
+    text = processor.extract_text_from_pdf(args.pdf)
+    
+    print(f"token上限: {max_tokens}（不含特殊token）")
+    print(f"{'文本':<14}{'分块器':<7}{'MB':>8}{'耗时(s)':>10}{'MB/s':>10}"
+          f"{'块数':>8}{'平均token':>10}{'最大':>8}{'超长比例':>10}")
+    for scale in args.scales:
+        bench_text(f"pdf x{scale}", "\n\n".join([text] * scale), processor, tokenizer,
+                   max_tokens, args.repeat)
+    bench_text("中文无空格", CJK_SAMPLE, processor, tokenizer, max_tokens, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
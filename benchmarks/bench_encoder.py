@@ -0,0 +1,110 @@
+"""
+编码器后端基准测试
+在本地文档的文本块上比较 torch (fp32)、torch-int8、onnx、onnx-int8 四种后端的
+加载耗时、内存占用、批量吞吐量、单条查询延迟，以及与fp32模型的向量余弦相似度和检索结果一致性
+
+用法: python -m benchmarks.bench_encoder [--documents-dir documents] [--max-chunks 512]
+      python -m benchmarks.bench_encoder --backends torch onnx-int8
+"""
+import os
+import time
+import random
+import argparse
+import numpy as np
+import faiss
+
+from app.core.document_processor import DocumentProcessor
+from app.core.encoder import ENCODER_BACKENDS, load_encoder
+
+
+def _rss_mb() -> float:
+    """当前进程常驻内存（Linux），其他平台返回0"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def load_corpus(documents_dir: str, max_chunks: int, n_queries: int, seed: int = 0):
+    """读取本地文档的文本块（命中提取缓存时无需重新解析），并以随机文本块的开头作为查询"""
+    processor = DocumentProcessor(documents_dir, cache_dir=".cache/extracted")
+    documents = processor.process_documents()
+    chunks = [chunk for doc_chunks in documents.values() for chunk in doc_chunks]
+    rng = random.Random(seed)
+    if len(chunks) > max_chunks:
+        chunks = rng.sample(chunks, max_chunks)
+    queries = [chunk[:80] for chunk in rng.sample(chunks, min(n_queries, len(chunks)))]
+    return chunks, queries
+
+
+def top_k(chunk_embeddings: np.ndarray, query_embeddings: np.ndarray, k: int) -> np.ndarray:
+    index = faiss.IndexFlatL2(chunk_embeddings.shape[1])
+    index.add(chunk_embeddings)
+    return index.search(query_embeddings, k)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='编码器后端基准测试')
+    parser.add_argument('--model', default='BAAI/bge-large-zh-v1.5', help='embedding模型')
+    parser.add_argument('--backends', nargs='+', default=list(ENCODER_BACKENDS),
+                        choices=ENCODER_BACKENDS)
+    parser.add_argument('--documents-dir', default='documents', help='用于取样文本块的文档目录')
+    parser.add_argument('--max-chunks', type=int, default=512, help='参与测试的文本块数量上限')
+    parser.add_argument('--queries', type=int, default=50, help='查询数量')
+    parser.add_argument('--k', type=int, default=5, help='检索一致性的 top-k')
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    
+    chunks, queries = load_corpus(args.documents_dir, args.max_chunks, args.queries)
+    if not chunks:
+        print("文档目录中没有可用的文本块")
+        return
+    print(f"文本块: {len(chunks)}，查询: {len(queries)}，k={args.k}")
+    
+    # fp32 模型作为一致性基准，始终最先运行
+    backends = ['torch'] + [b for b in args.backends if b != 'torch']
+    baseline = None
+    print(f"{'后端':<12}{'加载(s)':>9}{'内存(MB)':>10}{'吞吐(块/s)':>12}{'查询平均(ms)':>14}"
+          f"{'查询P95(ms)':>13}{'余弦相似度':>12}{'top-k重合':>11}{'top-1一致':>11}")
+    for backend in backends:
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        model, actual = load_encoder(args.model, backend)
+        load_s = time.perf_counter() - start
+        if actual != backend:
+            print(f"{backend:<12}不可用，跳过")
+            continue
+        model.encode(chunks[:args.batch_size], batch_size=args.batch_size)  # 预热
+        
+        start = time.perf_counter()
+        chunk_emb = model.encode(chunks, batch_size=args.batch_size,
+                                 convert_to_numpy=True).astype('float32')
+        throughput = len(chunks) / (time.perf_counter() - start)
+        rss_mb = _rss_mb() - rss_before
+        
+        latencies = []
+        query_emb = []
+        for query in queries:
+            start = time.perf_counter()
+            query_emb.append(model.encode([query], convert_to_numpy=True)[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_emb = np.array(query_emb, dtype='float32')
+        ids = top_k(chunk_emb, query_emb, args.k)
+        
+        if baseline is None:
+            baseline = (chunk_emb, ids)
+            cosine, overlap, top1 = 1.0, 1.0, 1.0
+        else:
+            base_emb, base_ids = baseline
+            cosine = float(np.mean(np.sum(chunk_emb * base_emb, axis=1) / (
+                np.linalg.norm(chunk_emb, axis=1) * np.linalg.norm(base_emb, axis=1))))
+            overlap = float(np.mean([len(set(a) & set(b)) / args.k for a, b in zip(ids, base_ids)]))
+            top1 = float(np.mean(ids[:, 0] == base_ids[:, 0]))
+        print(f"{backend:<12}{load_s:>9.1f}{rss_mb:>10.0f}{throughput:>12.1f}{np.mean(latencies):>14.1f}"
+              f"{np.percentile(latencies, 95):>13.1f}{cosine:>12.4f}{overlap:>11.3f}{top1:>11.3f}")
+        del model
+
+
+if __name__ == '__main__':
+    main()
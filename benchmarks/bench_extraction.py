@@ -0,0 +1,75 @@
+"""
+PDF文本提取后端基准测试
+比较各后端的提取速度（页/秒）和相对pdfplumber的文本保真度
+快速后端的回退页数单独列出，保真度以pdfplumber的输出为参考
+
+用法: python -m benchmarks.bench_extraction [PDF路径...] [--repeat N]
+"""
+import argparse
+import difflib
+import time
+from collections import Counter
+from typing import List
+
+from app.core.document_processor import DocumentProcessor
+
+
+def _sequence_fidelity(reference: str, text: str) -> float:
+    """词序列相似度，同时反映内容和阅读顺序（1.0 表示与参考文本一致）"""
+    return difflib.SequenceMatcher(None, reference.split(), text.split(), autojunk=False).ratio()
+
+
+def _bag_fidelity(reference: str, text: str) -> float:
+    """词袋F1，只比较内容、不考虑顺序（1.0 表示词频完全一致）"""
+    ref_words, words = Counter(reference.split()), Counter(text.split())
+    overlap = sum((ref_words & words).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(words.values())
+    recall = overlap / sum(ref_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def bench_file(pdf_path: str, repeat: int = 3):
+    """对单个PDF运行所有后端并打印结果"""
+    print(f"\n文件: {pdf_path}")
+    print(f"{'后端':<12}{'页数':>6}{'耗时(s)':>10}{'页/秒':>10}{'回退页':>8}{'词序相似':>10}{'词袋F1':>10}")
+    
+    reference = None
+    for backend in DocumentProcessor.BACKENDS:
+        processor = DocumentProcessor(documents_dir="documents", extraction_backend=backend)
+        best = float('inf')
+        pages: List[str] = []
+        sources = Counter()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if backend == 'pypdf':
+                results = list(processor._iter_pages_pypdf(pdf_path))
+                pages = [text for text, _ in results]
+                sources = Counter(source for _, source in results)
+            else:
+                pages = list(processor.iter_pages(pdf_path))
+            best = min(best, time.perf_counter() - start)
+        
+        text = "\n".join(pages)
+        if reference is None:
+            reference = text
+        page_count = processor._count_pages(pdf_path)
+        print(f"{backend:<12}{page_count:>6}{best:>10.3f}{page_count / best:>10.1f}"
+              f"{sources.get('pdfplumber', 0):>8}{_sequence_fidelity(reference, text):>10.3f}"
+              f"{_bag_fidelity(reference, text):>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF文本提取后端基准测试')
+    parser.add_argument('pdfs', nargs='*', default=['documents/deeponet.pdf'],
+                        help='要测试的PDF文件 (默认: documents/deeponet.pdf)')
+    parser.add_argument('--repeat', type=int, default=3, help='每个后端重复次数，取最快一次')
+    args = parser.parse_args()
+    
+    for pdf_path in args.pdfs:
+        bench_file(pdf_path, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
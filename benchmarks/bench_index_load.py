@@ -0,0 +1,130 @@
+"""
+索引加载方式基准测试
+比较 faiss.read_index 完整读入与 IO_FLAG_MMAP_IFC 内存映射两种方式的加载耗时、常驻内存，
+以及页缓存为冷/热时的首次查询延迟。每项测量在独立子进程中进行，模拟服务重启
+
+用法: python -m benchmarks.bench_index_load [--n 200000] [--dim 1024] [--type flat]
+      python -m benchmarks.bench_index_load --index .cache/vector_index.faiss
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+import numpy as np
+import faiss
+
+from app.core.index_factory import create_index, index_spec, set_search_params, read_index
+
+
+def _rss_mb() -> float:
+    """当前进程常驻内存（Linux），其他平台返回0"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def drop_page_cache(path: str) -> bool:
+    """请求内核丢弃文件在页缓存中的内容（无需root），不支持时返回False"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def child(path: str, mode: str, queries: int, k: int):
+    """子进程：加载索引并测量首次及后续查询延迟，结果以JSON输出"""
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    index, _ = read_index(path, mmap=(mode == 'mmap'))
+    load_s = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+    set_search_params(index)
+    
+    rng = np.random.default_rng(0)
+    xq = rng.standard_normal((queries + 1, index.d)).astype('float32')
+    start = time.perf_counter()
+    index.search(xq[:1], k)
+    first_ms = (time.perf_counter() - start) * 1000
+    latencies = []
+    for i in range(1, queries + 1):
+        start = time.perf_counter()
+        index.search(xq[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(json.dumps({
+        'load_s': load_s,
+        'rss_load_mb': rss_loaded - rss_before,
+        'rss_after_mb': _rss_mb() - rss_before,
+        'first_ms': first_ms,
+        'median_ms': float(np.median(latencies)),
+    }))
+
+
+def run_child(path: str, mode: str, queries: int, k: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_index_load', '--child', mode,
+         '--index', path, '--queries', str(queries), '--k', str(k)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='索引加载方式基准测试')
+    parser.add_argument('--index', default=None, help='已有索引文件，不指定时生成合成索引')
+    parser.add_argument('--n', type=int, default=200000, help='合成索引的向量数量')
+    parser.add_argument('--dim', type=int, default=1024, help='合成索引的向量维度')
+    parser.add_argument('--type', default='flat', choices=['flat', 'ivf', 'ivfpq', 'hnsw'],
+                        help='合成索引的类型')
+    parser.add_argument('--queries', type=int, default=20, help='首次查询之后再测量的查询数')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--child', choices=['read', 'mmap'], default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        child(args.index, args.child, args.queries, args.k)
+        return
+    
+    tmp_dir = None
+    path = args.index
+    if path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, 'bench.faiss')
+        print(f"生成合成索引: {args.n} x {args.dim} ({args.type})...")
+        vectors = np.random.default_rng(1).standard_normal((args.n, args.dim)).astype('float32')
+        faiss.write_index(create_index(index_spec(args.type, args.n), vectors), path)
+        del vectors
+    
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    print(f"索引文件: {path} ({size_mb:.1f} MB)")
+    print(f"{'加载方式':<8}{'页缓存':<6}{'加载(s)':>10}{'加载后内存(MB)':>16}{'查询后内存(MB)':>16}"
+          f"{'首次查询(ms)':>14}{'后续中位数(ms)':>16}")
+    for mode in ('read', 'mmap'):
+        for cache in ('cold', 'warm'):
+            if cache == 'cold' and not drop_page_cache(path):
+                print(f"{mode:<8}{cache:<6}  当前平台无法清除页缓存，跳过")
+                continue
+            if cache == 'warm':
+                # 先完整读一遍文件，确保页缓存为热
+                with open(path, 'rb') as f:
+                    while f.read(1 << 24):
+                        pass
+            r = run_child(path, mode, args.queries, args.k)
+            print(f"{mode:<8}{cache:<6}{r['load_s']:>10.3f}{r['rss_load_mb']:>16.1f}{r['rss_after_mb']:>16.1f}"
+                  f"{r['first_ms']:>14.2f}{r['median_ms']:>16.2f}")
+    
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+多进程向量化基准测试
+在本地文档的文本块上比较不同进程数和批大小下构建索引时的向量化吞吐量，
+并对比文本块按长度排序与原始顺序（单进程）的差异
+
+用法: python -m benchmarks.bench_parallel_encode [--workers 1 2 4 8] [--batch-sizes 32 64]
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+from app.core.encoder import ENCODER_BACKENDS, load_encoder, encode_parallel
+from benchmarks.bench_encoder import load_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程向量化基准测试')
+    parser.add_argument('--model', default='BAAI/bge-large-zh-v1.5', help='embedding模型')
+    parser.add_argument('--encoder', default='torch', choices=ENCODER_BACKENDS, help='编码器后端')
+    parser.add_argument('--documents-dir', default='documents', help='用于取样文本块的文档目录')
+    parser.add_argument('--max-chunks', type=int, default=4096, help='参与测试的文本块数量上限')
+    cpus = os.cpu_count() or 1
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, max(1, cpus // 4), max(1, cpus // 2), cpus}),
+                        help='依次测试的进程数')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32, 64], help='依次测试的批大小')
+    args = parser.parse_args()
+    
+    chunks, _ = load_corpus(args.documents_dir, args.max_chunks, 0)
+    if not chunks:
+        print("文档目录中没有可用的文本块")
+        return
+    print(f"文本块: {len(chunks)}，平均长度: {np.mean([len(c) for c in chunks]):.0f} 字符，CPU核心: {cpus}")
+    
+    model, backend = load_encoder(args.model, args.encoder)
+    baseline = None
+    print(f"{'进程数':>6}{'批大小':>8}{'耗时(s)':>10}{'吞吐(块/s)':>12}{'加速比':>8}{'最大误差':>10}")
+    for batch_size in args.batch_sizes:
+        for workers in args.workers:
+            start = time.perf_counter()
+            if workers == 1:
+                embeddings = model.encode(chunks, batch_size=batch_size,
+                                          convert_to_numpy=True).astype('float32')
+            else:
+                # 包含工作进程启动和加载模型的时间，与构建索引时的实际耗时一致
+                embeddings = encode_parallel(args.model, backend, chunks, workers, batch_size,
+                                             show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = (embeddings, elapsed)
+            error = float(np.max(np.abs(embeddings - baseline[0])))
+            print(f"{workers:>6}{batch_size:>8}{elapsed:>10.1f}{len(chunks) / elapsed:>12.1f}"
+                  f"{baseline[1] / elapsed:>8.2f}{error:>10.2e}")
+
+
+if __name__ == '__main__':
+    main()
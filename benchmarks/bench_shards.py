@@ -0,0 +1,67 @@
+"""
+分片检索基准测试
+在合成向量上比较单进程flat索引与不同分片数的多进程并行检索：单条查询延迟、批量查询吞吐量，
+并检查合并后的结果与单个flat索引是否完全一致
+
+用法: python -m benchmarks.bench_shards [--n 200000] [--dim 1024] [--shards 2 4]
+"""
+import time
+import argparse
+import tempfile
+import numpy as np
+import faiss
+
+from app.core.shard_search import ShardPool
+
+
+def measure(search, queries: np.ndarray, k: int, batch_size: int):
+    """返回 (单条查询延迟中位数ms, 批量吞吐量 查询/秒, 全部结果)"""
+    latencies = []
+    for query in queries[:50]:
+        start = time.perf_counter()
+        search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    results = [search(queries[i:i + batch_size], k) for i in range(0, len(queries), batch_size)]
+    qps = len(queries) / (time.perf_counter() - start)
+    distances = np.concatenate([r[0] for r in results])
+    ids = np.concatenate([r[1] for r in results])
+    return float(np.median(latencies)), qps, (distances, ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分片检索基准测试')
+    parser.add_argument('--n', type=int, default=200000, help='向量数量')
+    parser.add_argument('--dim', type=int, default=1024, help='向量维度')
+    parser.add_argument('--queries', type=int, default=500, help='查询数量')
+    parser.add_argument('--batch-size', type=int, default=32, help='批量查询的批大小')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--shards', type=int, nargs='+', default=[2, 4], help='要测试的分片数')
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    print(f"生成合成向量: {args.n} x {args.dim}...")
+    vectors = rng.standard_normal((args.n, args.dim)).astype('float32')
+    queries = rng.standard_normal((args.queries, args.dim)).astype('float32')
+    ids = np.arange(args.n, dtype='int64')
+    
+    index = faiss.IndexFlatL2(args.dim)
+    index.add(vectors)
+    print(f"{'方式':<10}{'启动(s)':>9}{'单条延迟(ms)':>14}{'吞吐(查询/s)':>14}{'结果一致':>10}")
+    latency, qps, baseline = measure(index.search, queries, args.k, args.batch_size)
+    print(f"{'单进程':<10}{0:>9.1f}{latency:>14.2f}{qps:>14.1f}{'-':>10}")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_shards in args.shards:
+            pool = ShardPool(num_shards, tmp_dir, args.dim)
+            start = time.perf_counter()
+            pool.sync(ids, lambda block: vectors[block])
+            start_s = time.perf_counter() - start
+            latency, qps, result = measure(pool.search, queries, args.k, args.batch_size)
+            same = np.array_equal(result[1], baseline[1]) and np.array_equal(result[0], baseline[0])
+            print(f"{f'{num_shards}分片':<10}{start_s:>9.1f}{latency:>14.2f}{qps:>14.1f}{str(same):>10}")
+            pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,190 +1,322 @@
-"""
-个人科研助手主程序
-支持命令行和Web两种模式
-"""
-import argparse
-import sys
-from pathlib import Path
-from app.core.research_assistant import ResearchAssistant
-from app.api.routes import create_app
-
-
-def cli_mode(assistant: ResearchAssistant):
-    """命令行交互模式"""
-    print("\n" + "="*60)
-    print("🔬 个人科研助手 - 命令行模式")
-    print("="*60)
-    print("\n可用命令：")
-    print("  ask <问题>        - 询问文档相关问题")
-    print("  similarity        - 分析文档相似性")
-    print("  recommend         - 获取研究推荐")
-    print("  web <URL>         - 抓取并总结网页内容")
-    print("  list              - 列出所有文档")
-    print("  list-web          - 列出已抓取的网页")
-    print("  help              - 显示帮助")
-    print("  quit/exit         - 退出程序")
-    print("\n" + "-"*60 + "\n")
-    
-    while True:
-        try:
-            user_input = input("科研助手> ").strip()
-            
-            if not user_input:
-                continue
-            
-            if user_input.lower() in ['quit', 'exit', 'q']:
-                print("再见！")
-                break
-            
-            if user_input.lower() == 'help':
-                print("\n可用命令：")
-                print("  ask <问题>        - 询问文档相关问题")
-                print("  similarity        - 分析文档相似性")
-                print("  recommend         - 获取研究推荐")
-                print("  web <URL>         - 抓取并总结网页内容")
-                print("  list              - 列出所有文档")
-                print("  list-web          - 列出已抓取的网页")
-                print("  quit/exit         - 退出程序\n")
-                continue
-            
-            if user_input.lower() == 'list':
-                docs = assistant.get_document_list()
-                if docs:
-                    print("\n已加载的文档：")
-                    for i, doc in enumerate(docs, 1):
-                        print(f"  {i}. {doc}")
-                else:
-                    print("\n暂无文档")
-                print()
-                continue
-            
-            if user_input.lower() == 'list-web':
-                web_contents = assistant.get_web_contents_list()
-                if web_contents:
-                    print("\n已抓取的网页：")
-                    for i, content in enumerate(web_contents, 1):
-                        print(f"  {i}. {content}")
-                else:
-                    print("\n暂无网页内容")
-                print()
-                continue
-            
-            if user_input.lower().startswith('web '):
-                url = user_input[4:].strip()
-                if url:
-                    print(f"\n正在抓取并总结网页: {url}")
-                    summary = assistant.summarize_web_content(url)
-                    print("\n总结结果：")
-                    print("-" * 60)
-                    print(summary)
-                    print("-" * 60 + "\n")
-                else:
-                    print("请输入URL")
-                continue
-            
-            if user_input.lower() == 'similarity':
-                print("\n正在分析文档相似性...")
-                result = assistant.analyze_similarity()
-                print("\n分析结果：")
-                print("-" * 60)
-                print(result)
-                print("-" * 60 + "\n")
-                continue
-            
-            if user_input.lower() == 'recommend':
-                print("\n正在生成研究推荐...")
-                result = assistant.recommend_research()
-                print("\n推荐结果：")
-                print("-" * 60)
-                print(result)
-                print("-" * 60 + "\n")
-                continue
-            
-            if user_input.lower().startswith('ask '):
-                question = user_input[4:].strip()
-                if question:
-                    print("\n正在思考...")
-                    answer = assistant.ask(question)
-                    print("\n回答：")
-                    print("-" * 60)
-                    print(answer)
-                    print("-" * 60 + "\n")
-                else:
-                    print("请输入问题")
-                continue
-            
-            # 默认作为问题处理
-            print("\n正在思考...")
-            answer = assistant.ask(user_input)
-            print("\n回答：")
-            print("-" * 60)
-            print(answer)
-            print("-" * 60 + "\n")
-            
-        except KeyboardInterrupt:
-            print("\n\n再见！")
-            break
-        except Exception as e:
-            print(f"\n错误: {e}\n")
-
-
-def web_mode(assistant: ResearchAssistant):
-    """Web界面模式"""
-    app = create_app(assistant)
-    
-    @app.route('/')
-    def index():
-        from flask import send_from_directory
-        return send_from_directory('app/web/templates', 'index.html')
-    
-    print("\n" + "="*60)
-    print("🔬 个人科研助手 - Web模式")
-    print("="*60)
-    print("\n服务器启动中...")
-    print("访问地址: http://localhost:5000")
-    print("按 Ctrl+C 停止服务器\n")
-    
-    app.run(host='0.0.0.0', port=5000, debug=False)
-
-
-def main():
-    """主函数"""
-    parser = argparse.ArgumentParser(description='个人科研助手')
-    parser.add_argument('--mode', choices=['cli', 'web'], default='cli',
-                       help='运行模式: cli (命令行) 或 web (网页)')
-    parser.add_argument('--documents-dir', default='documents',
-                       help='PDF文档目录 (默认: documents)')
-    parser.add_argument('--rebuild-index', action='store_true',
-                       help='重建向量索引')
-    parser.add_argument('--no-quantization', action='store_true',
-                       help='禁用模型量化（需要更多显存）')
-    
-    args = parser.parse_args()
-    
-    # 检查文档目录
-    documents_dir = Path(args.documents_dir)
-    if not documents_dir.exists():
-        documents_dir.mkdir(parents=True)
-        print(f"创建文档目录: {documents_dir}")
-        print(f"请将PDF文件放入 {documents_dir} 目录")
-    
-    # 初始化助手
-    print("初始化科研助手...")
-    assistant = ResearchAssistant(
-        documents_dir=str(documents_dir),
-        use_quantization=not args.no_quantization
-    )
-    
-    # 初始化（处理文档和构建索引）
-    assistant.initialize(rebuild_index=args.rebuild_index)
-    
-    # 运行对应模式
-    if args.mode == 'web':
-        web_mode(assistant)
-    else:
-        cli_mode(assistant)
-
-
-if __name__ == '__main__':
-    main()
-
+"""
+个人科研助手主程序
+支持命令行和Web两种模式
+"""
+import argparse
+import sys
+from pathlib import Path
+from app.core.research_assistant import ResearchAssistant
+from app.core.collection_manager import CollectionManager, DEFAULT_COLLECTION
+from app.api.routes import create_app
+
+
+def cli_mode(collections: CollectionManager, collection: str = DEFAULT_COLLECTION):
+    """命令行交互模式，collection 为初始使用的文档集合"""
+    print("\n" + "="*60)
+    print("🔬 个人科研助手 - 命令行模式")
+    print("="*60)
+    print("\n可用命令：")
+    print("  ask <问题>        - 询问文档相关问题")
+    print("  similarity        - 分析文档相似性")
+    print("  recommend         - 获取研究推荐")
+    print("  web <URL>         - 抓取并总结网页内容")
+    print("  list              - 列出所有文档")
+    print("  list-web          - 列出已抓取的网页")
+    print("  update            - 增量更新文档索引")
+    print("  reload            - 加载其他进程保存的最新索引快照")
+    print("  collections       - 列出文档集合")
+    print("  use <集合名>      - 切换到指定文档集合")
+    print("  help              - 显示帮助")
+    print("  quit/exit         - 退出程序")
+    print("\n" + "-"*60 + "\n")
+    
+    while True:
+        try:
+            prompt = "科研助手> " if collection == DEFAULT_COLLECTION else f"科研助手[{collection}]> "
+            user_input = input(prompt).strip()
+            
+            if not user_input:
+                continue
+            
+            if user_input.lower() in ['quit', 'exit', 'q']:
+                print("再见！")
+                break
+            
+            if user_input.lower() == 'help':
+                print("\n可用命令：")
+                print("  ask <问题>        - 询问文档相关问题")
+                print("  similarity        - 分析文档相似性")
+                print("  recommend         - 获取研究推荐")
+                print("  web <URL>         - 抓取并总结网页内容")
+                print("  list              - 列出所有文档")
+                print("  list-web          - 列出已抓取的网页")
+                print("  update            - 增量更新文档索引")
+                print("  reload            - 加载其他进程保存的最新索引快照")
+                print("  collections       - 列出文档集合")
+                print("  use <集合名>      - 切换到指定文档集合")
+                print("  quit/exit         - 退出程序\n")
+                continue
+            
+            if user_input.lower() == 'collections':
+                print("\n文档集合：")
+                for item in collections.stats():
+                    current = "*" if item['name'] == collection else " "
+                    state = (f"已加载，文档 {item['document_count']}，约 {item['memory_mb']} MB"
+                             if item['loaded'] else "未加载")
+                    print(f" {current} {item['name']} ({state})")
+                print()
+                continue
+            
+            if user_input.lower().startswith('use '):
+                name = user_input[4:].strip()
+                if collections.get(name) is None:
+                    print(f"\n文档集合不存在: {name}\n")
+                else:
+                    collection = name
+                    print(f"\n已切换到文档集合: {name}\n")
+                continue
+            
+            # 每条命令重新取得集合：集合可能因内存预算被卸载，此时重新加载
+            assistant = collections.get(collection)
+            
+            if user_input.lower() == 'list':
+                docs = assistant.get_document_list()
+                if docs:
+                    print("\n已加载的文档：")
+                    for i, doc in enumerate(docs, 1):
+                        print(f"  {i}. {doc}")
+                else:
+                    print("\n暂无文档")
+                print()
+                continue
+            
+            if user_input.lower() == 'list-web':
+                web_contents = assistant.get_web_contents_list()
+                if web_contents:
+                    print("\n已抓取的网页：")
+                    for i, content in enumerate(web_contents, 1):
+                        print(f"  {i}. {content}")
+                else:
+                    print("\n暂无网页内容")
+                print()
+                continue
+            
+            if user_input.lower() == 'update':
+                print("\n正在检查文档变化...")
+                changes = assistant.update_index()
+                print(f"新增 {len(changes['added'])}，修改 {len(changes['modified'])}，"
+                      f"删除 {len(changes['deleted'])}\n")
+                continue
+            
+            if user_input.lower() == 'reload':
+                if not assistant.reload_index():
+                    print("\n已是最新的索引快照\n")
+                continue
+            
+            if user_input.lower().startswith('web '):
+                url = user_input[4:].strip()
+                if url:
+                    print(f"\n正在抓取并总结网页: {url}")
+                    summary = assistant.summarize_web_content(url)
+                    print("\n总结结果：")
+                    print("-" * 60)
+                    print(summary)
+                    print("-" * 60 + "\n")
+                else:
+                    print("请输入URL")
+                continue
+            
+            if user_input.lower() == 'similarity':
+                print("\n正在分析文档相似性...")
+                result = assistant.analyze_similarity()
+                print("\n分析结果：")
+                print("-" * 60)
+                print(result)
+                print("-" * 60 + "\n")
+                continue
+            
+            if user_input.lower() == 'recommend':
+                print("\n正在生成研究推荐...")
+                result = assistant.recommend_research()
+                print("\n推荐结果：")
+                print("-" * 60)
+                print(result)
+                print("-" * 60 + "\n")
+                continue
+            
+            if user_input.lower().startswith('ask '):
+                question = user_input[4:].strip()
+                if question:
+                    print("\n正在思考...")
+                    answer = assistant.ask(question)
+                    print("\n回答：")
+                    print("-" * 60)
+                    print(answer)
+                    print("-" * 60 + "\n")
+                else:
+                    print("请输入问题")
+                continue
+            
+            # 默认作为问题处理
+            print("\n正在思考...")
+            answer = assistant.ask(user_input)
+            print("\n回答：")
+            print("-" * 60)
+            print(answer)
+            print("-" * 60 + "\n")
+            
+        except KeyboardInterrupt:
+            print("\n\n再见！")
+            break
+        except Exception as e:
+            print(f"\n错误: {e}\n")
+
+
+def web_mode(collections: CollectionManager):
+    """Web界面模式"""
+    app = create_app(collections.default, collections)
+    
+    @app.route('/')
+    def index():
+        from flask import send_from_directory
+        return send_from_directory('app/web/templates', 'index.html')
+    
+    print("\n" + "="*60)
+    print("🔬 个人科研助手 - Web模式")
+    print("="*60)
+    print("\n服务器启动中...")
+    print("访问地址: http://localhost:5000")
+    print("按 Ctrl+C 停止服务器\n")
+    
+    app.run(host='0.0.0.0', port=5000, debug=False)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='个人科研助手')
+    parser.add_argument('--mode', choices=['cli', 'web'], default='cli',
+                       help='运行模式: cli (命令行) 或 web (网页)')
+    parser.add_argument('--documents-dir', default='documents',
+                       help='PDF文档目录 (默认: documents)')
+    parser.add_argument('--rebuild-index', action='store_true',
+                       help='重建向量索引')
+    parser.add_argument('--no-quantization', action='store_true',
+                       help='禁用模型量化（需要更多显存）')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='并行处理PDF的进程数 (默认: 1, 0 表示使用全部CPU核心)')
+    parser.add_argument('--extractor', choices=['pdfplumber', 'pypdf'], default='pdfplumber',
+                       help='PDF文本提取后端: pdfplumber (默认) 或 pypdf (更快，乱码页自动回退到pdfplumber)')
+    parser.add_argument('--chunker', choices=['token', 'char'], default='token',
+                       help='分块方式: token (按embedding模型的token数, 默认) 或 char (按字符数, 在段落和词边界处切分, 块之间不重叠)')
+    parser.add_argument('--no-dedup', action='store_true',
+                       help='不合并重复和近似重复的文本块')
+    parser.add_argument('--embedding-cache', choices=['float32', 'float16', 'none'], default='float32',
+                       help='文本块向量磁盘缓存的精度: float32 (默认)、float16 (占用减半) 或 none (不缓存)')
+    parser.add_argument('--encoder', choices=['torch', 'torch-int8', 'onnx', 'onnx-int8'], default='torch',
+                       help='embedding模型推理后端: torch (fp32, 默认)、torch-int8 (动态int8量化)、'
+                            'onnx (ONNX Runtime) 或 onnx-int8 (ONNX Runtime + int8量化)')
+    parser.add_argument('--encode-workers', type=int, default=1,
+                       help='构建索引时并行向量化的进程数，每个进程加载一份模型 (默认: 1, 0 表示按CPU核心数和可用内存自动选择)')
+    parser.add_argument('--encode-batch-size', type=int, default=32,
+                       help='向量化的批大小 (默认: 32)')
+    parser.add_argument('--index-type', choices=['auto', 'flat', 'ivf', 'ivfpq', 'hnsw', 'sq8', 'binary'],
+                       default='auto',
+                       help='向量索引类型 (默认: auto，按向量数量在 flat/ivf/ivfpq 之间选择；'
+                            'sq8/binary 为int8/二值压缩索引，检索后用原始向量重排序)')
+    parser.add_argument('--nprobe', type=int, default=None,
+                       help='IVF索引每次检索的聚类数 (默认: nlist/16，至少8)')
+    parser.add_argument('--ef-search', type=int, default=None,
+                       help='HNSW索引检索时的候选队列长度 (默认: 64)')
+    parser.add_argument('--rerank-factor', type=int, default=None,
+                       help='压缩索引初筛的候选数为 top_k 的倍数 (默认: sq8 为4，binary 为16)')
+    parser.add_argument('--reduce-dim', type=int, default=None,
+                       help='索引前先将向量降到指定维度，索引更小、检索更快，召回略有下降 (默认: 不降维)')
+    parser.add_argument('--reduce-method', choices=['pca', 'opq'], default='pca',
+                       help='降维方法: pca (默认) 或 opq (旋转使各子空间方差均衡，适合配合 ivfpq)')
+    parser.add_argument('--compact-threshold', type=float, default=0.2,
+                       help='已删除文本块超过该比例时在后台压缩索引 (默认: 0.2, 0 表示不自动压缩)')
+    parser.add_argument('--retrieval', choices=['vector', 'lexical', 'hybrid'], default='vector',
+                       help='检索方式: vector (默认，向量检索)、lexical (BM25关键词检索，不运行embedding模型) '
+                            '或 hybrid (两者融合)')
+    parser.add_argument('--shards', type=int, default=0,
+                       help='把向量切分到指定数量的本地工作进程中并行检索，结果与flat索引一致 (默认: 0，不分片)')
+    parser.add_argument('--keep-snapshots', type=int, default=2,
+                       help='磁盘上保留的索引快照数，包括当前快照 (默认: 2)')
+    parser.add_argument('--mmap-index', action='store_true',
+                       help='以内存映射方式加载向量索引，启动更快且多个进程共享页缓存')
+    parser.add_argument('--query-cache-size', type=int, default=1024,
+                       help='内存中缓存的查询向量条数 (默认: 1024, 0 表示不缓存)')
+    parser.add_argument('--query-cache-disk', action='store_true',
+                       help='将常用查询的向量保存到磁盘，重启后仍然命中')
+    parser.add_argument('--collections-dir', default=None,
+                       help='文档集合目录，其中每个子目录是一个集合，各自建立索引并共用模型，'
+                            '第一次使用时加载 (默认: 只有 --documents-dir 一个集合)')
+    parser.add_argument('--collection', default=DEFAULT_COLLECTION,
+                       help=f'命令行模式初始使用的文档集合 (默认: {DEFAULT_COLLECTION}，即 --documents-dir)')
+    parser.add_argument('--collection-memory', type=float, default=None,
+                       help='已加载文档集合的内存预算 (MB)，超过时卸载最久未使用的集合 (默认: 不限制)')
+    parser.add_argument('--watch', action='store_true',
+                       help='Web模式下在后台监视文档目录，自动索引新增或修改的PDF')
+    parser.add_argument('--watch-interval', type=float, default=2.0,
+                       help='监视文档目录的轮询间隔秒数 (默认: 2)')
+    
+    args = parser.parse_args()
+    
+    # 检查文档目录
+    documents_dir = Path(args.documents_dir)
+    if not documents_dir.exists():
+        documents_dir.mkdir(parents=True)
+        print(f"创建文档目录: {documents_dir}")
+        print(f"请将PDF文件放入 {documents_dir} 目录")
+    
+    # 初始化助手，其他文档集合使用相同的参数
+    print("初始化科研助手...")
+    options = dict(
+        use_quantization=not args.no_quantization,
+        num_workers=args.workers,
+        extraction_backend=args.extractor,
+        chunker=args.chunker,
+        dedup=not args.no_dedup,
+        embedding_cache=None if args.embedding_cache == 'none' else args.embedding_cache,
+        index_type=args.index_type,
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+        mmap_index=args.mmap_index,
+        query_cache_size=args.query_cache_size,
+        query_cache_disk=args.query_cache_disk,
+        encoder_backend=args.encoder,
+        encode_workers=args.encode_workers,
+        encode_batch_size=args.encode_batch_size,
+        rerank_factor=args.rerank_factor,
+        reduce_dim=args.reduce_dim,
+        reduce_method=args.reduce_method,
+        compact_threshold=args.compact_threshold,
+        keep_snapshots=args.keep_snapshots,
+        retrieval=args.retrieval,
+        shards=args.shards
+    )
+    assistant = ResearchAssistant(documents_dir=str(documents_dir), **options)
+    
+    # 初始化（处理文档和构建索引）
+    assistant.initialize(rebuild_index=args.rebuild_index)
+    
+    watch_interval = args.watch_interval if args.mode == 'web' and args.watch else None
+    collections = CollectionManager(assistant, collections_dir=args.collections_dir,
+                                    memory_budget_mb=args.collection_memory, options=options,
+                                    watch_interval=watch_interval)
+    if not collections.exists(args.collection):
+        print(f"文档集合不存在: {args.collection}，可选: {', '.join(collections.names())}")
+        sys.exit(1)
+    
+    # 运行对应模式
+    if args.mode == 'web':
+        if watch_interval is not None:
+            assistant.start_watcher(interval=watch_interval)
+        web_mode(collections)
+    else:
+        cli_mode(collections, args.collection)
+
+
+if __name__ == '__main__':
+    main()
+
@@ -0,0 +1,144 @@
+"""
+文档处理测试
+并行处理时单个文件导致工作进程崩溃或卡住，不影响其余文件；流式提取只在读完后写入缓存；
+按页码范围拆分或逐页流式分块的结果与串行一次性分块相同
+"""
+import os
+import time
+
+from app.core.document_processor import DocumentProcessor
+
+
+class FaultyProcessor(DocumentProcessor):
+    """不解析PDF，按文件名模拟正常、崩溃和卡住的文件"""
+    
+    def _extract_and_chunk(self, pdf_path: str):
+        name = os.path.basename(pdf_path)
+        if name.startswith('crash'):
+            os._exit(1)
+        if name.startswith('hang'):
+            time.sleep(60)
+        return f'text of {name}', [f'chunk of {name}']
+
+
+def make_processor(tmp_path, names, **kwargs):
+    for name in names:
+        (tmp_path / name).write_bytes(b'%PDF-1.4')
+    processor = FaultyProcessor(documents_dir=str(tmp_path), num_workers=4, **kwargs)
+    processor.task_timeout = 2
+    return processor
+
+
+def test_crashing_file_only_skips_itself(tmp_path):
+    names = [f'good{i}.pdf' for i in range(6)] + ['crash.pdf']
+    processor = make_processor(tmp_path, names)
+    
+    documents = processor.process_documents()
+    
+    assert sorted(documents) == sorted(f'good{i}.pdf' for i in range(6))
+    assert documents['good0.pdf'] == ['chunk of good0.pdf']
+
+
+def test_known_hashes_skip_rehashing(tmp_path, monkeypatch):
+    processor = make_processor(tmp_path, ['a.pdf', 'b.pdf'], cache_dir=str(tmp_path / 'extracted'))
+    # 提取缓存按内容哈希索引，两个文件内容不同
+    (tmp_path / 'b.pdf').write_bytes(b'%PDF-1.4 b')
+    manifest = processor.scan_documents()
+    expected = processor.process_documents(num_workers=1)
+    
+    hashed = []
+    monkeypatch.setattr('app.core.document_processor.file_hash', lambda path: hashed.append(path))
+    known_hashes = {name: entry['hash'] for name, entry in manifest.items()}
+    assert processor.process_documents(num_workers=1, known_hashes=known_hashes) == expected
+    assert hashed == []
+
+
+def test_hanging_file_times_out(tmp_path):
+    names = [f'good{i}.pdf' for i in range(6)] + ['crash.pdf', 'hang.pdf']
+    processor = make_processor(tmp_path, names)
+    
+    start = time.monotonic()
+    documents = processor.process_documents()
+    
+    assert sorted(documents) == sorted(f'good{i}.pdf' for i in range(6))
+    assert time.monotonic() - start < 30
+
+
+def test_hanging_file_times_out_in_pool(tmp_path):
+    names = [f'good{i}.pdf' for i in range(6)] + ['hang.pdf']
+    processor = make_processor(tmp_path, names)
+    
+    documents = processor.process_documents()
+    
+    assert sorted(documents) == sorted(f'good{i}.pdf' for i in range(6))
+
+
+class PagedProcessor(DocumentProcessor):
+    """不解析PDF，逐块产出固定文本并记录提取次数"""
+    
+    extractions = 0
+    
+    def iter_chunks(self, pdf_path: str):
+        PagedProcessor.extractions += 1
+        for i in range(5):
+            yield f'chunk {i}'
+
+
+def test_stream_chunks_caches_only_complete_extraction(tmp_path):
+    processor = PagedProcessor(documents_dir=str(tmp_path), cache_dir=str(tmp_path / 'extracted'))
+    PagedProcessor.extractions = 0
+    
+    # 中途停止读取时不留下缓存
+    stream = processor.stream_chunks('big.pdf', 'hash')
+    assert next(stream) == 'chunk 0'
+    stream.close()
+    assert processor.cache.get_chunks('hash', processor._chunk_params_key()) is None
+    
+    assert list(processor.stream_chunks('big.pdf', 'hash')) == [f'chunk {i}' for i in range(5)]
+    assert list(processor.stream_chunks('big.pdf', 'hash')) == [f'chunk {i}' for i in range(5)]
+    assert PagedProcessor.extractions == 2
+
+
+def page_texts(name: str, count: int):
+    """生成跨页的段落和超过分块大小的长段落"""
+    pages = []
+    for i in range(count):
+        words = ' '.join(f'{name}-{i}-word{j}' for j in range(3 + i % 17))
+        if i % 3 == 0:
+            pages.append(f'{name} page {i} heading\n\n{words}')
+        else:
+            pages.append(f'{words}\n\nshort paragraph {i}\n\n{words} {words}')
+    return pages
+
+
+class SyntheticProcessor(DocumentProcessor):
+    """不解析PDF，按文件名生成固定的页面文本，支持按页码范围读取"""
+    
+    def _count_pages(self, pdf_path: str) -> int:
+        return 40 if os.path.basename(pdf_path).startswith('big') else 3
+    
+    def iter_pages(self, pdf_path: str, start: int = 0, end=None):
+        name = os.path.basename(pdf_path)
+        yield from page_texts(name, self._count_pages(pdf_path))[start:end]
+
+
+def test_split_and_streamed_chunks_match_serial(tmp_path):
+    names = ['big0.pdf', 'big1.pdf', 'small.pdf']
+    for name in names:
+        (tmp_path / name).write_bytes(b'%PDF-1.4')
+    processor = SyntheticProcessor(documents_dir=str(tmp_path), chunk_size=100)
+    processor.split_min_size = 0
+    processor.split_page_threshold = 10
+    processor.min_pages_per_task = 7
+    
+    # 大文件拆分为多个页码范围任务
+    tasks = processor._plan_tasks(sorted(tmp_path.glob('*.pdf')), 3)
+    assert len(tasks) == 2 * 3 + 1
+    serial = processor.process_documents(num_workers=1)
+    assert processor.process_documents(num_workers=3) == serial
+    
+    for name in names:
+        text = ''.join(page + '\n' for page in page_texts(name, processor._count_pages(name)))
+        whole = processor.chunk_text(text)
+        assert list(processor.iter_chunks(name)) == whole == serial[name]
+        assert any(len(chunk) > 50 for chunk in whole)
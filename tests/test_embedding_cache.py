@@ -0,0 +1,42 @@
+"""
+向量缓存测试
+多个进程（实例）共用同一个缓存目录时，各自写入的向量不会互相覆盖或错位
+"""
+import numpy as np
+
+from app.core.embedding_cache import EmbeddingCache, chunk_key
+
+
+def test_instances_sharing_directory_keep_rows_consistent(tmp_path):
+    first = EmbeddingCache(str(tmp_path), 'model')
+    second = EmbeddingCache(str(tmp_path), 'model')
+    keys_a = [chunk_key(f'a{i}') for i in range(4)]
+    keys_b = [chunk_key(f'b{i}') for i in range(4)]
+    vectors_a = np.arange(32, dtype='float32').reshape(4, 8)
+    vectors_b = -vectors_a - 1
+    
+    first.put(keys_a[:2], vectors_a[:2])
+    second.put(keys_b, vectors_b)
+    first.put(keys_a, vectors_a)
+    
+    for cache in (first, second, EmbeddingCache(str(tmp_path), 'model')):
+        embeddings, missing = cache.get(keys_a + keys_b)
+        assert missing == []
+        assert np.array_equal(embeddings, np.vstack([vectors_a, vectors_b]))
+
+
+def test_interrupted_write_is_discarded(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    keys = [chunk_key('a'), chunk_key('b')]
+    cache.put(keys[:1], np.ones((1, 8), dtype='float32'))
+    # 模拟写入向量后、写完哈希前中断
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(b'\0' * 20)
+    with open(cache.keys_path, 'ab') as f:
+        f.write(b'dead')
+    
+    reopened = EmbeddingCache(str(tmp_path), 'model')
+    reopened.put(keys[1:], np.full((1, 8), 2, dtype='float32'))
+    embeddings, missing = cache.get(keys)
+    assert missing == []
+    assert embeddings[:, 0].tolist() == [1, 2]
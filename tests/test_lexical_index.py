@@ -0,0 +1,35 @@
+"""
+词法索引测试
+"""
+from app.core.lexical_index import LexicalIndex, tokenize
+
+TEXTS = ['信息熵的定义与性质', '交叉熵损失函数', '卷积神经网络的结构', 'BM25 ranking function']
+
+
+def make_index() -> LexicalIndex:
+    index = LexicalIndex()
+    index.add(range(len(TEXTS)), TEXTS)
+    return index
+
+
+def test_query_tokens_are_bigrams():
+    assert tokenize('信息熵') == ['信息', '息熵']
+    assert tokenize('熵') == ['熵']
+    assert tokenize('信息熵', unigrams=True) == ['信息', '息熵', '信', '息', '熵']
+
+
+def test_single_cjk_character_matches():
+    ids, _ = make_index().search('熵')
+    assert sorted(ids.tolist()) == [0, 1]
+
+
+def test_search_after_save_and_load(tmp_path):
+    index = make_index()
+    assert index.search('信息熵')[0][0] == 0
+    assert index.search('ranking')[0].tolist() == [3]
+    
+    index.remove([1])
+    index.save(str(tmp_path / 'lexical'))
+    loaded = LexicalIndex.load(str(tmp_path / 'lexical'))
+    assert loaded.search('熵')[0].tolist() == [0]
+    assert loaded.search('神经网络')[0][0] == 2
@@ -0,0 +1,36 @@
+"""
+按token分块测试
+"""
+from app.core.text_chunker import TokenChunker
+
+
+class CharTokenizer:
+    """每个非空白字符一个token的分词器，只提供分块需要的偏移量"""
+    
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=True):
+        single = isinstance(texts, str)
+        offsets = [[(i, i + 1) for i, c in enumerate(text) if not c.isspace()]
+                   for text in ([texts] if single else texts)]
+        return {'offset_mapping': offsets[0] if single else offsets}
+
+
+def run(pieces, max_tokens=20, overlap=5):
+    chunker = TokenChunker(CharTokenizer(), max_tokens, overlap)
+    out = []
+    pending = 0
+    for piece in pieces:
+        out += chunker.feed(piece)
+        pending = max(pending, len(chunker.buffer) - chunker.scan_pos)
+    return out + chunker.finish(), pending
+
+
+def test_text_without_sentence_boundary_is_cut_while_streaming():
+    text = '深度学习算子网络是一种用于学习非线性算子的神经网络结构' * 100
+    whole, _ = run([text])
+    chunks, pending = run([text[i:i + 7] for i in range(0, len(text), 7)])
+    
+    assert chunks == whole
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    # 待切分的文本不超过 max_tokens 对应的字符数，不随输入增长
+    assert pending <= 20 * 4
+    assert len(chunks) >= len(text) // 20
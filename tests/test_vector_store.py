@@ -0,0 +1,337 @@
+"""
+向量存储测试
+使用按文本哈希生成向量的假编码器（通过 share_from 注入），不需要下载embedding模型
+"""
+import time
+import hashlib
+import threading
+from types import SimpleNamespace
+import numpy as np
+import faiss
+import pytest
+
+from app.core.index_factory import current_spec
+from app.core.vector_store import VectorStore
+
+DIM = 16
+
+
+class FakeEncoder:
+    """按文本哈希生成确定的向量；delay 模拟较慢的向量化，使后台压缩与入库重叠"""
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batch_sizes = []
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+    
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        time.sleep(self.delay)
+        self.batch_sizes.append(kwargs.get('batch_size'))
+        return np.array([np.frombuffer(hashlib.sha256(text.encode('utf-8')).digest()[:DIM], dtype='uint8')
+                         for text in texts], dtype='float32')
+
+
+def make_store(tmp_path, index_type: str, delay: float = 0.0, **kwargs) -> VectorStore:
+    shared = SimpleNamespace(model_name='fake', embedding_model=FakeEncoder(delay),
+                             encoder_backend='torch', query_cache=None, embedding_cache=None)
+    kwargs.setdefault('dedup', False)
+    return VectorStore(cache_dir=str(tmp_path), index_type=index_type, share_from=shared, **kwargs)
+
+
+def documents(prefix: str, n_docs: int, n_chunks: int):
+    return {f'{prefix}{j}.pdf': [f'{prefix} document {j} chunk {i}' for i in range(n_chunks)]
+            for j in range(n_docs)}
+
+
+def wait_for_compaction(store: VectorStore, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while store._compacting and time.time() < deadline:
+        time.sleep(0.01)
+    assert not store._compacting
+
+
+def assert_consistent(store: VectorStore):
+    assert store.index.ntotal == len(store.chunks)
+    for position in range(0, len(store.chunks), 7):
+        if position in store.chunks.deleted:
+            continue
+        hits = store.search(store.chunks.text(position), top_k=1)
+        assert hits[0]['chunk'] == store.chunks.text(position)
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'hnsw', 'sq8'])
+def test_compaction_during_ingest(tmp_path, index_type):
+    """与 update_index 相同的顺序：删除触发后台压缩后立即入库"""
+    store = make_store(tmp_path, index_type, compact_threshold=0.1)
+    store.build_index(documents('old', 5, 50))
+    store.embedding_model.delay = 0.2
+    store.remove_documents(['old0.pdf', 'old1.pdf'])
+    store.add_documents(documents('new', 2, 10))
+    wait_for_compaction(store)
+    store.embedding_model.delay = 0.0
+    
+    assert not store.chunks.deleted
+    assert len(store.chunks) == 3 * 50 + 2 * 10
+    assert_consistent(store)
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'hnsw', 'sq8'])
+def test_concurrent_remove_and_add(tmp_path, index_type):
+    store = make_store(tmp_path, index_type, delay=0.05, compact_threshold=0.1)
+    store.build_index(documents('old', 6, 40))
+    errors = []
+    
+    def run(action):
+        try:
+            action()
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=run, args=(lambda: store.remove_documents([f'old{j}.pdf']),))
+               for j in range(3)]
+    threads.append(threading.Thread(target=run, args=(lambda: store.add_documents(documents('new', 3, 20)),)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wait_for_compaction(store)
+    store.embedding_model.delay = 0.0
+    
+    assert not errors
+    assert_consistent(store)
+    names = {hit['doc_name'] for hit in store.search('new document 1 chunk 3', top_k=3)}
+    assert 'new1.pdf' in names
+    
+    # 压缩完成并保存后重新加载，索引与元数据仍然一致
+    path = str(tmp_path / 'index' / 'vector_index.faiss')
+    store.save_index(path)
+    loaded = make_store(tmp_path, index_type)
+    assert loaded.load_index(path)
+    assert_consistent(loaded)
+
+
+def test_compaction_keeps_vectors_mapped(tmp_path):
+    """压缩不把原始向量读入内存，保存后写出压缩后的文件"""
+    path = str(tmp_path / 'index' / 'vector_index.faiss')
+    store = make_store(tmp_path, 'sq8', compact_threshold=None, mmap_index=True)
+    store.build_index(documents('old', 4, 30))
+    store.save_index(path)
+    store = make_store(tmp_path, 'sq8', compact_threshold=None, mmap_index=True)
+    assert store.load_index(path)
+    store.remove_documents(['old1.pdf'])
+    assert store.compact() == 30
+    assert store.vectors.path is not None
+    assert len(store.vectors) == store.index.ntotal == 90
+    assert_consistent(store)
+    
+    store.add_documents(documents('new', 1, 5))
+    assert_consistent(store)
+    store.save_index(path)
+    loaded = make_store(tmp_path, 'sq8')
+    assert loaded.load_index(path)
+    assert len(loaded.vectors) == 95
+    assert_consistent(loaded)
+
+
+def wait_for_shards(store: VectorStore, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while not store._shards_ready and time.time() < deadline:
+        time.sleep(0.05)
+    assert store._shards_ready
+
+
+def assert_shards_match_local(store: VectorStore, queries):
+    for query in queries:
+        sharded = store.search(query, top_k=5)
+        store._shards_ready = False
+        local = store.search(query, top_k=5)
+        store._shards_ready = True
+        assert [hit['chunk'] for hit in sharded] == [hit['chunk'] for hit in local]
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'sq8'])
+def test_shards_follow_writes(tmp_path, index_type):
+    """增删直接同步到分片，保存不重启分片进程；分片进程退出后在后台重新同步"""
+    path = str(tmp_path / 'index' / 'vector_index.faiss')
+    store = make_store(tmp_path, index_type, shards=2)
+    try:
+        store.build_index(documents('old', 6, 20))
+        wait_for_shards(store)
+        pids = [process.pid for process in store.shard_pool._processes]
+        
+        store.remove_documents(['old0.pdf', 'old1.pdf'])
+        store.add_documents(documents('new', 2, 20))
+        wait_for_compaction(store)
+        store.save_index(path)
+        assert store._shards_ready
+        assert [process.pid for process in store.shard_pool._processes] == pids
+        # 保存后本进程的索引留在内存中，之后的增量写入不再复制整个索引
+        index = store.index
+        store.add_documents(documents('more', 1, 5))
+        assert store.index is index and store._mapped_path is None
+        queries = ['old document 3 chunk 4', 'new document 1 chunk 7', 'more document 0 chunk 2']
+        assert_shards_match_local(store, queries)
+        assert not any(hit['chunk'].startswith('old document 0 ')
+                       for hit in store.search('old document 0 chunk 2', top_k=10))
+        
+        store.shard_pool._processes[0].kill()
+        store.shard_pool._processes[0].join()
+        store.search('new document 0 chunk 1')
+        wait_for_shards(store)
+        assert store.shard_pool._processes[1].pid == pids[1]
+        assert_shards_match_local(store, queries)
+    finally:
+        store.close()
+
+
+def test_save_does_not_block_search(tmp_path, monkeypatch):
+    """写快照文件时检索照常进行；已登记、尚未写入索引的文本块不写入快照"""
+    path = str(tmp_path / 'index' / 'vector_index.faiss')
+    store = make_store(tmp_path, 'flat')
+    store.build_index(documents('old', 3, 10))
+    write_index = faiss.write_index
+    searched = []
+    
+    def write_while_searching(index, file_name):
+        thread = threading.Thread(target=lambda: searched.append(store.search('old document 1 chunk 2')))
+        thread.start()
+        thread.join(timeout=10)
+        write_index(index, file_name)
+    
+    monkeypatch.setattr(faiss, 'write_index', write_while_searching)
+    store.embedding_model.delay = 0.5
+    adding = threading.Thread(target=store.add_documents, args=(documents('new', 1, 5),))
+    adding.start()
+    time.sleep(0.2)
+    store.save_index(path)
+    adding.join()
+    store.embedding_model.delay = 0.0
+    
+    assert searched and searched[0][0]['chunk'] == 'old document 1 chunk 2'
+    loaded = make_store(tmp_path, 'flat')
+    assert loaded.load_index(path)
+    assert len(loaded.chunks) == 30
+    assert_consistent(loaded)
+    # 保存期间入库的文本块在下次保存时写入
+    assert_consistent(store)
+    store.save_index(path)
+    assert loaded.load_index(path)
+    assert len(loaded.chunks) == 35
+    assert_consistent(loaded)
+
+
+def test_deduplicator_after_load_and_removal(tmp_path):
+    """加载时不构建去重查找表，第一次入库前再构建；删除只移除被删除行的指纹"""
+    path = str(tmp_path / 'index' / 'vector_index.faiss')
+    store = make_store(tmp_path, 'flat', dedup=True)
+    store.build_index({'a.pdf': ['shared text', 'only in a'], 'b.pdf': ['only in b']})
+    store.save_index(path)
+    # 不在后台压缩，删除后的行数确定
+    loaded = make_store(tmp_path, 'flat', dedup=True, compact_threshold=None)
+    assert loaded.load_index(path)
+    assert loaded.deduplicator.stale
+    
+    loaded.add_documents({'c.pdf': ['shared text']})
+    assert not loaded.deduplicator.stale
+    assert len(loaded.chunks) == 3
+    
+    loaded.remove_documents(['a.pdf', 'c.pdf'])
+    assert not loaded.deduplicator.stale
+    # 已删除的行不再作为代表块，相同文本重新入库
+    loaded.add_documents({'d.pdf': ['shared text'], 'e.pdf': ['only in b']})
+    assert len(loaded.chunks) == 4
+    assert loaded.search('shared text', top_k=1)[0]['sources'] == [('d.pdf', 0)]
+    assert loaded.search('only in b', top_k=1)[0]['sources'] == [('b.pdf', 0), ('e.pdf', 0)]
+
+
+@pytest.mark.parametrize('mode', ['vector', 'lexical', 'hybrid'])
+def test_search_batch_matches_search(tmp_path, mode):
+    """批量检索的每项结果与逐条检索相同，查询按配置的批大小向量化"""
+    store = make_store(tmp_path, 'flat', encode_batch_size=4)
+    store.build_index(documents('doc', 4, 20))
+    queries = ['doc document 1 chunk 3', 'chunk 7', 'doc document 1 chunk 3', 'document 2']
+    store.embedding_model.batch_sizes.clear()
+    
+    for docs in (None, ['doc1.pdf', 'doc3.pdf']):
+        batch = store.search_batch(queries, top_k=5, documents=docs, mode=mode)
+        assert batch == [store.search(query, top_k=5, documents=docs, mode=mode) for query in queries]
+    assert set(store.embedding_model.batch_sizes) <= {4}
+
+
+@pytest.mark.parametrize('index_type, exact', [('flat', True), ('flat', False), ('ivf', False)])
+def test_filtered_search_matches_subset_index(tmp_path, monkeypatch, index_type, exact):
+    """
+    按文档过滤的检索只返回这些文档（包括去重合并进来的来源）的文本块，
+    结果与只用这些文档建立的索引相同；exact 为 False 时走索引内的ID选择器
+    """
+    if not exact:
+        monkeypatch.setattr('app.core.vector_store.FLAT_MAX_VECTORS', 0)
+    docs = documents('doc', 8, 30)
+    for j, chunks in enumerate(docs.values()):
+        chunks.append(f'shared chunk {j % 2}')
+    wanted = ['doc2.pdf', 'doc5.pdf']
+    store = make_store(tmp_path / 'all', index_type, dedup=True)
+    store.build_index(docs)
+    subset = make_store(tmp_path / 'subset', 'flat', dedup=True)
+    subset.build_index({name: docs[name] for name in wanted})
+    assert current_spec(store.index)[0] == index_type
+    
+    selector_calls = []
+    search_index = store._search_index
+    monkeypatch.setattr(store, '_search_index',
+                        lambda *args: selector_calls.append(args) or search_index(*args))
+    queries = ['doc document 2 chunk 4', 'doc document 0 chunk 4', 'shared chunk 0', 'chunk 9']
+    for query in queries:
+        hits = store.search(query, top_k=10, documents=wanted)
+        expected = subset.search(query, top_k=10)
+        assert [(hit['chunk'], hit['distance']) for hit in hits] == \
+            [(hit['chunk'], hit['distance']) for hit in expected]
+        assert all({name for name, _ in hit['sources']} & set(wanted) for hit in hits)
+    assert bool(selector_calls) != exact
+    
+    # 去重时合并到 doc0.pdf 的文本块也作为 doc2.pdf 的文本块返回；
+    # 保存后重新加载，合并的来源改存在只读的基础数组中
+    path = str(tmp_path / 'index' / 'vector_index.faiss')
+    store.save_index(path)
+    loaded = make_store(tmp_path / 'all', index_type, dedup=True)
+    assert loaded.load_index(path)
+    for searcher in (store, loaded):
+        shared = searcher.search('shared chunk 0', top_k=1, documents=['doc2.pdf'])[0]
+        assert shared['chunk'] == 'shared chunk 0'
+        assert shared['doc_name'] == 'doc0.pdf'
+        assert ('doc2.pdf', 30) in shared['sources']
+
+
+def test_removal_keeps_shared_chunk_for_remaining_document(tmp_path, monkeypatch):
+    """删除去重代表块所在的文档后，共享该块的文档仍能检索到它；压缩复制索引期间检索不被阻塞"""
+    store = make_store(tmp_path, 'flat', dedup=True, compact_threshold=0.1)
+    docs = documents('doc', 2, 10)
+    docs['doc0.pdf'].append('shared text')
+    docs['doc1.pdf'].insert(0, 'shared text')
+    store.build_index(docs)
+    assert store.search('shared text', top_k=1)[0]['sources'] == [('doc0.pdf', 10), ('doc1.pdf', 0)]
+    
+    deserialize_index = faiss.deserialize_index
+    searched = []
+    
+    def copy_while_searching(data):
+        thread = threading.Thread(target=lambda: searched.append(store.search('shared text', top_k=1)))
+        thread.start()
+        thread.join(timeout=10)
+        return deserialize_index(data)
+    
+    monkeypatch.setattr(faiss, 'deserialize_index', copy_while_searching)
+    assert store.remove_documents(['doc0.pdf']) == 10
+    wait_for_compaction(store)
+    
+    assert searched and searched[0][0]['sources'] == [('doc1.pdf', 0)]
+    assert not store.chunks.deleted
+    assert len(store.chunks) == 11
+    for documents_filter in (None, ['doc1.pdf']):
+        hit = store.search('shared text', top_k=1, documents=documents_filter)[0]
+        assert hit['chunk'] == 'shared text'
+        assert hit['doc_name'] == 'doc1.pdf' and hit['sources'] == [('doc1.pdf', 0)]
+    assert store.search('shared text', documents=['doc0.pdf']) == []
+    assert_consistent(store)